@@ -0,0 +1,122 @@
+"""Benchmarks for serialization, tiling, and raster code paths.
+
+Run them with runbenchmarks.py which creates synthetic datasets in a
+temporary SpatiaLite database and media root.
+"""
+import collections
+import gc
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# Registered benchmark setup functions keyed by name.
+registry = collections.OrderedDict()
+
+
+class Skip(Exception):
+    """Raised by a benchmark setup function when it cannot run."""
+
+
+def benchmark(name):
+    """Returns a decorator registering a benchmark setup function.
+
+    The decorated function receives the runner options and returns a tuple
+    of a callable to time and the number of items it handles per call.
+
+    Arguments:
+    name -- unique benchmark name as str
+    """
+    def decorator(func):
+        registry[name] = func
+        return func
+    return decorator
+
+def percentile(values, pct):
+    """Returns the linearly interpolated percentile of a sequence.
+
+    Arguments:
+    values -- sequence of numbers
+    pct -- percentile as a number from 0 to 100
+    """
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+class Result(object):
+    """Timings for a benchmark.
+
+    Arguments:
+    name -- benchmark name as str
+    times -- sequence of seconds per call
+    items -- number of items handled per call
+    Keyword args:
+    peak -- peak traced memory in bytes, or None when unavailable
+    """
+
+    def __init__(self, name, times, items, peak=None):
+        self.name = name
+        self.times = times
+        self.items = items
+        self.peak = peak
+
+    def percentile(self, pct):
+        return percentile(self.times, pct)
+
+    @property
+    def throughput(self):
+        """Items per second at the median latency."""
+        p50 = self.percentile(50)
+        return self.items / p50 if p50 else float('inf')
+
+    def as_dict(self):
+        return collections.OrderedDict([
+            ('name', self.name),
+            ('repeat', len(self.times)),
+            ('items', self.items),
+            ('p50', self.percentile(50)),
+            ('p95', self.percentile(95)),
+            ('p99', self.percentile(99)),
+            ('throughput', self.throughput),
+            ('peak', self.peak),
+        ])
+
+
+def measure(name, func, items=1, repeat=10, warmup=1):
+    """Returns a Result from timing repeated calls of a function.
+
+    Peak memory is measured over one extra call with tracemalloc, which only
+    sees allocations made by Python and not those within GDAL, GEOS, or other
+    C libraries.
+
+    Arguments:
+    name -- benchmark name as str
+    func -- callable taking no arguments
+    Keyword args:
+    items -- number of items handled per call
+    repeat -- number of timed calls
+    warmup -- number of untimed calls made first
+    """
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = timeit.default_timer()
+        func()
+        times.append(timeit.default_timer() - start)
+    peak = None
+    if tracemalloc is not None:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return Result(name, times, items, peak)
@@ -0,0 +1,87 @@
+"""Synthetic vector and raster datasets for benchmarks."""
+import math
+import os
+import random
+
+import numpy as np
+from django.contrib.gis import geos
+from django.core.files.storage import default_storage
+from greenwich import raster
+
+from spillway.models import upload_to
+
+# Extent of synthetic data in degrees as (w, s, e, n).
+EXTENT = (-120.0, 30.0, -100.0, 50.0)
+
+def polygon(x, y, radius, vertices):
+    """Returns a ring shaped GEOS Polygon.
+
+    Arguments:
+    x -- center x coordinate
+    y -- center y coordinate
+    radius -- radius in coordinate units
+    vertices -- number of distinct vertices
+    """
+    step = 2 * math.pi / vertices
+    ring = [(x + radius * math.cos(i * step), y + radius * math.sin(i * step))
+            for i in range(vertices)]
+    ring.append(ring[0])
+    return geos.Polygon(ring, srid=4326)
+
+def create_locations(model, count, vertices, seed=0):
+    """Inserts polygons scattered over EXTENT and returns the count.
+
+    Arguments:
+    model -- geo model class with name and geom fields
+    count -- number of features
+    vertices -- number of vertices per polygon
+    Keyword args:
+    seed -- random seed for repeatable datasets
+    """
+    rand = random.Random(seed)
+    w, s, e, n = EXTENT
+    objs = [model(name='loc%d' % i,
+                  geom=polygon(rand.uniform(w, e), rand.uniform(s, n),
+                               rand.uniform(.05, .5), vertices))
+            for i in range(count)]
+    model.objects.bulk_create(objs, batch_size=500)
+    return count
+
+def create_image(size, bands=1, seed=0):
+    """Returns the storage name of a GeoTIFF of random bytes covering
+    EXTENT.
+
+    Arguments:
+    size -- number of pixels per side
+    Keyword args:
+    bands -- number of bands
+    seed -- random seed for repeatable datasets
+    """
+    shape = (size, size) + ((bands,) if bands > 1 else ())
+    arr = np.random.RandomState(seed).randint(0, 256, shape).astype(np.uint8)
+    name = os.path.join(upload_to.path, 'bench_%d_%d_%d.tif' %
+                        (size, bands, seed))
+    w, s, e, n = EXTENT
+    ras = raster.frombytes(arr.tobytes(), shape)
+    ras.affine = (w, (e - w) / size, 0, n, 0, (s - n) / size)
+    ras.sref = 4326
+    with default_storage.open(name, 'w+b') as fp:
+        ras.save(fp)
+    ras.close()
+    return name
+
+def create_rasters(model, count, size, bands=1, seed=0):
+    """Saves raster model instances of synthetic GeoTIFFs and returns the
+    count.
+
+    Arguments:
+    model -- raster model class
+    count -- number of rasters
+    size -- number of pixels per side
+    Keyword args:
+    bands -- number of bands
+    seed -- random seed for repeatable datasets
+    """
+    for i in range(count):
+        model.objects.create(image=create_image(size, bands, seed + i))
+    return count
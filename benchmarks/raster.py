@@ -0,0 +1,54 @@
+"""Benchmarks of raster summaries, warping, and map rendering."""
+from django.contrib.gis import geos
+
+from spillway import views
+from tests.models import RasterStore
+
+from benchmarks import Skip, benchmark
+from benchmarks.datasets import EXTENT, polygon
+from benchmarks.vector import center_tiles, has_mapnik, view_response
+
+def area():
+    """Returns a polygon over the center of the synthetic data extent."""
+    w, s, e, n = EXTENT
+    return polygon((w + e) / 2.0, (s + n) / 2.0, (e - w) / 4.0, 32)
+
+@benchmark('raster.summarize')
+def summarize(options):
+    qs = RasterStore.objects.all()
+    geom = area()
+    return lambda: qs.summarize(geom, 'mean'), options.rasters
+
+@benchmark('raster.summarize.threads')
+def summarize_threads(options):
+    qs = RasterStore.objects.all()
+    geom = area()
+    return (lambda: qs.summarize(geom, 'mean', workers=options.workers),
+            options.rasters)
+
+@benchmark('raster.summarize.point')
+def summarize_point(options):
+    qs = RasterStore.objects.all()
+    w, s, e, n = EXTENT
+    point = geos.Point((w + e) / 2.0, (s + n) / 2.0, srid=4326)
+    return lambda: qs.summarize(point), options.rasters
+
+@benchmark('raster.warp')
+def warp(options):
+    qs = RasterStore.objects.all()
+    def run():
+        for obj in qs.warp(3857, format='tif'):
+            obj.image.close()
+    return run, options.rasters
+
+@benchmark('carto.render.raster')
+def render_raster_map(options):
+    if not has_mapnik:
+        raise Skip('requires mapnik')
+    view = views.RasterTileView.as_view(queryset=RasterStore.objects.all())
+    pk = RasterStore.objects.values_list('pk', flat=True)[0]
+    tiles = center_tiles(options.zoom)
+    def render():
+        for x, y, z in tiles:
+            view_response(view, pk=pk, x=x, y=y, z=z, format='png')
+    return render, len(tiles)
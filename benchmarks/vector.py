@@ -0,0 +1,133 @@
+"""Benchmarks of feature serialization, rendering, and tiling."""
+from django.contrib.gis import geos
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.gis.db.models import functions
+from greenwich import tile
+from rest_framework.test import APIRequestFactory
+
+from spillway import generics, query, renderers, serializers, views, wkb
+from spillway.compat import mapnik
+from tests.models import Location
+
+from benchmarks import Skip, benchmark
+from benchmarks.datasets import EXTENT
+
+factory = APIRequestFactory()
+
+try:
+    has_mapnik = bool(mapnik.Map)
+except ImproperlyConfigured:
+    has_mapnik = False
+
+
+class LocationFeatureSerializer(serializers.FeatureSerializer):
+    class Meta:
+        model = Location
+        fields = '__all__'
+
+
+def view_response(view, path='/', **kwargs):
+    """Returns the content of a rendered or streamed view response."""
+    response = view(factory.get(path), **kwargs)
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.render().content
+
+def list_view(format, view_class=generics.GeoListView):
+    view = view_class.as_view(queryset=Location.objects.all(),
+                              pagination_class=None)
+    return lambda: view_response(view, '/?format=%s' % format)
+
+def center_tiles(z):
+    """Returns (x, y, z) tiles overlapping the center of the data extent."""
+    w, s, e, n = EXTENT
+    x, y = (w + e) / 2.0, (s + n) / 2.0
+    return list(tile.from_bbox((x - .5, y - .5, x + .5, y + .5), [z]))
+
+@benchmark('serializer.feature')
+def serialize_features(options):
+    qs = Location.objects.all()
+    return (lambda: LocationFeatureSerializer(qs.all(), many=True).data,
+            options.features)
+
+@benchmark('renderer.geojson')
+def render_geojson(options):
+    qs = Location.objects.annotate(geojson=functions.AsGeoJSON('geom'))
+    data = LocationFeatureSerializer(qs, many=True).data
+    renderer = renderers.GeoJSONRenderer()
+    return lambda: renderer.render(data), options.features
+
+def wkb_values():
+    """Returns a list of feature geometries as WKB from the database."""
+    qs = Location.objects.annotate(wkb=query.AsBinary('geom'))
+    return [bytes(val) for val in qs.values_list('wkb', flat=True)]
+
+@benchmark('field.json.wkb')
+def json_from_wkb(options):
+    # The plain JSON path, reading WKB with struct.
+    values = wkb_values()
+    return lambda: [wkb.geojson(val) for val in values], options.features
+
+@benchmark('field.json.geos')
+def json_from_geos(options):
+    # The former plain JSON path, building GEOS geometries from the same WKB
+    # as the database adapter does and walking their coordinates.
+    values = wkb_values()
+    def serialize():
+        return [{'type': g.geom_type, 'coordinates': g.coords}
+                for g in (geos.GEOSGeometry(memoryview(val))
+                          for val in values)]
+    return serialize, options.features
+
+@benchmark('view.json')
+def json_view(options):
+    return list_view('json'), options.features
+
+@benchmark('view.geojson')
+def geojson_view(options):
+    return list_view('geojson'), options.features
+
+@benchmark('view.geojson.streaming')
+def streaming_geojson_view(options):
+    return (list_view('geojson', generics.StreamingGeoListView),
+            options.features)
+
+@benchmark('view.fgb')
+def flatgeobuf_view(options):
+    return list_view('fgb'), options.features
+
+@benchmark('query.tile.geojson')
+def tile_geojson(options):
+    bbox = geos.Polygon.from_bbox(EXTENT)
+    bbox.srid = 4326
+    qs = Location.objects.all()
+    return (lambda: list(qs.tile(bbox, z=4, format='geojson')
+                         .values_list('geojson', flat=True)),
+            options.features)
+
+@benchmark('query.tile.pbf')
+def tile_pbf(options):
+    bbox = geos.Polygon.from_bbox(EXTENT)
+    bbox.srid = 4326
+    qs = Location.objects.all()
+    return lambda: qs.tile(bbox, z=4, format='pbf').mvt(), options.features
+
+@benchmark('view.tile.pbf')
+def tile_view(options):
+    view = views.TileView.as_view(queryset=Location.objects.all())
+    tiles = center_tiles(options.zoom)
+    def render():
+        for x, y, z in tiles:
+            view_response(view, x=x, y=y, z=z, format='pbf')
+    return render, len(tiles)
+
+@benchmark('carto.render.vector')
+def render_vector_map(options):
+    if not has_mapnik:
+        raise Skip('requires mapnik')
+    view = views.TileView.as_view(queryset=Location.objects.all())
+    tiles = center_tiles(options.zoom)
+    def render():
+        for x, y, z in tiles:
+            view_response(view, x=x, y=y, z=z, format='png')
+    return render, len(tiles)
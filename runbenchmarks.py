@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""Runs benchmarks against synthetic datasets in a temporary database.
+
+Reports latency percentiles, throughput, and peak traced memory for each
+benchmark, optionally limited to names matching shell style patterns:
+
+    python runbenchmarks.py --features 10000 --vertices 64 'view.*'
+"""
+import argparse
+import fnmatch
+import json
+import os
+import sys
+
+from django.conf import settings
+import django
+
+from runtests import DEFAULT_SETTINGS, TMPDIR, teardown
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('patterns', nargs='*', default=['*'],
+                        help='benchmark names to run as shell patterns')
+    parser.add_argument('--features', type=int, default=1000,
+                        help='number of synthetic features')
+    parser.add_argument('--vertices', type=int, default=32,
+                        help='number of vertices per feature')
+    parser.add_argument('--rasters', type=int, default=4,
+                        help='number of synthetic GeoTIFFs')
+    parser.add_argument('--size', type=int, default=512,
+                        help='raster width and height in pixels')
+    parser.add_argument('--bands', type=int, default=1,
+                        help='number of raster bands')
+    parser.add_argument('--zoom', type=int, default=6,
+                        help='zoom level for tile benchmarks')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='number of threads for parallel benchmarks')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='number of timed calls per benchmark')
+    parser.add_argument('--warmup', type=int, default=1,
+                        help='number of untimed calls per benchmark')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='random seed for synthetic datasets')
+    parser.add_argument('--json', metavar='FILE',
+                        help='also write results as JSON to a file')
+    return parser.parse_args(argv)
+
+def report(result):
+    peak = '-' if result.peak is None else '%.1f' % (result.peak / 2.0 ** 20)
+    print('%-28s %8d %10.2f %10.2f %10.2f %12.1f %10s' % (
+        result.name, result.items, result.percentile(50) * 1000,
+        result.percentile(95) * 1000, result.percentile(99) * 1000,
+        result.throughput, peak))
+
+def runbenchmarks(argv=None):
+    options = parse_args(argv)
+    if not settings.configured:
+        settings.configure(**DEFAULT_SETTINGS)
+    django.setup()
+    from spillway.models import upload_to
+    os.mkdir(os.path.join(TMPDIR, upload_to.path))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    import benchmarks
+    import benchmarks.raster
+    import benchmarks.vector
+    from benchmarks import datasets
+    from tests.models import Location, RasterStore
+    names = [name for name in benchmarks.registry
+             if any(fnmatch.fnmatch(name, pat) for pat in options.patterns)]
+    setup_test_environment()
+    dbname = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    results = []
+    try:
+        datasets.create_locations(Location, options.features,
+                                  options.vertices, options.seed)
+        datasets.create_rasters(RasterStore, options.rasters, options.size,
+                                options.bands, options.seed)
+        print('%-28s %8s %10s %10s %10s %12s %10s' % (
+            'name', 'items', 'p50 ms', 'p95 ms', 'p99 ms', 'items/s',
+            'peak MiB'))
+        for name in names:
+            try:
+                func, items = benchmarks.registry[name](options)
+            except benchmarks.Skip as exc:
+                print('%-28s skipped: %s' % (name, exc))
+                continue
+            result = benchmarks.measure(name, func, items,
+                                        options.repeat, options.warmup)
+            report(result)
+            results.append(result.as_dict())
+    finally:
+        connection.creation.destroy_test_db(dbname, verbosity=0)
+        teardown()
+    if options.json:
+        with open(options.json, 'w') as fp:
+            json.dump({'options': vars(options), 'results': results}, fp,
+                      indent=2)
+
+if __name__ == '__main__':
+    runbenchmarks()
@@ -9,10 +9,10 @@ setup(name='django-spillway',
       author='Brian Galey',
       author_email='bkgaley@gmail.com',
       url='https://github.com/bkg/django-spillway',
-      packages=find_packages(exclude=['tests*']),
+      packages=find_packages(exclude=['tests*', 'benchmarks*']),
       include_package_data=True,
       install_requires=['django', 'djangorestframework>=3.1.0', 'greenwich>=0.3'],
-      extras_require={'mapnik': ['Mapnik>=2.0']},
+      extras_require={'mapnik': ['Mapnik>=2.0'], 'orjson': ['orjson']},
       license='BSD',
       classifiers=[
           'Development Status :: 4 - Beta',
@@ -1,11 +1,16 @@
+import collections
+import os
+import threading
+
 from django.core.files.storage import default_storage
 from django.db import connection
 from django.contrib.gis import gdal
-from greenwich import srs
+from django.contrib.gis.gdal.libgdal import GDAL_VERSION
+from greenwich import srs, tile
 from rest_framework.exceptions import NotFound
 
 from spillway.compat import mapnik
-from spillway import colors, query
+from spillway import colors, query, tilecache, timing
 
 def make_dbsource(**kwargs):
     """Returns a mapnik PostGIS or SQLite Datasource."""
@@ -20,24 +25,131 @@ def make_dbsource(**kwargs):
             kwargs.setdefault(mopt, val)
     return mapnik.PostGIS(**kwargs)
 
-def build_map(querysets, tileform):
+def metatile_origin(x, y, z, metatile):
+    """Returns a tuple of the upper left tile x, y and number of tiles per side
+    for the metatile enclosing a tile.
+    """
+    size = max(min(metatile, 2 ** z), 1)
+    return x - x % size, y - y % size, size
+
+def build_map(querysets, tileform, metatile=1):
+    """Returns a Map zoomed to the tile bbox.
+
+    Arguments:
+    querysets -- sequence of raster model instances or GeoQuerySets
+    tileform -- TileForm for the requested tile
+    Keyword args:
+    metatile -- number of tiles per side to zoom out to and size the map for
+    """
     data = tileform.cleaned_data if tileform.is_valid() else {}
     stylename = data.get('style')
-    m = Map()
     bbox = data.get('bbox')
+    size = 256
+    if bbox and metatile > 1:
+        x, y, n = metatile_origin(data['x'], data['y'], data['z'], metatile)
+        bbox = gdal.OGRGeometry.from_bbox(
+            tile.to_lonlat(x, y, data['z']) +
+            tile.to_lonlat(x + n, y + n, data['z']))
+        bbox.srid = 4326
+        size *= n
+    # Only pooled maps zoomed to a bbox, others keep the default extent.
+    key = pool.key(querysets, data, size) if bbox else None
+    m = pool.get(key)
+    if m is None:
+        m = Map(size, size)
+        for queryset in querysets:
+            layer = m.layer(queryset, stylename)
+            if isinstance(layer, RasterLayer):
+                layer.add_colorizer_stops(data.get('limits'))
+        if key:
+            pool.set(key, m)
     if bbox:
         m.zoom_bbox(bbox)
-    for queryset in querysets:
-        layer = m.layer(queryset, stylename)
-        proj = mapnik.Projection(layer.srs)
-        trans = mapnik.ProjTransform(proj, m.proj)
-        env = trans.forward(layer.envelope())
-        if not env.intersects(m.map.envelope()):
+    for layer in m.layers:
+        if not layer.map_envelope.intersects(m.map.envelope()):
             raise NotFound('Tile not found: outside layer extent')
-        if isinstance(layer, RasterLayer):
-            layer.add_colorizer_stops(data.get('limits'))
     return m
 
+def render_metatile(querysets, tileform, format, metatile):
+    """Returns a dict of encoded tiles keyed by (x, y) tile coordinates.
+
+    Renders the block of metatile by metatile tiles which encloses the
+    requested tile in a single pass, so labels, buffers, and datasource queries
+    are shared. Tiles outside of all layer extents are omitted.
+    """
+    data = tileform.cleaned_data
+    x0, y0, n = metatile_origin(data['x'], data['y'], data['z'], metatile)
+    m = build_map(querysets, tileform, metatile)
+    env = m.map.envelope()
+    w, h = env.width() / n, env.height() / n
+
+    def inside(col, row):
+        tilebox = mapnik.Box2d(env.minx + col * w, env.maxy - (row + 1) * h,
+                               env.minx + (col + 1) * w, env.maxy - row * h)
+        return any(layer.map_envelope.intersects(tilebox)
+                   for layer in m.layers)
+
+    # Requested tiles outside of layer extents are still not found.
+    if not inside(data['x'] - x0, data['y'] - y0):
+        raise NotFound('Tile not found: outside layer extent')
+    # Leave out other tiles outside of layer extents so they are not cached
+    # and served where a single tile request would not be found.
+    return {(x0 + col, y0 + row): imgdata for (col, row), imgdata
+            in m.render_tiles(format, n).items() if inside(col, row)}
+
+
+class MapPool(object):
+    """A per thread LRU cache of Map objects with styles and datasources
+    already loaded.
+
+    Mapnik maps are not safe to render concurrently, so each thread keeps its
+    own maps which are reused by zooming to a new bbox.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._local = threading.local()
+
+    @property
+    def maps(self):
+        try:
+            return self._local.maps
+        except AttributeError:
+            self._local.maps = collections.OrderedDict()
+            return self._local.maps
+
+    def clear(self):
+        self.maps.clear()
+
+    def get(self, key):
+        """Returns a Map or None."""
+        try:
+            m = self.maps.pop(key)
+        except KeyError:
+            return None
+        self.maps[key] = m
+        return m
+
+    def key(self, querysets, data, size=256):
+        """Returns a hashable key from map layers, tile form data, and map
+        size.
+        """
+        try:
+            mtime = os.path.getmtime(Map.mapfile)
+        except OSError:
+            mtime = None
+        limits = tuple(data.get('limits') or ())
+        return (tuple(tilecache.layer_key(q) for q in querysets),
+                data.get('style'), limits, size, mtime)
+
+    def set(self, key, m):
+        self.maps.pop(key, None)
+        self.maps[key] = m
+        while len(self.maps) > self.maxsize:
+            self.maps.popitem(last=False)
+
+pool = MapPool()
+
 
 class Map(object):
     mapfile = default_storage.path('map.xml')
@@ -52,6 +164,7 @@ class Map(object):
         m.srs = '+init=epsg:3857'
         self.proj = mapnik.Projection(m.srs)
         self.map = m
+        self.layers = []
 
     def layer(self, queryset, stylename=None):
         """Returns a map Layer.
@@ -68,13 +181,37 @@ class Map(object):
         except KeyError:
             self.map.append_style(layer.stylename, layer.style())
         layer.styles.append(layer.stylename)
+        layer.index = len(self.map.layers)
         self.map.layers.append(layer._layer)
+        # Layer extent in map projection, used to skip tiles outside of it.
+        trans = mapnik.ProjTransform(mapnik.Projection(layer.srs), self.proj)
+        layer.map_envelope = trans.forward(layer.envelope())
+        self.layers.append(layer)
         return layer
 
-    def render(self, format):
+    def _render(self):
         img = mapnik.Image(self.map.width, self.map.height)
-        mapnik.render(self.map, img)
-        return img.tostring(format)
+        with timing.phase('mapnik'):
+            mapnik.render(self.map, img)
+        return img
+
+    def render(self, format):
+        return self._render().tostring(format)
+
+    def render_tiles(self, format, tiles=1):
+        """Returns a dict of encoded tile data keyed by (column, row) offset.
+
+        The map is rendered once and sliced into tiles.
+
+        Arguments:
+        format -- image format as str
+        Keyword args:
+        tiles -- number of tiles per side
+        """
+        img = self._render()
+        w, h = self.map.width // tiles, self.map.height // tiles
+        return {(col, row): img.view(col * w, row * h, w, h).tostring(format)
+                for col in range(tiles) for row in range(tiles)}
 
     def zoom_bbox(self, bbox):
         """Zoom map to geometry extent.
@@ -88,6 +225,19 @@ class Map(object):
             pass
         else:
             self.map.zoom_to_box(mapnik.Box2d(*bbox.extent))
+            self._zoom_layers()
+
+    def _zoom_layers(self):
+        # Point raster layers at overviews matching the map pixel size.
+        env = self.map.envelope()
+        for layer in self.layers:
+            if isinstance(layer, RasterLayer):
+                trans = mapnik.ProjTransform(
+                    mapnik.Projection(layer.srs), self.proj)
+                res = trans.backward(env).width() / float(self.map.width)
+                ds = layer.zoom(res)
+                if ds is not None:
+                    self.map.layers[layer.index].datasource = ds
 
 
 class Layer(object):
@@ -113,15 +263,52 @@ class Layer(object):
 class RasterLayer(Layer):
     """A Mapnik layer for raster data types."""
 
+    # GDAL 3.7+ opens a single overview level with the vrt:// connection.
+    use_overviews = GDAL_VERSION >= (3, 7)
+
     def __init__(self, obj, band=1, style=None):
         self._rstore = obj
+        self._band = band
+        self._overview = None
+        self._overviews = {}
         layer = mapnik.Layer(
             str(obj), srs.SpatialReference(obj.srs).proj4)
-        layer.datasource = mapnik.Gdal(file=obj.image.path, band=band)
+        layer.datasource = self.datasource()
         self._layer = layer
         self.stylename = style or 'Spectral_r'
         self._symbolizer = None
 
+    def datasource(self, overview=None):
+        """Returns a mapnik Gdal Datasource.
+
+        Keyword args:
+        overview -- 0-based overview index to read from
+        """
+        path = self._rstore.image.path
+        if overview is not None:
+            path = 'vrt://%s?ovr=%d' % (path, overview)
+        return mapnik.Gdal(file=path, band=self._band)
+
+    def zoom(self, resolution):
+        """Returns a new Datasource when another overview suits a pixel size,
+        otherwise None.
+
+        Arguments:
+        resolution -- map pixel size in raster coordinate units
+        """
+        if not self.use_overviews:
+            return None
+        try:
+            overview = self._overviews[resolution]
+        except KeyError:
+            overview = self._overviews[resolution] = (
+                self._rstore.overview(resolution))
+        if overview == self._overview:
+            return None
+        self._overview = overview
+        self._layer.datasource = self.datasource(overview)
+        return self._layer.datasource
+
     def add_colorizer_stops(self, limits):
         rcolors = colors.colormap.get(self.stylename)
         if rcolors:
@@ -0,0 +1,80 @@
+"""Cloud Optimized GeoTIFF (COG) writing.
+
+COGs are tiled GeoTIFFs with overviews, laid out so clients can read the tiles
+and overview levels they need with HTTP range requests.
+"""
+from osgeo import gdal
+
+# Format name for requesting COG output.
+FORMAT = 'cog'
+EXTENSION = 'tif'
+
+def overview_levels(width, height, blocksize=512):
+    """Returns a list of overview decimation factors down to a single block.
+
+    Arguments:
+    width -- raster width in pixels
+    height -- raster height in pixels
+    Keyword args:
+    blocksize -- tile width and height in pixels
+    """
+    levels = []
+    size = max(width, height)
+    while size > blocksize:
+        size = (size + 1) // 2
+        levels.append(2 ** (len(levels) + 1))
+    return levels
+
+def is_cog(ds, blocksize=512):
+    """Returns true for a dataset already laid out as a COG.
+
+    Arguments:
+    ds -- gdal.Dataset
+    Keyword args:
+    blocksize -- tile size to expect overviews below
+    """
+    # GDAL 3.1+ reports the layout of files written as COGs.
+    layout = ds.GetMetadataItem('LAYOUT', 'IMAGE_STRUCTURE')
+    if layout:
+        return layout == 'COG'
+    if ds.GetDriver().ShortName != 'GTiff':
+        return False
+    band = ds.GetRasterBand(1)
+    xsize, ysize = band.GetBlockSize()
+    tiled = xsize < ds.RasterXSize and ysize > 1
+    small = max(ds.RasterXSize, ds.RasterYSize) <= blocksize
+    return small or (tiled and band.GetOverviewCount() > 0)
+
+def write(ds, path, blocksize=512, compress='deflate', resampling='nearest'):
+    """Writes a dataset as a COG.
+
+    The GDAL COG driver is used where available, otherwise a tiled GeoTIFF
+    with overviews is written.
+
+    Arguments:
+    ds -- gdal.Dataset
+    path -- output path, /vsimem/ paths included
+    Keyword args:
+    blocksize -- tile width and height in pixels
+    compress -- compression method as str, None for no compression
+    resampling -- overview resampling method as str
+    """
+    options = []
+    if compress:
+        options.append('COMPRESS=%s' % compress.upper())
+    driver = gdal.GetDriverByName('COG')
+    if driver is None:
+        # Before GDAL 3.1, build overviews in memory and copy them ahead of
+        # full resolution data.
+        ds = gdal.GetDriverByName('MEM').CreateCopy('', ds)
+        levels = overview_levels(ds.RasterXSize, ds.RasterYSize, blocksize)
+        if levels:
+            ds.BuildOverviews(resampling.upper(), levels)
+        driver = gdal.GetDriverByName('GTiff')
+        options += ['TILED=YES', 'COPY_SRC_OVERVIEWS=YES',
+                    'BLOCKXSIZE=%d' % blocksize, 'BLOCKYSIZE=%d' % blocksize]
+    else:
+        options += ['BLOCKSIZE=%d' % blocksize,
+                    'OVERVIEW_RESAMPLING=%s' % resampling.upper()]
+    # The copy is flushed and closed once dereferenced.
+    driver.CreateCopy(path, ds, options=options)
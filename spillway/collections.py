@@ -4,7 +4,7 @@ import collections
 from django.utils import six
 from greenwich.srs import SpatialReference
 
-from spillway.compat import json, JSONEncoder
+from spillway.compat import json, orjson, JSONEncoder
 
 def as_feature(data):
     """Returns a Feature or FeatureCollection.
@@ -79,6 +79,80 @@ class NamedCRS(dict):
         self.update(iterable, **kwargs)
 
 
+class GeoJSONWriter(object):
+    """Writes GeoJSON features and collections in a single pass.
+
+    Geometries already serialized by the spatial backend are copied as is,
+    the remaining members are encoded with a reused JSONEncoder, or with
+    orjson when installed and use_orjson is set.
+    """
+    # orjson is faster but writes compact separators, null for NaN and
+    # Infinity, and non-ASCII characters unescaped.
+    use_orjson = False
+    _orjson_options = (getattr(orjson, 'OPT_NON_STR_KEYS', 0) |
+                       getattr(orjson, 'OPT_PASSTHROUGH_DATETIME', 0))
+
+    def __init__(self):
+        self._encoder = JSONEncoder()
+
+    def encode(self, obj):
+        """Returns *obj* encoded as JSON."""
+        if self.use_orjson and orjson is not None:
+            try:
+                # Dates are left to the REST framework encoder for the same
+                # formatting either way.
+                return orjson.dumps(obj, default=self._encoder.default,
+                                    option=self._orjson_options).decode('utf-8')
+            except TypeError:
+                pass
+        return self._encoder.encode(obj)
+
+    def write_feature(self, feature, buf):
+        """Appends the parts of a GeoJSON Feature to a list of strings."""
+        geom = feature.get('geometry')
+        if not isinstance(geom, six.string_types):
+            geom = self.encode(geom)
+        buf.append('{"geometry": ')
+        buf.append(geom or '{}')
+        # One call for all other members is faster than one per member.
+        members = {k: v for k, v in six.iteritems(feature) if k != 'geometry'}
+        if members:
+            buf.append(', ')
+            buf.append(self.encode(members)[1:])
+        else:
+            buf.append('}')
+
+    def iterencode(self, collection, size=100):
+        """Returns an iterator of GeoJSON encoded FeatureCollection chunks.
+
+        Arguments:
+        collection -- FeatureCollection
+        Keyword args:
+        size -- number of features per chunk, None for a single chunk
+        """
+        members = {k: v for k, v in six.iteritems(collection)
+                   if k != 'features'}
+        header = self.encode(members)[:-1]
+        yield '%s%s"features": [' % (header, ', ' if members else '')
+        buf = []
+        count = 0
+        for feat in collection['features']:
+            if not isinstance(feat, Feature):
+                feat = Feature(**feat)
+            if count:
+                buf.append(',')
+            self.write_feature(feat, buf)
+            count += 1
+            if size and count % size == 0:
+                yield ''.join(buf)
+                buf = []
+        if buf:
+            yield ''.join(buf)
+        yield ']}'
+
+writer = GeoJSONWriter()
+
+
 class AbstractFeature(dict):
     """Abstract Feature class"""
 
@@ -127,12 +201,9 @@ class Feature(AbstractFeature):
 
     @property
     def geojson(self):
-        if not self.is_serialized('geometry'):
-            return self._dumps()
-        geom = self['geometry'] or '{}'
-        keys = six.viewkeys(self) - {'geometry'}
-        props = json.dumps({k: self[k] for k in keys}, cls=JSONEncoder)[1:-1]
-        return '{"geometry": %s, %s}' % (str(geom), props)
+        buf = []
+        writer.write_feature(self, buf)
+        return ''.join(buf)
 
 
 class FeatureCollection(AbstractFeature):
@@ -143,7 +214,10 @@ class FeatureCollection(AbstractFeature):
         self['type'] = self.__class__.__name__
         if crs:
             self['crs'] = NamedCRS(crs)
-        if features and not isinstance(next(iter(features)), Feature):
+        # Leave iterators alone so features may be lazily evaluated.
+        if isinstance(features, collections.Iterator):
+            self['features'] = features
+        elif features and not isinstance(next(iter(features)), Feature):
             self['features'] = [Feature(**feat) for feat in features]
         else:
             self['features'] = features or []
@@ -151,18 +225,41 @@ class FeatureCollection(AbstractFeature):
 
     @property
     def geojson(self):
-        if not self.has_serialized_geom:
-            return self._dumps()
-        features = ','.join(map(str, self['features']))
-        keys = six.viewkeys(self) - {'features'}
-        collection = '%s, "features": [' % json.dumps(
-            {k: self[k] for k in keys}, cls=JSONEncoder)[:-1]
-        return ''.join([collection, features, ']}'])
+        return ''.join(writer.iterencode(self, size=None))
 
     @property
     def has_serialized_geom(self):
+        # An iterator cannot be inspected without consuming it, each feature
+        # is encoded on its own by iterencode() anyway.
+        if self.is_lazy:
+            return True
         return any(feat.is_serialized('geometry') for feat in self['features'])
 
+    @property
+    def is_lazy(self):
+        return isinstance(self['features'], collections.Iterator)
+
+    def iterencode(self, size=100):
+        """Returns an iterator of GeoJSON encoded string chunks.
+
+        Keyword args:
+        size -- number of features per chunk
+        """
+        return writer.iterencode(self, size)
+
+    def itersequence(self):
+        """Returns an iterator of GeoJSON text sequence records (RFC 8142),
+        one per feature.
+        """
+        crs = self.get('crs')
+        for feat in self['features']:
+            if not isinstance(feat, Feature):
+                feat = Feature(**feat)
+            # Records stand alone, so carry over the collection crs.
+            if crs and 'crs' not in feat:
+                feat['crs'] = crs
+            yield '\x1e%s\n' % feat
+
 
 class LayerCollection(AbstractFeature):
     """Layer dict of FeatureCollections."""
@@ -12,6 +12,11 @@ else:
     class JSONEncoder(json.JSONEncoder):
         default = encoders.JSONEncoder().default
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 try:
     import mapnik
 except ImportError:
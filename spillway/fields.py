@@ -7,6 +7,7 @@ from django.db.models.query import QuerySet
 from rest_framework import renderers
 from rest_framework.fields import Field, FileField
 
+from spillway import wkb
 from spillway.compat import json
 from spillway.forms import fields
 
@@ -52,6 +53,10 @@ class GeometryField(Field):
         # serialized from the spatial db.
         try:
             return {'type': value.geom_type, 'coordinates': value.coords}
-        # Value is already serialized as geojson, kml, etc.
         except AttributeError:
-            return value
+            pass
+        # Plain JSON selects WKB which is read without building GEOS objects.
+        if self.source == renderers.JSONRenderer.format:
+            return wkb.geojson(value)
+        # Value is already serialized as geojson, kml, etc.
+        return value
@@ -0,0 +1,441 @@
+"""FlatGeobuf encoding of features with WKB or GeoJSON geometries.
+
+A minimal FlatBuffers writer for version 3 of the FlatGeobuf format with an
+optional packed Hilbert R-tree index, see
+https://github.com/flatgeobuf/flatgeobuf
+"""
+import datetime
+import decimal
+import itertools
+import struct
+
+from django.utils import six
+
+from spillway.compat import json, JSONEncoder
+from spillway.wkb import WKBReader
+
+MAGIC = b'fgb\x03fgb\x00'
+# Geometry types, these match WKB type ids.
+UNKNOWN, POINT, LINESTRING, POLYGON, MULTIPOINT, MULTILINESTRING, \
+    MULTIPOLYGON, GEOMETRYCOLLECTION = range(8)
+GEOMETRY_TYPES = ('Unknown', 'Point', 'LineString', 'Polygon', 'MultiPoint',
+                  'MultiLineString', 'MultiPolygon', 'GeometryCollection')
+# Column types
+BOOL, LONG, DOUBLE, STRING, JSON, DATETIME, BINARY = 2, 7, 10, 11, 12, 13, 14
+_max16 = 0xffff
+
+
+class _Vector(object):
+    """A FlatBuffers vector of scalars."""
+
+    def __init__(self, fmt, values):
+        self.fmt = fmt
+        self.values = values
+
+
+def _align(buf, size, extra=0):
+    buf.extend(b'\0' * (-(len(buf) + extra) % size))
+
+def _write(buf, obj):
+    """Writes a FlatBuffers object returning its position.
+
+    Arguments:
+    buf -- bytearray for the buffer
+    obj -- bytes for strings, _Vector, list of tables, or a table as a list of
+        field values indexed by field id which are None, (format, scalar)
+        tuples, or other objects
+    """
+    if isinstance(obj, bytes):
+        _align(buf, 4)
+        pos = len(buf)
+        buf += struct.pack('<I', len(obj)) + obj + b'\0'
+        return pos
+    elif isinstance(obj, _Vector):
+        size = struct.calcsize('<' + obj.fmt)
+        _align(buf, 4)
+        if size > 4:
+            _align(buf, size, 4)
+        pos = len(buf)
+        buf += struct.pack('<I%d%s' % (len(obj.values), obj.fmt),
+                           len(obj.values), *obj.values)
+        return pos
+    elif obj and isinstance(obj[0], list):
+        _align(buf, 4)
+        pos = len(buf)
+        buf += struct.pack('<I', len(obj)) + b'\0' * (len(obj) * 4)
+        for i, table in enumerate(obj):
+            slot = pos + 4 + i * 4
+            struct.pack_into('<I', buf, slot, _write(buf, table) - slot)
+        return pos
+    return _write_table(buf, obj)
+
+def _write_table(buf, fields):
+    # Lay out inline fields largest first so each is aligned.
+    sizes = {}
+    for fid, field in enumerate(fields):
+        if field is None:
+            continue
+        elif isinstance(field, tuple):
+            sizes[fid] = struct.calcsize('<' + field[0])
+        else:
+            sizes[fid] = 4
+    offsets = {}
+    offset = 4
+    for fid in sorted(sizes, key=lambda fid: -sizes[fid]):
+        offset += -offset % sizes[fid]
+        offsets[fid] = offset
+        offset += sizes[fid]
+    nfields = max(sizes) + 1 if sizes else 0
+    _align(buf, 2)
+    vtpos = len(buf)
+    buf += struct.pack('<HH%dH' % nfields, 4 + nfields * 2, offset,
+                       *[offsets.get(fid, 0) for fid in range(nfields)])
+    _align(buf, 8)
+    pos = len(buf)
+    buf += struct.pack('<i', pos - vtpos) + b'\0' * (offset - 4)
+    refs = []
+    for fid, field in enumerate(fields):
+        if isinstance(field, tuple):
+            struct.pack_into('<' + field[0], buf, pos + offsets[fid], field[1])
+        elif field is not None:
+            refs.append((pos + offsets[fid], field))
+    for slot, field in refs:
+        struct.pack_into('<I', buf, slot, _write(buf, field) - slot)
+    return pos
+
+def finish(table):
+    """Returns a size prefixed FlatBuffer for a root table."""
+    buf = bytearray(4)
+    struct.pack_into('<I', buf, 0, _write_table(buf, table))
+    return struct.pack('<I', len(buf)) + bytes(buf)
+
+
+def from_geojson(geom):
+    """Returns a (geometry type id, coordinates) tuple from a GeoJSON dict,
+    structured like the output of WKBReader.read().
+    """
+    gtype = GEOMETRY_TYPES.index(geom['type'])
+    if gtype == GEOMETRYCOLLECTION:
+        return gtype, [from_geojson(g) for g in geom['geometries']]
+    coords = geom['coordinates']
+    if gtype == POINT:
+        return gtype, tuple(coords[:2])
+    elif gtype == LINESTRING:
+        return gtype, [tuple(c[:2]) for c in coords]
+    elif gtype == POLYGON:
+        return gtype, [[tuple(c[:2]) for c in ring] for ring in coords]
+    return gtype, [from_geojson({'type': GEOMETRY_TYPES[gtype - 3],
+                                 'coordinates': part}) for part in coords]
+
+def _read_geometry(geom):
+    if not geom:
+        return None
+    elif isinstance(geom, six.string_types):
+        geom = json.loads(geom)
+    if isinstance(geom, dict):
+        return from_geojson(geom) if geom else None
+    return WKBReader(geom).read()
+
+def _points(gtype, coords):
+    """Yields (x, y) tuples of a geometry."""
+    if gtype == POINT:
+        yield coords
+    elif gtype == LINESTRING:
+        for pt in coords:
+            yield pt
+    elif gtype == POLYGON:
+        for ring in coords:
+            for pt in ring:
+                yield pt
+    else:
+        for part in coords:
+            for pt in _points(*part):
+                yield pt
+
+def _flatten(parts):
+    xy, ends = [], []
+    for points in parts:
+        for pt in points:
+            xy.extend(pt)
+        ends.append(len(xy) // 2)
+    return xy, ends
+
+def encode_geometry(gtype, coords):
+    """Returns a Geometry table from a geometry type id and coordinates."""
+    table = [None] * 8
+    table[6] = ('B', gtype)
+    if gtype == POINT:
+        xy, ends = list(coords), []
+    elif gtype in (LINESTRING, MULTIPOINT):
+        if gtype == MULTIPOINT:
+            coords = [pt for t, pt in coords]
+        xy, ends = _flatten([coords])
+        ends = []
+    elif gtype == POLYGON:
+        xy, ends = _flatten(coords)
+    elif gtype == MULTILINESTRING:
+        xy, ends = _flatten([line for t, line in coords])
+    else:
+        table[7] = [encode_geometry(*part) for part in coords]
+        return table
+    # Ends are only needed for more than one part.
+    if len(ends) > 1:
+        table[0] = _Vector('I', ends)
+    table[1] = _Vector('d', xy)
+    return table
+
+
+def column_type(value):
+    """Returns a column type id for a property value."""
+    if isinstance(value, bool):
+        return BOOL
+    elif isinstance(value, six.integer_types):
+        return LONG
+    elif isinstance(value, (float, decimal.Decimal)):
+        return DOUBLE
+    elif isinstance(value, (dict, list, tuple)):
+        return JSON
+    elif isinstance(value, (datetime.date, datetime.time)):
+        return DATETIME
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        return BINARY
+    return STRING
+
+def _encode_value(ctype, value):
+    if ctype == BOOL:
+        return struct.pack('<B', bool(value))
+    elif ctype == LONG:
+        return struct.pack('<q', int(value))
+    elif ctype == DOUBLE:
+        return struct.pack('<d', float(value))
+    elif ctype == BINARY:
+        data = bytes(value)
+    else:
+        if ctype == JSON:
+            value = json.dumps(value, cls=JSONEncoder)
+        elif hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        data = six.text_type(value).encode('utf-8')
+    return struct.pack('<I', len(data)) + data
+
+
+class Schema(object):
+    """Property columns for features."""
+
+    def __init__(self, features=()):
+        self.columns = []
+        self._index = {}
+        for feat in features:
+            self.update(feat)
+
+    def update(self, feature):
+        """Adds columns for new or untyped properties of a feature."""
+        for name, value in self._properties(feature):
+            idx = self._index.get(name)
+            if idx is None:
+                if len(self.columns) > _max16:
+                    continue
+                self._index[name] = len(self.columns)
+                self.columns.append([name, None])
+            elif self.columns[idx][1] is not None:
+                continue
+            if value is not None:
+                self.columns[self._index[name]][1] = column_type(value)
+
+    def _properties(self, feature):
+        if feature.get('id') is not None:
+            yield 'id', feature['id']
+        for item in six.iteritems(feature.get('properties') or {}):
+            yield item
+
+    def encode(self, feature):
+        """Returns feature properties as bytes."""
+        buf = bytearray()
+        for name, value in self._properties(feature):
+            idx = self._index.get(name)
+            if idx is None or value is None:
+                continue
+            ctype = self.columns[idx][1] or STRING
+            try:
+                buf += struct.pack('<H', idx) + _encode_value(ctype, value)
+            except (TypeError, ValueError, struct.error):
+                continue
+        return bytes(buf)
+
+    def tables(self):
+        return [[six.text_type(name).encode('utf-8'), ('B', ctype or STRING)]
+                for name, ctype in self.columns]
+
+
+def hilbert(x, y):
+    """Returns the Hilbert curve index of 16 bit integer coordinates."""
+    a = x ^ y
+    b = 0xffff ^ a
+    c = 0xffff ^ (x | y)
+    d = x & (y ^ 0xffff)
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 2)) ^ (b & (b >> 2))
+    B = (a & (b >> 2)) ^ (b & ((a ^ b) >> 2))
+    C ^= (a & (c >> 2)) ^ (b & (d >> 2))
+    D ^= (b & (c >> 2)) ^ ((a ^ b) & (d >> 2))
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 4)) ^ (b & (b >> 4))
+    B = (a & (b >> 4)) ^ (b & ((a ^ b) >> 4))
+    C ^= (a & (c >> 4)) ^ (b & (d >> 4))
+    D ^= (b & (c >> 4)) ^ ((a ^ b) & (d >> 4))
+    a, b, c, d = A, B, C, D
+    C ^= (a & (c >> 8)) ^ (b & (d >> 8))
+    D ^= (b & (c >> 8)) ^ ((a ^ b) & (d >> 8))
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+    i0 = x ^ y
+    i1 = b | (0xffff ^ (i0 | a))
+    for shift, mask in ((8, 0x00ff00ff), (4, 0x0f0f0f0f), (2, 0x33333333),
+                        (1, 0x55555555)):
+        i0 = (i0 | (i0 << shift)) & mask
+        i1 = (i1 | (i1 << shift)) & mask
+    return (i1 << 1) | i0
+
+def _extent(boxes):
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+def hilbert_sort(items, extent):
+    """Sorts (bbox, data) items in place by the Hilbert value of bbox
+    centers, as done by the reference implementation.
+    """
+    minx, miny, maxx, maxy = extent
+    width, height = maxx - minx, maxy - miny
+    hmax = _max16
+    def key(item):
+        x0, y0, x1, y1 = item[0]
+        x = int(hmax * ((x0 + x1) / 2.0 - minx) / width) if width else 0
+        y = int(hmax * ((y0 + y1) / 2.0 - miny) / height) if height else 0
+        return hilbert(x, y)
+    items.sort(key=key, reverse=True)
+
+def packed_rtree(boxes, node_size=16):
+    """Returns a packed Hilbert R-tree index as bytes.
+
+    Arguments:
+    boxes -- sequence of (bbox, offset) tuples in feature order
+    Keyword args:
+    node_size -- number of children per node
+    """
+    node_size = min(max(node_size, 2), _max16)
+    counts = [len(boxes)]
+    n = len(boxes)
+    while True:
+        n = (n + node_size - 1) // node_size
+        counts.append(n)
+        if n == 1:
+            break
+    numnodes = sum(counts)
+    # Levels are stored root first, leaves last.
+    bounds = []
+    end = numnodes
+    for count in counts:
+        bounds.append((end - count, end))
+        end -= count
+    nodes = [None] * numnodes
+    start = bounds[0][0]
+    for i, (bbox, offset) in enumerate(boxes):
+        nodes[start + i] = tuple(bbox) + (offset,)
+    for level in range(len(bounds) - 1):
+        pos, end = bounds[level]
+        newpos = bounds[level + 1][0]
+        while pos < end:
+            children = nodes[pos:min(pos + node_size, end)]
+            nodes[newpos] = _extent(children) + (pos,)
+            pos += node_size
+            newpos += 1
+    return b''.join(struct.pack('<4dQ', *node) for node in nodes)
+
+
+def _bbox(gtype, coords):
+    points = list(_points(gtype, coords))
+    if not points:
+        return (0.0, 0.0, 0.0, 0.0)
+    xs, ys = [pt[0] for pt in points], [pt[1] for pt in points]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+def _header(schema, count, name=None, srid=None, gtype=UNKNOWN,
+            extent=None, node_size=0):
+    table = [None] * 14
+    if name:
+        table[0] = six.text_type(name).encode('utf-8')
+    if extent:
+        table[1] = _Vector('d', extent)
+    table[2] = ('B', gtype)
+    if schema.columns:
+        table[7] = schema.tables()
+    table[8] = ('Q', count)
+    table[9] = ('H', node_size)
+    if srid:
+        table[10] = [b'EPSG', ('i', srid)]
+    return finish(table)
+
+def _feature(schema, feature, geom):
+    table = [None, None]
+    if geom:
+        table[0] = encode_geometry(*geom)
+    properties = schema.encode(feature)
+    if properties:
+        table[1] = _Vector('B', bytearray(properties))
+    return finish(table)
+
+def iterencode(features, name=None, srid=None, node_size=16):
+    """Returns an iterator of FlatGeobuf encoded bytes.
+
+    With an index, features are read and encoded up front to sort them and
+    compute offsets. Without one, they are encoded as they are iterated, with
+    property columns taken from the first feature.
+
+    Arguments:
+    features -- iterable of GeoJSON Feature dicts with geometries as WKB,
+        GeoJSON, or GeoJSON dicts
+    Keyword args:
+    name -- layer name
+    srid -- EPSG id of feature coordinates
+    node_size -- index node size, or zero for no index; readers such as GDAL
+        only support the default of 16
+    """
+    yield MAGIC
+    features = iter(features)
+    if not node_size:
+        first = next(features, None)
+        schema = Schema([first] if first else [])
+        yield _header(schema, 0, name, srid)
+        if first is None:
+            return
+        for feat in itertools.chain([first], features):
+            yield _feature(schema, feat, _read_geometry(feat.get('geometry')))
+        return
+    features = list(features)
+    schema = Schema(features)
+    items = []
+    gtypes = set()
+    for feat in features:
+        geom = _read_geometry(feat.get('geometry'))
+        gtypes.add(geom[0] if geom else UNKNOWN)
+        bbox = _bbox(*geom) if geom else (0.0, 0.0, 0.0, 0.0)
+        items.append((bbox, _feature(schema, feat, geom)))
+    gtype = gtypes.pop() if len(gtypes) == 1 else UNKNOWN
+    if not items:
+        yield _header(schema, 0, name, srid, gtype)
+        return
+    extent = _extent([bbox for bbox, data in items])
+    hilbert_sort(items, extent)
+    boxes = []
+    offset = 0
+    for bbox, data in items:
+        boxes.append((bbox, offset))
+        offset += len(data)
+    yield _header(schema, len(items), name, srid, gtype, extent, node_size)
+    yield packed_rtree(boxes, node_size)
+    for bbox, data in items:
+        yield data
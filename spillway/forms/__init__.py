@@ -1,4 +1,4 @@
 from .fields import (BoundingBoxField, CommaSepFloatField,
-                     OGRGeometryField, SpatialReferenceField)
+                     OGRGeometryField, PointsField, SpatialReferenceField)
 from .forms import (QuerySetForm, GeometryQueryForm, RasterTileForm,
                     VectorTileForm, RasterQueryForm, SpatialQueryForm)
@@ -28,7 +28,8 @@ class CommaSepFloatField(forms.FloatField):
         """Normalize data to a list of floats."""
         if not value:
             return []
-        return map(super(CommaSepFloatField, self).to_python, value.split(','))
+        return [super(CommaSepFloatField, self).to_python(val)
+                for val in value.split(',')]
 
     def run_validators(self, values):
         """Run validators for each item separately."""
@@ -54,6 +55,21 @@ class BoundingBoxField(CommaSepFloatField):
         return bbox
 
 
+class PointsField(CommaSepFloatField):
+    """A form Field for comma separated x, y coordinate pairs."""
+    default_error_messages = {
+        'invalid_pairs': _('Enter x, y coordinate pairs.'),
+    }
+
+    def to_python(self, value):
+        """Returns a list of (x, y) tuples."""
+        value = super(PointsField, self).to_python(value)
+        if len(value) % 2:
+            raise forms.ValidationError(self.error_messages['invalid_pairs'],
+                                        code='invalid_pairs')
+        return list(zip(value[::2], value[1::2]))
+
+
 class GeoFormatField(forms.CharField):
     default_error_messages = {
         'invalid_geofunc': _('%(value)s is not a supported function.'),
@@ -61,12 +77,15 @@ class GeoFormatField(forms.CharField):
     funcs = {'centroid': 'Centroid',
              'pointonsurface': 'PointOnSurface',
              'geojson': 'AsGeoJSON',
+             'geojsonseq': 'AsGeoJSON',
+             'fgb': 'AsBinary',
+             'json': 'AsBinary',
              'gml': 'AsGML',
              'kml': 'AsKML',
              'svg': 'AsSVG'}
 
     def to_python(self, value):
-        if value in self.empty_values + [renderers.JSONRenderer.format]:
+        if value in self.empty_values:
             return None
         # Skip known DRF renderer formats.
         formats = [renderers.BrowsableAPIRenderer.format,
@@ -74,7 +93,9 @@ class GeoFormatField(forms.CharField):
         if value in formats:
             return query.AsText
         try:
-            fn = getattr(functions, self.funcs[value])
+            name = self.funcs[value]
+            # Fall back to functions Django does not provide.
+            fn = getattr(functions, name, None) or getattr(query, name)
         except (KeyError, AttributeError):
             raise forms.ValidationError(self.error_messages['invalid_geofunc'],
                                         code='invalid_geofunc')
@@ -98,7 +119,15 @@ class GeometryField(forms.GeometryField):
 
 
 class GeometryFileField(forms.FileField):
-    """A form Field for creating OGR geometries from file based sources."""
+    """A form Field for creating OGR geometries from file based sources.
+
+    All geometries are unioned into one unless created with union=False,
+    which returns a list of geometries in feature order instead.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.union = kwargs.pop('union', True)
+        super(GeometryFileField, self).__init__(*args, **kwargs)
 
     def _from_file(self, fileobj, tmpdir):
         if zipfile.is_zipfile(fileobj):
@@ -118,17 +147,17 @@ class GeometryFileField(forms.FileField):
             with tempfile.NamedTemporaryFile(dir=tmpdir, delete=False) as fp:
                 shutil.copyfileobj(fileobj, fp)
             fname = fp.name
-        # Attempt to union all geometries from GDAL data source.
         try:
             geoms = gdal.DataSource(fname)[0].get_geoms()
-            geom = reduce(lambda g1, g2: g1.union(g2), geoms)
-            if not geom.srs:
+            if not geoms or not all(geom.srs for geom in geoms):
                 raise gdal.GDALException('Cannot determine SRS')
         except (gdal.GDALException, IndexError):
             raise forms.ValidationError(
                 GeometryField.default_error_messages['invalid_geom'],
                 code='invalid_geom')
-        return geom
+        if self.union:
+            return reduce(lambda g1, g2: g1.union(g2), geoms)
+        return geoms
 
     def to_python(self, value):
         value = super(GeometryFileField, self).to_python(value)
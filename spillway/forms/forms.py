@@ -117,6 +117,10 @@ class RasterQueryForm(QuerySetForm):
     g = fields.OGRGeometryField(srid=4326, required=False)
     upload = fields.GeometryFileField(required=False)
     periods = forms.IntegerField(required=False)
+    resolution = forms.FloatField(required=False, min_value=0)
+    # Features summarized one by one as zones, unlike a unioned upload.
+    zones = fields.GeometryFileField(required=False, union=False)
+    points = fields.PointsField(required=False)
     stat = forms.ChoiceField(
         choices=[(choice,) * 2 for choice in
                  ('count', 'max', 'mean', 'median', 'min', 'std', 'sum', 'var')],
@@ -136,16 +140,24 @@ class RasterQueryForm(QuerySetForm):
         txtformats = (renderers.JSONRenderer.format, CSVRenderer.format)
         htmlformats = (renderers.BrowsableAPIRenderer.format,
                        renderers.TemplateHTMLRenderer.format)
-        fields = ('format', 'g', 'stat', 'periods')
-        format, geom, stat, periods = map(self.cleaned_data.get, fields)
-        if not geom and format in htmlformats + txtformats:
+        fields = ('format', 'g', 'stat', 'periods', 'resolution', 'zones',
+                  'points')
+        format, geom, stat, periods, resolution, zones, points = map(
+            self.cleaned_data.get, fields)
+        located = geom or zones or points
+        if not located and format in htmlformats + txtformats:
             return
-        elif geom and format in htmlformats:
+        elif located and format in htmlformats:
             format = txtformats[0]
-        if format in txtformats:
-            qs = self.queryset.summarize(geom, stat)
+        if format in txtformats and zones:
+            qs = self.queryset.zonal_stats(zones, stat or 'mean')
+        elif format in txtformats and points:
+            qs = self.queryset.sample(points, self.fields['g'].srid)
+        elif format in txtformats:
+            qs = self.queryset.summarize(geom, stat, resolution=resolution)
         else:
-            qs = self.queryset.warp(format=format, geom=geom)
+            qs = self.queryset.warp(format=format, geom=geom,
+                                    resolution=resolution)
             if GeoTIFFZipRenderer.format[-3:] in format:
                 qs = qs.zipfiles()
         if periods:
@@ -1,15 +1,65 @@
-from django.http import FileResponse
+import re
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.forms import ValidationError as FormValidationError
-from rest_framework import exceptions
-from rest_framework.generics import ListAPIView, ListCreateAPIView, RetrieveAPIView
+from django.utils.http import http_date
+from rest_framework import exceptions, status
+from rest_framework.generics import (ListAPIView, ListCreateAPIView,
+                                     RetrieveAPIView, get_object_or_404)
+from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 from rest_framework.settings import api_settings
 import rest_framework.renderers as rn
 
-from spillway import filters, forms, mixins, pagination, renderers, serializers
+from spillway import (filters, forms, mixins, pagination, parsers, renderers,
+                      serializers)
 
 _default_filters = tuple(api_settings.DEFAULT_FILTER_BACKENDS)
+_default_parsers = tuple(api_settings.DEFAULT_PARSER_CLASSES)
 _default_renderers = tuple(api_settings.DEFAULT_RENDERER_CLASSES)
+_byte_range = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def parse_range(header, size):
+    """Returns a tuple of the first and last byte positions requested by a
+    Range header, or None for no range.
+
+    Malformed headers and multiple ranges are treated as no range, so the full
+    content is sent. Raises ValueError for unsatisfiable ranges.
+
+    Arguments:
+    header -- Range header value as str or None
+    size -- content length in bytes
+    """
+    match = _byte_range.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range of the last n bytes.
+        length = int(last)
+        if not length or not size:
+            raise ValueError('Unsatisfiable range: %s' % header)
+        return max(size - length, 0), size - 1
+    first = int(first)
+    if last and int(last) < first:
+        return None
+    if first >= size:
+        raise ValueError('Unsatisfiable range: %s' % header)
+    return first, min(int(last or size - 1), size - 1)
+
+def _read_range(fp, first, last, blocksize=65536):
+    """Yields file content between two byte positions, then closes the file."""
+    try:
+        fp.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = fp.read(min(blocksize, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fp.close()
 
 
 class BaseGeoView(mixins.ModelSerializerMixin):
@@ -18,8 +68,12 @@ class BaseGeoView(mixins.ModelSerializerMixin):
     pagination_class = pagination.FeaturePagination
     filter_backends = _default_filters + (
         filters.SpatialLookupFilter, filters.GeoQuerySetFilter)
+    parser_classes = _default_parsers + (
+        parsers.GeoJSONParser, parsers.GeoJSONSeqParser, parsers.NDJSONParser)
     renderer_classes = _default_renderers + (
-        renderers.GeoJSONRenderer, renderers.KMLRenderer, renderers.KMZRenderer)
+        renderers.GeoJSONRenderer, renderers.GeoJSONSeqRenderer,
+        renderers.FlatGeobufRenderer, renderers.KMLRenderer,
+        renderers.KMZRenderer)
 
 
 class GeoDetailView(BaseGeoView, RetrieveAPIView):
@@ -30,7 +84,55 @@ class GeoListView(BaseGeoView, ListAPIView):
     """Generic view for listing a geoqueryset."""
 
 
-class GeoListCreateAPIView(BaseGeoView, ListCreateAPIView):
+class StreamingGeoListView(GeoListView):
+    """Generic view for streaming an unpaginated geoqueryset as GeoJSON, a
+    GeoJSON text sequence, or FlatGeobuf.
+
+    Features are serialized and sent while iterating over the queryset, so the
+    full FeatureCollection is never held in memory.
+    """
+    pagination_class = None
+    # Rows fetched per database round trip.
+    chunk_size = 2000
+    streaming_renderers = (renderers.GeoJSONRenderer,
+                           renderers.GeoJSONSeqRenderer,
+                           renderers.FlatGeobufRenderer)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(StreamingGeoListView, self).finalize_response(
+            request, response, *args, **kwargs)
+        renderer = getattr(response, 'accepted_renderer', None)
+        data = getattr(response, 'data', None)
+        if (isinstance(renderer, self.streaming_renderers)
+                and getattr(data, 'is_lazy', False)):
+            headers = response._headers
+            if isinstance(renderer, renderers.GeoJSONSeqRenderer):
+                content = data.itersequence()
+            elif isinstance(renderer, renderers.FlatGeobufRenderer):
+                content = renderer.iterencode(
+                    data, self.get_renderer_context())
+            else:
+                content = data.iterencode()
+            response = StreamingHttpResponse(content)
+            response._headers = headers
+            content_type = renderer.media_type
+            if renderer.charset:
+                content_type += '; charset=%s' % renderer.charset
+            response['Content-Type'] = content_type
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if not isinstance(request.accepted_renderer,
+                          self.streaming_renderers):
+            return super(StreamingGeoListView, self).list(
+                request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.iter_features(self.chunk_size))
+
+
+class GeoListCreateAPIView(mixins.BulkCreateMixin, BaseGeoView,
+                           ListCreateAPIView):
     """Generic view for listing or creating geomodel instances."""
 
 
@@ -54,10 +156,59 @@ class BaseRasterView(mixins.ModelSerializerMixin,
         if isinstance(getattr(response, 'accepted_renderer', None),
                       renderers.gdal.BaseGDALRenderer):
             headers = response._headers
-            response = FileResponse(response.rendered_content)
+            content = response.rendered_content
+            if hasattr(content, 'read'):
+                response = self.file_response(request, content, headers)
+            else:
+                response = StreamingHttpResponse(content)
+                response._headers = headers
+        return response
+
+    def file_response(self, request, fp, headers):
+        """Returns a streaming response for a file, with partial content for
+        a satisfiable Range request so clients may read parts of large rasters.
+
+        Arguments:
+        request -- Request
+        fp -- file object
+        headers -- response headers to keep
+        """
+        fp.seek(0, 2)
+        size = fp.tell()
+        fp.seek(0)
+        try:
+            byte_range = (parse_range(request.META.get('HTTP_RANGE'), size)
+                          if self._range_applies(request) else None)
+        except ValueError:
+            fp.close()
+            response = HttpResponse(
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = 'bytes */%d' % size
+            return response
+        if byte_range is None:
+            response = FileResponse(fp)
             response._headers = headers
+        else:
+            first, last = byte_range
+            response = StreamingHttpResponse(
+                _read_range(fp, first, last),
+                status=status.HTTP_206_PARTIAL_CONTENT)
+            response._headers = headers
+            response['Content-Range'] = 'bytes %d-%d/%d' % (first, last, size)
+            response['Content-Length'] = last - first + 1
+        response['Accept-Ranges'] = 'bytes'
         return response
 
+    def _range_applies(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if not if_range:
+            return True
+        # Ranges of a changed file are meaningless, send it in full instead.
+        etag, mtime = getattr(self, 'validators', None) or (None, None)
+        return if_range in (etag, mtime and http_date(mtime))
+
     def get_queryset(self):
         # Filter first so later RasterQuerySet methods always see a subset
         # instead of all available records.
@@ -82,14 +233,32 @@ class BaseRasterView(mixins.ModelSerializerMixin,
         return super(BaseRasterView, self).paginator
 
 
-class RasterDetailView(BaseRasterView, RetrieveAPIView):
+class RasterDetailView(mixins.ConditionalMixin, BaseRasterView,
+                       RetrieveAPIView):
     """View providing access to a Raster model instance."""
     filter_backends = _default_filters + (filters.RasterQuerySetFilter,)
     renderer_classes = _default_renderers + (
         renderers.GeoTIFFRenderer,
+        renderers.COGRenderer,
         renderers.HFARenderer,
     )
 
+    def get(self, request, *args, **kwargs):
+        # Look up the instance alone, filters may clip or convert rasters.
+        obj = get_object_or_404(self.get_queryset())
+        response = self.not_modified(request, obj)
+        if response is not None:
+            return response
+        return super(RasterDetailView, self).get(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        # Accept uploaded query geometries or zones too large for a url.
+        return self.retrieve(request, *args, **kwargs)
+
 
 class RasterListView(BaseRasterView, ListAPIView):
     """View providing access to a Raster model QuerySet."""
+
+    def post(self, request, *args, **kwargs):
+        # Accept uploaded query geometries or zones too large for a url.
+        return self.list(request, *args, **kwargs)
@@ -0,0 +1,217 @@
+import collections
+import multiprocessing
+import time
+
+from django.apps import apps
+from django.contrib.gis import gdal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from greenwich import tile
+from rest_framework.test import APIRequestFactory
+
+from spillway import forms, tilecache, views
+from spillway.models import AbstractRasterStore
+
+# Latitude limits of the web mercator tile grid.
+MAX_LAT = 85.0511287798
+# Tiles per side for a unit of work without metatiles.
+BLOCK_SIZE = 8
+
+def render_block(job):
+    """Returns a list of (TileKey, data) pairs for a block of tiles.
+
+    Tiles are rendered through the tile views so output matches what clients
+    are served. This runs in worker processes, so tiles are collected in memory
+    and stored by the parent process. Keys are made from the parent's TileKey
+    as layer versions are not necessarily shared with workers.
+
+    Arguments:
+    job -- tuple of TileKey, model label, raster pk, format, params, metatile
+        size, and a list of (x, y, z) tiles
+    """
+    proto, label, pk, format, params, metatile, tiles = job
+    cache = tilecache.MemoryTileCache(maxsize=len(tiles) + metatile ** 2)
+    model = apps.get_model(label)
+    view_class = views.TileView if pk is None else views.RasterTileView
+    view = view_class.as_view(queryset=model._default_manager.all(),
+                              tile_cache=cache, metatile=metatile)
+    factory = APIRequestFactory()
+    for x, y, z in tiles:
+        kwargs = {'x': x, 'y': y, 'z': z, 'format': format}
+        if pk is not None:
+            kwargs['pk'] = pk
+        view(factory.get('/', params), **kwargs)
+    return [(proto._replace(z=key.z, x=key.x, y=key.y), data)
+            for key, data in cache.items()]
+
+
+class Command(BaseCommand):
+    help = 'Renders map tiles for a model into a tile cache ahead of requests.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='model label as app_label.ModelName')
+        parser.add_argument(
+            '--pk', action='append',
+            help='raster primary key to seed, may be repeated, defaults to all')
+        parser.add_argument('--zoom', default='0-10',
+                            help='zoom level or range as min-max')
+        parser.add_argument('--bbox', help='extent in degrees as w,s,e,n')
+        parser.add_argument('--geometry',
+                            help='GeoJSON or WKT geometry to restrict tiles to')
+        parser.add_argument('--format', default='png',
+                            choices=('png', 'jpeg', 'geojson', 'pbf'))
+        parser.add_argument('--style', help='Mapnik style name')
+        parser.add_argument('--limits', help='raster colorizer limits as min,max')
+        parser.add_argument('--band', type=int, help='raster band')
+        parser.add_argument('--cache', default='mbtiles',
+                            choices=('disk', 'mbtiles', 'django'))
+        parser.add_argument(
+            '--location',
+            help='directory for disk or mbtiles caches, or Django cache alias')
+        parser.add_argument('--metatile', type=int, default=1,
+                            help='tiles per side to render at once')
+        parser.add_argument('--processes', type=int,
+                            default=multiprocessing.cpu_count())
+        parser.add_argument('--force', action='store_true',
+                            help='render tiles which are already cached')
+        parser.add_argument('--progress', type=float, default=10,
+                            help='seconds between progress reports')
+
+    def get_cache(self, options):
+        backend, location = options['cache'], options['location']
+        if backend == 'django':
+            return tilecache.DjangoTileCache(location or 'default')
+        if not location:
+            raise CommandError('--location is required for %s caches' % backend)
+        if backend == 'disk':
+            return tilecache.DiskTileCache(location)
+        return tilecache.MBTilesCache(location)
+
+    def get_zooms(self, zoom):
+        try:
+            zooms = [int(z) for z in zoom.split('-')]
+        except ValueError:
+            raise CommandError('Invalid zoom range: %s' % zoom)
+        return range(zooms[0], zooms[-1] + 1)
+
+    def get_geometry(self, options):
+        value = options['geometry']
+        if not value:
+            return None
+        try:
+            geom = gdal.OGRGeometry(value)
+        except (gdal.GDALException, TypeError, ValueError):
+            raise CommandError('Invalid geometry: %s' % value)
+        if geom.srs:
+            geom.transform(4326)
+        return geom
+
+    def iter_tiles(self, bbox, zooms, geom=None):
+        """Yields (x, y, z) tiles intersecting a bbox and optional geometry."""
+        w, s, e, n = bbox
+        bbox = (max(w, -180), max(s, -MAX_LAT), min(e, 180), min(n, MAX_LAT))
+        for x, y, z in tile.from_bbox(bbox, zooms):
+            if geom is not None:
+                tilegeom = gdal.OGRGeometry.from_bbox(
+                    tile.to_lonlat(x, y, z) + tile.to_lonlat(x + 1, y + 1, z))
+                if not tilegeom.intersects(geom):
+                    continue
+            yield x, y, z
+
+    def iter_jobs(self, layer, label, pk, params, options):
+        """Yields render_block job tuples of tiles missing from the cache."""
+        format, metatile = options['format'], options['metatile']
+        geom = self.get_geometry(options)
+        if options['bbox']:
+            bbox = [float(v) for v in options['bbox'].split(',')]
+        elif geom is not None:
+            bbox = geom.extent
+        elif pk is None:
+            bbox = layer.extent(srid=4326)
+        else:
+            bbox = layer.geom.transform(4326, clone=True).extent
+        if format in ('png', 'jpeg'):
+            form_class = forms.RasterTileForm
+        else:
+            form_class = forms.VectorTileForm
+        form = form_class(dict(params, x=0, y=0, z=0, format=format))
+        if not form.is_valid():
+            raise CommandError(form.errors)
+        proto = tilecache.TileKey.from_form(layer, form, format)
+        size = metatile if metatile > 1 else BLOCK_SIZE
+        job = lambda tiles: (proto, label, pk, format, params, metatile,
+                             tiles)
+        blocks = collections.OrderedDict()
+        strip = None
+        for x, y, z in self.iter_tiles(bbox, self.get_zooms(options['zoom']),
+                                       geom):
+            # Tiles arrive in column order, so blocks are complete once the
+            # column strip changes.
+            if (z, x // size) != strip:
+                for tiles in blocks.values():
+                    yield job(tiles)
+                blocks.clear()
+                strip = (z, x // size)
+            key = proto._replace(x=x, y=y, z=z)
+            # Skipping cached tiles allows interrupted runs to resume.
+            if not options['force'] and self.cache.get(key) is not None:
+                self.skipped += 1
+                continue
+            blocks.setdefault(y // size, []).append((x, y, z))
+        for tiles in blocks.values():
+            yield job(tiles)
+
+    def report(self, force=False):
+        now = time.time()
+        if not force and now - self.reported < self.interval:
+            return
+        self.reported = now
+        elapsed = now - self.started
+        self.stdout.write('%d tiles rendered, %d skipped, %.1f tiles/s' % (
+            self.rendered, self.skipped, self.rendered / (elapsed or 1)))
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError) as exc:
+            raise CommandError(exc)
+        label = model._meta.label
+        params = {k: options[k] for k in ('style', 'limits', 'band')
+                  if options[k] is not None}
+        self.cache = self.get_cache(options)
+        self.rendered = self.skipped = 0
+        self.started = self.reported = time.time()
+        self.interval = options['progress']
+        if issubclass(model, AbstractRasterStore):
+            if options['format'] not in ('png', 'jpeg'):
+                raise CommandError('Raster tiles must be png or jpeg')
+            objects = model._default_manager.all()
+            if options['pk']:
+                objects = objects.filter(pk__in=options['pk'])
+            layers = [(obj, obj.pk) for obj in objects]
+        else:
+            layers = [(model._default_manager.all(), None)]
+        processes = options['processes']
+        pool = None
+        if processes > 1:
+            # Forked workers must open their own database connections.
+            for conn in connections.all():
+                conn.close()
+            pool = multiprocessing.Pool(processes)
+        try:
+            for layer, pk in layers:
+                jobs = self.iter_jobs(layer, label, pk, params, options)
+                if pool is None:
+                    results = (render_block(job) for job in jobs)
+                else:
+                    results = pool.imap_unordered(render_block, jobs)
+                for items in results:
+                    for key, data in items:
+                        self.cache.set(key, data)
+                    self.rendered += len(items)
+                    self.report()
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        self.report(force=True)
@@ -1,7 +1,100 @@
-from rest_framework import exceptions
+import hashlib
+
+from django.template.response import SimpleTemplateResponse
+from django.utils import six
+from django.utils.cache import get_conditional_response
+from django.utils.encoding import force_bytes
+from django.utils.http import http_date, quote_etag
+from rest_framework import exceptions, status
 from rest_framework.renderers import TemplateHTMLRenderer
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from spillway import collections as sc, timing
+from spillway.tilecache import TileKey, layer_version
+
+
+class BulkCreateMixin(object):
+    """Creates many features at once from a FeatureCollection or a list of
+    features, inserted in batches of batch_size records.
+    """
+    batch_size = 1000
+
+    def create(self, request, *args, **kwargs):
+        data = request.data
+        if not (sc.has_features(data) or isinstance(data, list)):
+            return super(BulkCreateMixin, self).create(
+                request, *args, **kwargs)
+        serializer = self.get_serializer(data=data, many=True)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def get_serializer_context(self):
+        context = super(BulkCreateMixin, self).get_serializer_context()
+        context['batch_size'] = self.batch_size
+        return context
+
+
+class ConditionalMixin(object):
+    """Answers conditional requests for unchanged layers with 304 Not Modified
+    before anything is rendered, and sets ETag and Last-Modified headers.
+
+    Strong ETags derive from the layer version and the request parameters.
+    Without a known layer version, responses already encoded as bytes, such as
+    map tiles, are given an ETag from their content instead.
+    """
+    validators = None
+
+    def not_modified(self, request, layer):
+        """Returns a 304 response if the client has the current version of a
+        response, a 412 response for a failed If-Match, otherwise None.
+
+        Arguments:
+        request -- Request
+        layer -- raster model instance or GeoQuerySet
+        """
+        version, mtime = layer_version(layer)
+        if version is None:
+            return None
+        params = (version, request.accepted_renderer.format,
+                  sorted(request.query_params.lists()),
+                  sorted(six.iteritems(self.kwargs)))
+        self.validators = (self._etag(repr(params)), mtime)
+        return self._conditional_response(request)
+
+    def _etag(self, data):
+        return quote_etag(hashlib.md5(force_bytes(data)).hexdigest())
+
+    def _conditional_response(self, request, response=None):
+        etag, mtime = self.validators
+        if mtime is not None:
+            mtime = int(mtime)
+        conditional = get_conditional_response(
+            request, etag=etag, last_modified=mtime, response=response)
+        if conditional is not None:
+            self._set_validators(conditional)
+        return conditional
+
+    def _set_validators(self, response):
+        etag, mtime = self.validators
+        response['ETag'] = etag
+        if mtime is not None:
+            response['Last-Modified'] = http_date(mtime)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(ConditionalMixin, self).finalize_response(
+            request, response, *args, **kwargs)
+        if response.status_code not in (status.HTTP_200_OK,
+                                        status.HTTP_206_PARTIAL_CONTENT):
+            return response
+        if self.validators:
+            self._set_validators(response)
+        elif isinstance(getattr(response, 'data', None), bytes):
+            self.validators = (self._etag(response.data), None)
+            response = self._conditional_response(request, response)
+        return response
+
 
 class ModelSerializerMixin(object):
     """Provides generic model serializer classes to views."""
@@ -41,3 +134,83 @@ class ResponseExceptionMixin(object):
             self.request.accepted_renderer = render_cls()
             self.request.accepted_media_type = mtype
         return response
+
+
+class TileCacheMixin(object):
+    """Provides tile caching to views with a BaseTileCache instance.
+
+    With a metatile size above one, cache misses render a block of metatile by
+    metatile tiles at once and store those within layer extents.
+    """
+    tile_cache = None
+    metatile = 1
+
+    def cached_tile(self, layer, form, render, render_metatile=None):
+        """Returns tile data from the cache or the render callables.
+
+        Arguments:
+        layer -- raster model instance or GeoQuerySet
+        form -- TileForm for the request
+        render -- callable returning tile data as bytes
+        Keyword args:
+        render_metatile -- callable taking the metatile size and returning a
+            dict of tile data keyed by (x, y), omitting tiles not found
+        """
+        if self.tile_cache is None or not form.is_valid():
+            return render()
+        key = TileKey.from_form(
+            layer, form, self.request.accepted_renderer.format)
+        if render_metatile is None or self.metatile < 2:
+            return self.tile_cache.get_or_set(key, render)
+        data = self.tile_cache.get(key)
+        if data is None:
+            tiles = render_metatile(self.metatile)
+            for (x, y), tiledata in tiles.items():
+                self.tile_cache.set(key._replace(x=x, y=y), tiledata)
+            data = tiles[key.x, key.y]
+        return data
+
+
+class TimingMixin(object):
+    """Records timings of request phases as a Server-Timing header, log
+    records of the spillway.timing logger, and the timing.request_timed
+    signal for metrics exporters.
+
+    Responses are rendered within the view so rendering is timed, and
+    streamed responses are logged once sent in full.
+    """
+    # Expose phase timings to clients in a Server-Timing header.
+    server_timing_header = True
+
+    def dispatch(self, request, *args, **kwargs):
+        timer = timing.Timer()
+        with timer.activate():
+            response = super(TimingMixin, self).dispatch(
+                request, *args, **kwargs)
+        if self.server_timing_header:
+            response['Server-Timing'] = timer.header()
+        if response.streaming:
+            response.streaming_content = self._stream_timed(
+                timer, request, response, response.streaming_content)
+        else:
+            timer.log(request, response, self.__class__)
+        return response
+
+    def _stream_timed(self, timer, request, response, content):
+        try:
+            for chunk in timer.iterate(content):
+                yield chunk
+        finally:
+            timer.log(request, response, self.__class__)
+
+    def filter_queryset(self, queryset):
+        with timing.phase('filter'):
+            return super(TimingMixin, self).filter_queryset(queryset)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        with timing.phase('render'):
+            response = super(TimingMixin, self).finalize_response(
+                request, response, *args, **kwargs)
+            if isinstance(response, SimpleTemplateResponse):
+                response.render()
+        return response
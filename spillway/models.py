@@ -1,19 +1,28 @@
 import os
 import datetime
+import json
+import logging
 import tempfile
+import threading
 
 from django.utils import six
 if six.PY3:
     buffer = memoryview
 from django.contrib.gis.db import models
+from django.db import transaction
 from django.utils.deconstruct import deconstructible
 from django.utils.translation import ugettext_lazy as _
 import greenwich
+from greenwich.geometry import Envelope, transform
 from greenwich.io import MemFileIO
+from greenwich.raster import AffineTransform, geom_to_array
 import numpy as np
+from osgeo import gdal
 
+from spillway import cog, timing
 from spillway.query import RasterQuerySet
 
+logger = logging.getLogger(__name__)
 _imgdrivers = greenwich.ImageDriver.filter_copyable()
 
 
@@ -30,6 +39,18 @@ class UploadDir(object):
 upload_to = UploadDir('data')
 
 
+def _describe(values, vmin, vmax, bins):
+    # Summarizes a flat array of valid pixel values for caching as JSON.
+    stats = {'min': float(vmin), 'max': float(vmax), 'count': int(values.size)}
+    if values.size:
+        counts, edges = np.histogram(values, bins, (vmin, vmax))
+        stats.update(
+            mean=float(values.mean()), std=float(values.std()),
+            percentiles=[float(v) for v in np.percentile(values, range(101))],
+            histogram=counts.tolist())
+    return stats
+
+
 class AbstractRasterStore(models.Model):
     """Abstract model for raster data storage."""
     image = models.FileField(_('raster file'), upload_to=upload_to)
@@ -44,8 +65,24 @@ class AbstractRasterStore(models.Model):
     # Spatial resolution
     xpixsize = models.FloatField(_('West to East pixel resolution'))
     ypixsize = models.FloatField(_('North to South pixel resolution'))
+    # Cached per band statistics as JSON, see statistics().
+    bandstats = models.TextField(_('band statistics'), blank=True,
+                                 default='', editable=False)
     objects = RasterQuerySet()
     driver_settings = greenwich.ImageDriver.defaults
+    # Tiling, compression, and overview resampling for COG output.
+    cog_settings = {'blocksize': 512, 'compress': 'deflate',
+                    'resampling': 'nearest'}
+    # Max pixels per side to read when computing statistics, GDAL uses
+    # overviews when available for reduced resolution reads.
+    quantile_size = 1024
+    histogram_bins = 64
+    # Overview decimation factors to build on save, none by default, or
+    # 'auto' to halve down to a 256 pixel tile.
+    overview_levels = ()
+    overview_resampling = 'average'
+    # Build overviews in a background thread after the save is committed.
+    overview_async = False
 
     class Meta:
         unique_together = ('image', 'event')
@@ -60,11 +97,12 @@ class AbstractRasterStore(models.Model):
         imgfield = self.image
         if not imgfield.storage.exists(imgfield):
             imgfield.save(imgfield.name, imgfield, save=False)
+        stats = self._cached_statistics()
         with self.raster() as r:
-            band = r[-1]
-            bmin, bmax = band.GetMinimum(), band.GetMaximum()
-            if bmin is None or bmax is None:
-                bmin, bmax = band.ComputeRasterMinMax()
+            if stats is None:
+                stats = self._compute_statistics(r)
+                self.bandstats = json.dumps(stats)
+            bmin, bmax = (stats['bands'][-1][k] for k in ('min', 'max'))
             self.geom = buffer(r.envelope.polygon.ExportToWkb())
             if r.sref.srid:
                 self.geom.srid = r.sref.srid
@@ -78,26 +116,235 @@ class AbstractRasterStore(models.Model):
             self.event = datetime.date.today()
         super(AbstractRasterStore, self).clean_fields(*args, **kwargs)
 
-    def linear(self, limits=None, k=5):
-        """Returns an ndarray of linear breaks."""
-        start, stop = limits or (self.minval, self.maxval)
+    def linear(self, limits=None, k=5, band=None):
+        """Returns an ndarray of linear breaks.
+
+        Keyword args:
+        limits -- (min, max) tuple, defaults to the value range
+        k -- number of breaks
+        band -- 1-based band number for the value range, defaults to the
+            last band
+        """
+        if limits:
+            start, stop = limits
+        elif band is None:
+            start, stop = self.minval, self.maxval
+        else:
+            stats = self.statistics(band)
+            start, stop = stats['min'], stats['max']
         return np.linspace(start, stop, k)
 
-    def quantiles(self, k=5):
-        """Returns an ndarray of quantile breaks."""
-        arr = self.array()
-        q = list(np.linspace(0, 100, k))
-        return np.percentile(arr.compressed(), q)
+    def quantiles(self, k=5, band=None):
+        """Returns an ndarray of quantile breaks from cached statistics.
+
+        Keyword args:
+        k -- number of breaks
+        band -- 1-based band number, defaults to all bands
+        """
+        percentiles = self.statistics(band).get('percentiles')
+        if not percentiles:
+            return np.full(k, np.nan)
+        return np.interp(np.linspace(0, 100, k), range(101), percentiles)
+
+    def histogram(self, band=None):
+        """Returns a tuple of histogram counts and bin edges ndarrays from
+        cached statistics.
+
+        Keyword args:
+        band -- 1-based band number, defaults to all bands
+        """
+        stats = self.statistics(band)
+        counts = np.array(stats.get('histogram', ()), dtype=int)
+        return counts, np.linspace(stats['min'], stats['max'], len(counts) + 1)
+
+    def statistics(self, band=None):
+        """Returns a dict of band statistics, computed on save and cached with
+        the model.
+
+        Minimum and maximum values are read from the raster or computed in
+        full, the count, mean, std, histogram, and percentiles from 0 to 100
+        from a reduced resolution read of no more than quantile_size pixels
+        per side. Missing or stale statistics are computed for this instance
+        only, nothing is written to the database, see update_statistics().
+
+        Keyword args:
+        band -- 1-based band number, defaults to all bands
+        """
+        stats = self._cached_statistics()
+        if stats is None:
+            with self.raster() as r:
+                stats = self._compute_statistics(r)
+            self.bandstats = json.dumps(stats)
+        return stats['all'] if band is None else stats['bands'][band - 1]
+
+    def update_statistics(self):
+        """Computes and saves band statistics, returning them as a dict.
+
+        Use this to fill in statistics of rows saved before they were cached,
+        rather than computing them while serving requests.
+        """
+        with self.raster() as r:
+            stats = self._compute_statistics(r)
+        self.bandstats = json.dumps(stats)
+        if self.pk is not None:
+            type(self)._default_manager.filter(pk=self.pk).update(
+                bandstats=self.bandstats)
+        return stats
+
+    def _cached_statistics(self):
+        # Statistics are stale once the image is replaced.
+        if self.bandstats:
+            stats = json.loads(self.bandstats)
+            if stats.get('image') == self.image.name:
+                return stats
+        return None
+
+    def _compute_statistics(self, r):
+        nx, ny = r.size
+        factor = max(nx, ny) / float(self.quantile_size)
+        if factor > 1:
+            bufsize = {'buf_xsize': max(int(nx / factor), 1),
+                       'buf_ysize': max(int(ny / factor), 1)}
+        else:
+            bufsize = {}
+        with timing.phase('statistics'):
+            arr = r.ds.ReadAsArray(0, 0, nx, ny, **bufsize)
+            nodata = r.nodata
+            if nodata is not None:
+                arr = np.ma.masked_values(arr, nodata, copy=False)
+            else:
+                arr = np.ma.masked_array(arr, copy=False)
+            arr = arr.reshape((r.ds.RasterCount, -1))
+            bands = []
+            for i, values in enumerate(arr, 1):
+                band = r.ds.GetRasterBand(i)
+                bmin, bmax = band.GetMinimum(), band.GetMaximum()
+                if bmin is None or bmax is None:
+                    bmin, bmax = band.ComputeRasterMinMax()
+                bands.append(_describe(values.compressed(), bmin, bmax,
+                                       self.histogram_bins))
+            allbands = _describe(arr.compressed(),
+                                 min(b['min'] for b in bands),
+                                 max(b['max'] for b in bands),
+                                 self.histogram_bins)
+        return {'image': self.image.name, 'bands': bands, 'all': allbands}
 
     def save(self, *args, **kwargs):
         self.full_clean()
         super(AbstractRasterStore, self).save(*args, **kwargs)
+        levels = self.get_overview_levels()
+        if not levels:
+            return
+        if self.overview_async:
+            thread = threading.Thread(target=self.build_overviews,
+                                      args=(levels,))
+            thread.daemon = True
+            transaction.on_commit(thread.start)
+        else:
+            self.build_overviews(levels)
+
+    def get_overview_levels(self):
+        """Returns a list of overview decimation factors to build on save."""
+        if self.overview_levels == 'auto':
+            return cog.overview_levels(self.width, self.height, 256)
+        return list(self.overview_levels or ())
+
+    def build_overviews(self, levels=None, resampling=None):
+        """Builds overviews for the raster file unless present already.
 
-    def array(self, geom=None):
+        GeoTIFFs opened for update get internal overviews, other formats and
+        read-only files an external .ovr file.
+
+        Keyword args:
+        levels -- sequence of overview decimation factors
+        resampling -- resampling method as str, defaults to
+            overview_resampling
+        """
+        levels = levels or self.get_overview_levels()
+        if not levels:
+            return
+        path = self.image.path
+        ds = gdal.Open(path, gdal.GA_Update)
+        if ds is None:
+            logger.warning('%s is not writable, building external overviews',
+                           path)
+            ds = gdal.Open(path)
+        if ds.GetRasterBand(1).GetOverviewCount() < len(levels):
+            with timing.phase('overviews'):
+                err = ds.BuildOverviews(
+                    (resampling or self.overview_resampling).upper(), levels)
+            if err != gdal.CE_None:
+                logger.warning('Building overviews for %s failed: %s',
+                               path, gdal.GetLastErrorMsg())
+        ds = None
+
+    def overview(self, resolution):
+        """Returns the 0-based index of the coarsest overview no coarser than
+        a pixel size, or None for full resolution.
+
+        Arguments:
+        resolution -- pixel size in raster coordinate units
+        """
+        index = None
+        with self.raster() as r:
+            band = r.ds.GetRasterBand(1)
+            for i in range(band.GetOverviewCount()):
+                factor = self.width / float(band.GetOverview(i).XSize)
+                if abs(self.xpixsize) * factor > resolution:
+                    break
+                index = i
+        return index
+
+    def array(self, geom=None, band=None, resolution=None):
+        """Returns a MaskedArray of pixel values.
+
+        Only the pixel window covering the geometry envelope is read.
+
+        Keyword args:
+        geom -- geometry for masking or spatial subsetting
+        band -- 1-based band number to read, defaults to all bands
+        resolution -- pixel size in raster coordinate units to read at, read
+            from overviews when coarser than the raster
+        """
         with self.raster() as r:
-            return r.masked_array(geom)
+            if band is None and not resolution:
+                return r.masked_array(geom)
+            src = r.ds if band is None else r.ds.GetRasterBand(band)
+            return self._band_array(r, src, geom, resolution)
         return np.array(())
 
+    def _band_array(self, r, band, geom=None, resolution=None):
+        # Matches Raster.masked_array() while reading a band or all bands.
+        if geom is None:
+            window, env = (0, 0) + tuple(r.size), None
+        else:
+            geom = transform(geom, r.sref)
+            env = Envelope.from_geom(geom).intersect(r.envelope)
+            window = r.get_offset(env)
+        factor = float(resolution or 0) / abs(r.affine.scale[0])
+        bufsize = {}
+        if factor > 1:
+            bufsize = {'buf_xsize': max(int(window[2] / factor), 1),
+                       'buf_ysize': max(int(window[3] / factor), 1)}
+        arr = band.ReadAsArray(*window, **bufsize)
+        if hasattr(band, 'GetNoDataValue'):
+            nodata = band.GetNoDataValue()
+        else:
+            nodata = r.nodata
+        if nodata is not None:
+            arr = np.ma.masked_values(arr, nodata, copy=False)
+        else:
+            arr = np.ma.masked_array(arr, copy=False)
+        if env is not None and geom.GetGeometryName() != 'POINT':
+            rows, cols = arr.shape[-2:]
+            x, xres, xrot, y, yrot, yres = tuple(r.affine)
+            affine = AffineTransform(x, xres * window[2] / float(cols), xrot,
+                                     y, yrot, yres * window[3] / float(rows))
+            affine.origin = env.ul
+            mask = ~np.ma.make_mask(geom_to_array(geom, (cols, rows), affine))
+            arr.mask = np.ma.getmaskarray(arr) | mask
+        return arr
+
     def raster(self):
         imfield = self.image
         # Check _file attr to avoid opening a file handle.
@@ -110,11 +357,28 @@ class AbstractRasterStore(models.Model):
             path = self.image.path
         return greenwich.Raster(path)
 
+    def warp(self, path, srid=None, resolution=None):
+        """Writes the raster warped to another spatial reference and/or pixel
+        size to a path, reading from overviews for coarser pixel sizes.
+
+        Arguments:
+        path -- output file path
+        Keyword args:
+        srid -- spatial reference identifier as int for warping to
+        resolution -- pixel size in target coordinate units
+        """
+        with self.raster() as r:
+            gdal.Warp(path, r.ds, dstSRS='EPSG:%d' % srid if srid else None,
+                      xRes=resolution, yRes=resolution,
+                      resampleAlg=self.overview_resampling)
+
     def convert(self, format=None, geom=None):
         imgpath = self.image.path
         # Handle format as .tif, tif, or tif.zip
         ext = format or os.path.splitext(imgpath)[-1][1:]
         ext = os.path.splitext(ext)[0]
+        if ext == cog.FORMAT:
+            return self._convert_cog(geom)
         # No conversion is needed if the original format without clipping
         # is requested.
         if not geom and imgpath.endswith(ext):
@@ -125,11 +389,29 @@ class AbstractRasterStore(models.Model):
         if settings:
             driver.settings = settings
         memio = MemFileIO()
-        if geom:
-            with self.raster() as r, r.clip(geom) as clipped:
-                clipped.save(memio, driver)
-        else:
-            driver.copy(imgpath, memio.name)
+        with timing.phase('convert'):
+            if geom:
+                with self.raster() as r, r.clip(geom) as clipped:
+                    clipped.save(memio, driver)
+            else:
+                driver.copy(imgpath, memio.name)
+        self._set_converted(memio, ext)
+
+    def _convert_cog(self, geom=None):
+        settings = self.cog_settings
+        memio = MemFileIO()
+        with timing.phase('convert'), self.raster() as r:
+            if geom:
+                with r.clip(geom) as clipped:
+                    cog.write(clipped.ds, memio.name, **settings)
+            # Files stored as COGs are served as is.
+            elif cog.is_cog(r.ds, settings.get('blocksize', 512)):
+                return
+            else:
+                cog.write(r.ds, memio.name, **settings)
+        self._set_converted(memio, cog.EXTENSION)
+
+    def _set_converted(self, memio, ext):
         self.pk = None
         imgfield = self.image
         name = os.extsep.join((os.path.splitext(imgfield.name)[0], ext))
@@ -0,0 +1,237 @@
+"""Mapbox vector tile encoding from WKB geometries.
+
+A minimal protocol buffer writer for version 2 of the vector tile spec, see
+https://github.com/mapbox/vector-tile-spec/tree/master/2.1
+"""
+import datetime
+import decimal
+import struct
+
+from django.utils import six
+
+from spillway.compat import json, JSONEncoder
+from spillway.wkb import WKBReader
+
+# Geometry types
+UNKNOWN, POINT, LINESTRING, POLYGON = range(4)
+# Geometry commands
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+# Protobuf wire types
+VARINT, FIXED64, LENGTH_DELIMITED = 0, 1, 2
+
+def zigzag(n):
+    """Returns a zigzag encoded int, mapping signed ints to unsigned."""
+    return (n << 1) ^ (n >> 63)
+
+def command(cmd, count=1):
+    """Returns a geometry command integer."""
+    return (cmd & 0x7) | (count << 3)
+
+def _varint(n):
+    buf = bytearray()
+    while True:
+        towrite = n & 0x7f
+        n >>= 7
+        if n:
+            buf.append(towrite | 0x80)
+        else:
+            buf.append(towrite)
+            return buf
+
+def _key(field, wiretype):
+    return _varint((field << 3) | wiretype)
+
+def _delimited(field, data):
+    return _key(field, LENGTH_DELIMITED) + _varint(len(data)) + data
+
+def _packed(field, values):
+    data = bytearray()
+    for val in values:
+        data += _varint(val)
+    return _delimited(field, data)
+
+def _encode_value(value):
+    """Returns a protobuf encoded tile Value message."""
+    if isinstance(value, bool):
+        return _key(7, VARINT) + _varint(int(value))
+    elif isinstance(value, six.integer_types):
+        if value < 0:
+            return _key(6, VARINT) + _varint(zigzag(value))
+        return _key(5, VARINT) + _varint(value)
+    elif isinstance(value, (float, decimal.Decimal)):
+        return _key(3, FIXED64) + bytearray(struct.pack('<d', float(value)))
+    elif isinstance(value, (datetime.date, datetime.time)):
+        value = value.isoformat()
+    return _delimited(1, six.text_type(value).encode('utf-8'))
+
+
+class GeometryEncoder(object):
+    """Encodes tile space coordinates as vector tile geometry commands."""
+
+    def __init__(self):
+        self.cursor = (0, 0)
+        self.commands = []
+
+    def _params(self, points):
+        x0, y0 = self.cursor
+        for x, y in points:
+            self.commands.extend((zigzag(x - x0), zigzag(y - y0)))
+            x0, y0 = x, y
+        self.cursor = (x0, y0)
+
+    def _line(self, points, cmd_close=False):
+        self.commands.append(command(MOVE_TO))
+        self._params(points[:1])
+        self.commands.append(command(LINE_TO, len(points) - 1))
+        self._params(points[1:])
+        if cmd_close:
+            self.commands.append(command(CLOSE_PATH))
+
+    def points(self, points):
+        if points:
+            self.commands.append(command(MOVE_TO, len(points)))
+            self._params(points)
+
+    def linestring(self, points):
+        points = _dedupe(points)
+        if len(points) > 1:
+            self._line(points)
+
+    def polygon(self, rings):
+        for i, ring in enumerate(rings):
+            ring = _dedupe(ring)
+            # Drop the closing point, ClosePath handles it.
+            if len(ring) > 1 and ring[0] == ring[-1]:
+                ring = ring[:-1]
+            if len(ring) < 3:
+                # A degenerate exterior ring drops all of its holes too.
+                if i == 0:
+                    return
+                continue
+            area = _signed_area(ring)
+            # Exterior rings must have positive area in tile space where y
+            # points down, interior rings negative.
+            if (i == 0 and area < 0) or (i > 0 and area > 0):
+                ring.reverse()
+            self._line(ring, cmd_close=True)
+
+def _dedupe(points):
+    """Returns rounded integer points without consecutive duplicates."""
+    deduped = []
+    for x, y in points:
+        pt = (int(round(x)), int(round(y)))
+        if not deduped or deduped[-1] != pt:
+            deduped.append(pt)
+    return deduped
+
+def _signed_area(ring):
+    area = 0
+    for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]):
+        area += x0 * y1 - x1 * y0
+    return area
+
+def encode_geometry(gtype, coords):
+    """Returns a (tile geometry type, command list) tuple.
+
+    Arguments:
+    gtype -- WKB geometry type id
+    coords -- coordinate sequences as returned from WKBReader.read()
+    """
+    encoder = GeometryEncoder()
+    if gtype == 1:
+        encoder.points(_dedupe([coords]))
+        return POINT, encoder.commands
+    elif gtype == 4:
+        encoder.points(_dedupe([c for t, c in coords]))
+        return POINT, encoder.commands
+    elif gtype == 2:
+        encoder.linestring(coords)
+        return LINESTRING, encoder.commands
+    elif gtype == 5:
+        for t, line in coords:
+            encoder.linestring(line)
+        return LINESTRING, encoder.commands
+    elif gtype == 3:
+        encoder.polygon(coords)
+        return POLYGON, encoder.commands
+    elif gtype == 6:
+        for t, rings in coords:
+            encoder.polygon(rings)
+        return POLYGON, encoder.commands
+    return UNKNOWN, []
+
+
+class Layer(object):
+    """A vector tile layer of features."""
+    version = 2
+
+    def __init__(self, name, extent=4096):
+        self.name = name
+        self.extent = extent
+        self.features = []
+        self._keys = {}
+        self._values = {}
+
+    def _index(self, lookup, key):
+        try:
+            return lookup[key]
+        except KeyError:
+            lookup[key] = len(lookup)
+            return lookup[key]
+
+    def add_feature(self, wkb, properties=None, id=None):
+        """Adds a feature from WKB in tile coordinate space.
+
+        Arguments:
+        wkb -- WKB geometry as bytes, already translated and scaled to tile
+            extent coordinates with y pointing down
+        Keyword args:
+        properties -- dict of feature attributes
+        id -- unsigned integer feature identifier
+        """
+        if not wkb:
+            return
+        gtype, commands = encode_geometry(*WKBReader(wkb).read())
+        if not commands:
+            return
+        tags = []
+        for key, val in six.iteritems(properties or {}):
+            if val is None:
+                continue
+            elif isinstance(val, (dict, list)):
+                val = json.dumps(val, cls=JSONEncoder)
+            tags.append(self._index(self._keys, key))
+            # Keep bool and int values distinct as True == 1 for dict keys.
+            tags.append(self._index(self._values, (type(val), val)))
+        feat = bytearray()
+        if isinstance(id, six.integer_types) and id >= 0:
+            feat += _key(1, VARINT) + _varint(id)
+        if tags:
+            feat += _packed(2, tags)
+        feat += _key(3, VARINT) + _varint(gtype)
+        feat += _packed(4, commands)
+        self.features.append(feat)
+
+    def encode(self):
+        """Returns the protobuf encoded Layer message as bytes."""
+        buf = _key(15, VARINT) + _varint(self.version)
+        buf += _delimited(1, six.text_type(self.name).encode('utf-8'))
+        for feat in self.features:
+            buf += _delimited(2, feat)
+        for key in sorted(self._keys, key=self._keys.get):
+            buf += _delimited(3, six.text_type(key).encode('utf-8'))
+        for val in sorted(self._values, key=self._values.get):
+            buf += _delimited(4, _encode_value(val[1]))
+        buf += _key(5, VARINT) + _varint(self.extent)
+        return bytes(buf)
+
+def encode(layers):
+    """Returns a vector tile as bytes.
+
+    Arguments:
+    layers -- sequence of Layer instances
+    """
+    tile = bytearray()
+    for layer in layers:
+        tile += _delimited(3, bytearray(layer.encode()))
+    return bytes(tile)
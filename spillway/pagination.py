@@ -1,4 +1,7 @@
+from django.core.paginator import InvalidPage
+from django.utils import six
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 
 from spillway import query
@@ -6,7 +9,30 @@ from spillway.collections import NamedCRS
 
 
 class FeaturePagination(pagination.PageNumberPagination):
-    """Feature pagination by page number."""
+    """Feature pagination by page number.
+
+    The page is returned as an unevaluated queryset slice rather than a list
+    of instances so features may be read with values_list().
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        page_number = request.query_params.get(self.page_query_param, 1)
+        if page_number in self.last_page_strings:
+            page_number = paginator.num_pages
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=six.text_type(exc))
+            raise NotFound(msg)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return self.page.object_list
 
     def get_paginated_response(self, data):
         if hasattr(data, '__geo_interface__'):
@@ -18,3 +44,40 @@ class FeaturePagination(pagination.PageNumberPagination):
                          'crs': crs})
             return Response(data)
         return super(FeaturePagination, self).get_paginated_response(data)
+
+
+class FeatureCursorPagination(pagination.CursorPagination):
+    """Feature pagination by cursor.
+
+    Pages are selected by the last seen ordering value rather than an offset,
+    so deep pages are as fast as the first and no COUNT query is required.
+    Cursor positions are read from model instances, so pages are serialized
+    in full rather than with values_list().
+    """
+    ordering = 'pk'
+    # Include a total feature count as 'exact', 'estimate', or None to omit.
+    count_method = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.queryset = queryset
+        return super(FeatureCursorPagination, self).paginate_queryset(
+            queryset, request, view)
+
+    def get_count(self, queryset):
+        if self.count_method == 'exact':
+            return queryset.count()
+        elif self.count_method == 'estimate':
+            return query.estimated_count(queryset)
+        return None
+
+    def get_paginated_response(self, data):
+        if hasattr(data, '__geo_interface__'):
+            data.update({'next': self.get_next_link(),
+                         'previous': self.get_previous_link(),
+                         'crs': NamedCRS(query.get_srid(self.queryset))})
+            count = self.get_count(self.queryset)
+            if count is not None:
+                data['count'] = count
+            return Response(data)
+        return super(FeatureCursorPagination, self).get_paginated_response(
+            data)
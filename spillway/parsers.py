@@ -0,0 +1,57 @@
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+from spillway.compat import json
+from spillway.renderers import GeoJSONRenderer, GeoJSONSeqRenderer
+
+
+class GeoJSONParser(JSONParser):
+    """Parses GeoJSON request content."""
+    media_type = GeoJSONRenderer.media_type
+
+
+class NDJSONParser(BaseParser):
+    """Parses newline delimited GeoJSON features into a FeatureCollection.
+
+    Features are decoded lazily, one record at a time, while iterating over
+    the collection.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        features = self._features(self.records(stream), encoding)
+        return {'type': 'FeatureCollection', 'features': features}
+
+    def records(self, stream):
+        """Returns an iterator of JSON text records as bytes."""
+        return iter(stream)
+
+    def _features(self, records, encoding):
+        for num, record in enumerate(records, 1):
+            record = record.strip()
+            if not record:
+                continue
+            try:
+                yield json.loads(record.decode(encoding))
+            except ValueError as exc:
+                raise ParseError('Parse error in record %d - %s' % (num, exc))
+
+
+class GeoJSONSeqParser(NDJSONParser):
+    """Parses a GeoJSON text sequence (RFC 8142) into a FeatureCollection."""
+    media_type = GeoJSONSeqRenderer.media_type
+    chunk_size = 64 * 1024
+
+    def records(self, stream):
+        # Records are delimited by a leading record separator and may span
+        # lines.
+        buf = b''
+        for chunk in iter(lambda: stream.read(self.chunk_size), b''):
+            records = (buf + chunk).split(GeoJSONSeqRenderer.separator)
+            buf = records.pop()
+            for record in records:
+                yield record
+        yield buf
@@ -1,17 +1,30 @@
 import os
+import functools
 import math
+import operator
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 import tempfile
 import zipfile
 
 from django.core import exceptions
-from django.db import connection
+from django.db import connection, connections
 from django.db.models import query
 from django.contrib.gis import geos
 import django.contrib.gis.db.models.functions as geofn
 from django.contrib.gis.db import models
 from django.utils import six
+from django.utils.six.moves import reduce
 from django.utils.functional import cached_property
+from greenwich.geometry import Envelope, transform
+from greenwich.layer import MemoryLayer
+from greenwich.raster import AffineTransform, ImageDriver
 import numpy as np
+from osgeo import gdal
+
+from spillway import mvt, timing
+from spillway.compat import json
+from spillway.zipstream import ZipStream
 
 def filter_geometry(queryset, **filters):
     """Helper function for spatial lookups filters.
@@ -38,6 +51,22 @@ def get_srid(queryset):
         srid = None
     return srid or geo_field(queryset).srid
 
+def estimated_count(queryset):
+    """Returns a queryset row count estimated from query planner statistics.
+
+    Backends other than PostgreSQL fall back to an exact count.
+    """
+    conn = connections[queryset.db]
+    if conn.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with conn.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) %s' % sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, six.string_types):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
 def agg_dims(arr, stat):
     """Returns a 1D array with higher dimensions aggregated using stat fn.
 
@@ -52,6 +81,287 @@ def agg_dims(arr, stat):
     module = np.ma if hasattr(arr, 'mask') else np
     return getattr(module, stat)(arr, axis)
 
+def period_bounds(shapes, periods):
+    """Returns a list of flat value offsets dividing stacked arrays into
+    periods.
+
+    Arrays are stacked along the first axis, by band for multiband rasters or
+    by array otherwise. Periods are of equal size when possible, falling back
+    to uneven splits of whole steps as with np.array_split().
+
+    Arguments:
+    shapes -- sequence of array shapes
+    periods -- desired number of periods as int
+    """
+    total = sum(int(np.prod(shape)) for shape in shapes)
+    if total % periods == 0:
+        size = total // periods
+        return [i * size for i in range(periods + 1)]
+    if len(shapes) == 1:
+        nsteps = shapes[0][0] if shapes[0] else 1
+    elif len(shapes[0]) > 2:
+        nsteps = sum(shape[0] for shape in shapes)
+    else:
+        nsteps = len(shapes)
+    size = total // nsteps
+    step, extra = divmod(nsteps, periods)
+    return [(i * step + min(i, extra)) * size for i in range(periods + 1)]
+
+
+class RunningStats(object):
+    """Accumulates summary statistics over chunks of values.
+
+    Variance is merged chunk by chunk with the parallel form of Welford's
+    algorithm so values never need to be held at once.
+    """
+    stats = ('count', 'max', 'mean', 'min', 'std', 'sum')
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, arr):
+        """Adds values from an ndarray or MaskedArray, skipping masked ones."""
+        values = arr.compressed() if hasattr(arr, 'mask') else arr.ravel()
+        n = values.size
+        if not n:
+            return
+        mean = values.mean()
+        delta = mean - self._mean
+        count = self.count + n
+        self._m2 += (((values - mean) ** 2).sum() +
+                     delta ** 2 * self.count * n / float(count))
+        self._mean += delta * n / float(count)
+        self.count = count
+        self.sum += values.sum()
+        vmin, vmax = values.min(), values.max()
+        self.min = vmin if self.min is None else min(self.min, vmin)
+        self.max = vmax if self.max is None else max(self.max, vmax)
+
+    @property
+    def mean(self):
+        # Exact for integer data, unlike the running mean.
+        return self.sum / float(self.count) if self.count else None
+
+    @property
+    def std(self):
+        return math.sqrt(self._m2 / self.count) if self.count else None
+
+    def value(self, stat):
+        """Returns a statistic by name, or None without any values."""
+        if stat not in self.stats:
+            raise ValueError('Unsupported stat: %s' % stat)
+        return getattr(self, stat)
+
+
+def summarize_array(obj, geom, stat=None, resolution=None):
+    """Returns a subsetted/summarized ndarray for a raster model instance.
+
+    Arguments:
+    obj -- raster model instance
+    geom -- geometry for masking or spatial subsetting
+    Keyword args:
+    stat -- any numpy summary stat method as str (min/max/mean/etc)
+    resolution -- pixel size in raster coordinate units to read at
+    """
+    arr = obj.array(geom, resolution=resolution)
+    if arr is not None:
+        if stat:
+            arr = agg_dims(arr, stat)
+        try:
+            arr = arr.squeeze()
+        except ValueError:
+            pass
+    return arr
+
+def _summarize_array(args):
+    # Pool.map() passes a single argument.
+    return summarize_array(*args)
+
+# Statistics computed for zones by zonal_stats().
+ZONAL_STATS = ('count', 'max', 'mean', 'median', 'min', 'std', 'sum', 'var')
+
+def label_array(geoms, r, window):
+    """Returns a 2D ndarray of 1-based geometry indices burned into a raster
+    window, 0 where no geometry covers a pixel center.
+
+    Arguments:
+    geoms -- sequence of OGR geometries in the raster spatial reference
+    r -- greenwich.Raster
+    window -- pixel window as (x offset, y offset, x size, y size)
+    """
+    x, xres, xrot, y, yrot, yres = tuple(r.affine)
+    xoff, yoff = window[:2]
+    driver = ImageDriver('MEM')
+    labels = driver.raster(driver.ShortName, window[2:], gdal.GDT_UInt32)
+    labels.affine = AffineTransform(x + xoff * xres + yoff * xrot, xres, xrot,
+                                    y + xoff * yrot + yoff * yres, yrot, yres)
+    labels.sref = r.sref
+    # MemoryLayer swallows exceptions on exit, so it is not used as a context
+    # manager or failures would pass as zones without any pixels.
+    ml = MemoryLayer.from_records(list(enumerate(geoms, 1)))
+    try:
+        err = gdal.RasterizeLayer(labels.ds, (1,), ml.layer,
+                                  options=['ATTRIBUTE=%s' % ml.id])
+        if err != gdal.CE_None:
+            raise RuntimeError(
+                'Rasterizing zones failed: %s' % gdal.GetLastErrorMsg())
+        return labels.array()
+    finally:
+        ml.close()
+        labels.close()
+
+def zonal_stat(labels, values, stat, n):
+    """Returns a MaskedArray of a statistic per label, masked for labels
+    without any values.
+
+    Reduces all labels at once with np.bincount() and friends rather than
+    masking values for each label.
+
+    Arguments:
+    labels -- 1D int ndarray of labels from 0 to n - 1
+    values -- 1D ndarray of values for labels
+    stat -- one of count, max, mean, median, min, std, sum, or var
+    n -- number of labels
+    """
+    if stat not in ZONAL_STATS:
+        raise ValueError('Unsupported stat: %s' % stat)
+    values = values.astype(float)
+    count = np.bincount(labels, minlength=n)
+    mask = count == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if stat == 'count' or not values.size:
+            result = count
+        elif stat == 'min':
+            result = np.full(n, np.inf)
+            np.minimum.at(result, labels, values)
+        elif stat == 'max':
+            result = np.full(n, -np.inf)
+            np.maximum.at(result, labels, values)
+        elif stat == 'median':
+            # Sort values by label then value to pick the middle of each run.
+            order = np.lexsort((values, labels))
+            ordered = values[order]
+            start = np.cumsum(count) - count
+            lower = np.minimum(start + (count - 1) // 2, values.size - 1)
+            upper = np.minimum(start + count // 2, values.size - 1)
+            result = (ordered[lower] + ordered[upper]) / 2.0
+        else:
+            result = np.bincount(labels, values, n)
+            if stat != 'sum':
+                mean = result / count
+                result = mean
+                if stat in ('std', 'var'):
+                    dev = values - mean[labels]
+                    result = np.bincount(labels, dev * dev, n) / count
+                    if stat == 'std':
+                        result = np.sqrt(result)
+    return np.ma.masked_array(np.where(mask, 0, result), mask=mask)
+
+def zonal_stats(obj, geoms, stat='mean'):
+    """Returns a MaskedArray of a statistic for each geometry as a zone, of
+    shape (zones,) or (bands, zones) for multiband rasters.
+
+    Zones are rasterized into a single label array covering their combined
+    extent, so pixels are read once however many zones there are. Pixels
+    count toward the zone listed last where zones overlap, and zones covering
+    no pixel centers are masked.
+
+    Arguments:
+    obj -- raster model instance
+    geoms -- sequence of geometries as zones
+    Keyword args:
+    stat -- one of count, max, mean, median, min, std, sum, or var
+    """
+    if stat not in ZONAL_STATS:
+        raise ValueError('Unsupported stat: %s' % stat)
+    n = len(geoms) + 1
+    with obj.raster() as r:
+        nbands = len(r)
+        geoms = [transform(geom, r.sref) for geom in geoms]
+        env = None
+        if geoms:
+            env = reduce(operator.add, map(Envelope.from_geom, geoms))
+        if env is not None and r.envelope.intersects(env):
+            window = r.get_offset(env.intersect(r.envelope))
+            labels = label_array(geoms, r, window).ravel()
+            arr = r.ds.ReadAsArray(*window).reshape((nbands, -1))
+            nodata = r.nodata
+        else:
+            labels, arr = np.zeros(0, int), np.zeros((nbands, 0))
+            nodata = None
+    results = []
+    for values in arr:
+        valid = labels > 0
+        if nodata is not None:
+            valid &= values != nodata
+        results.append(zonal_stat(labels[valid], values[valid], stat, n)[1:])
+    result = np.ma.vstack(results)
+    return result[0] if nbands == 1 else result
+
+def _zonal_stats(args):
+    # Pool.map() passes a single argument.
+    return zonal_stats(*args)
+
+def _from_image_name(func, args):
+    # Rebuilds an unsaved raster model instance in a worker process from its
+    # model class and image name so no instance state or db access is shared.
+    model, name = args[:2]
+    return func((model(image=name),) + tuple(args[2:]))
+
+def pixel_indices(coords, affine):
+    """Returns a tuple of int ndarrays of pixel columns and rows.
+
+    Arguments:
+    coords -- ndarray of x, y coordinate pairs in raster coordinate units
+    affine -- AffineTransform or geotransform sequence of a north up raster
+    """
+    x, xres, xrot, y, yrot, yres = tuple(affine)
+    cols = np.floor((coords[:, 0] - x) / xres).astype(int)
+    rows = np.floor((coords[:, 1] - y) / yres).astype(int)
+    return cols, rows
+
+def sample_pixels(r, cols, rows):
+    """Returns a MaskedArray of pixel values of shape (points,) or (points,
+    bands) for multiband rasters, masked outside of the raster and for nodata.
+
+    Only the raster blocks holding pixels are read.
+
+    Arguments:
+    r -- greenwich.Raster
+    cols -- int ndarray of pixel columns
+    rows -- int ndarray of pixel rows
+    """
+    nx, ny = r.size
+    nbands = len(r)
+    values = np.ma.masked_all((len(cols), nbands))
+    inside = (cols >= 0) & (cols < nx) & (rows >= 0) & (rows < ny)
+    bx, by = r.ds.GetRasterBand(1).GetBlockSize()
+    nblocks = (nx + bx - 1) // bx
+    blocks = rows // by * nblocks + cols // bx
+    for block in np.unique(blocks[inside]):
+        idx = np.flatnonzero(inside & (blocks == block))
+        xoff, yoff = block % nblocks * bx, block // nblocks * by
+        xsize, ysize = min(bx, nx - xoff), min(by, ny - yoff)
+        arr = r.ds.ReadAsArray(int(xoff), int(yoff), int(xsize), int(ysize))
+        arr = arr.reshape((nbands, ysize, xsize))
+        values[idx] = arr[:, rows[idx] - yoff, cols[idx] - xoff].T
+    if r.nodata is not None:
+        values = np.ma.masked_values(values, r.nodata, copy=False)
+    return values[:, 0] if nbands == 1 else values
+
+
+class AsBinary(geofn.GeoFunc):
+    output_field = models.BinaryField()
+
+
+class AsMVTGeom(geofn.GeoFuncWithGeoParam):
+    pass
+
 
 class AsText(geofn.GeoFunc):
     output_field = models.TextField()
@@ -107,17 +417,58 @@ class GeoQuerySet(query.QuerySet):
         """Returns model geometry field."""
         return geo_field(self)
 
+    def mvt(self, name=None, extent=4096):
+        """Returns a Mapbox vector tile as bytes.
+
+        Expects a GeoQuerySet with geometries already in tile space, as
+        annotated by tile() with the pbf format. Non-geometry model fields are
+        encoded as feature properties. On PostGIS the whole tile is built in
+        the database, other backends encode WKB in Python.
+
+        Keyword args:
+        name -- tile layer name, defaults to the db table
+        extent -- tile extent in integer coordinates
+        """
+        opts = self.model._meta
+        name = name or opts.db_table
+        fields = [f.name for f in opts.concrete_fields
+                  if not isinstance(f, models.GeometryField)]
+        # Vector tile feature ids must be unsigned integers.
+        fid = opts.pk.get_internal_type().endswith(('AutoField', 'IntegerField'))
+        qs = self.values(*(fields + ['pbf']))
+        if connection.ops.postgis:
+            sql, params = qs.query.sql_with_params()
+            sql = 'SELECT ST_AsMVT(q, %s, %s, %s' + (', %s' if fid else '') + (
+                ') FROM (%s) AS q' % sql)
+            args = [name, extent, 'pbf'] + ([opts.pk.column] if fid else [])
+            with connection.cursor() as cursor:
+                cursor.execute(sql, args + list(params))
+                tile = cursor.fetchone()[0]
+            return bytes(tile or b'')
+        layer = mvt.Layer(name, extent)
+        for row in qs:
+            wkb = row.pop('pbf')
+            pk = row.pop(opts.pk.name) if fid else None
+            layer.add_feature(wkb, row, pk)
+        return mvt.encode([layer])
+
     def pbf(self, bbox, geo_col=None, scale=4096):
-        """Returns tranlated and scaled geometries suitable for Mapbox vector
-        tiles.
+        """Returns geometries translated and scaled to Mapbox vector tile
+        coordinate space.
+
+        PostGIS uses ST_AsMVTGeom while other backends return WKB for encoding
+        in Python with mvt().
         """
-        col = geo_col or self.geo_field.name
+        col = geofn.Transform(geo_col or self.geo_field.name, 3857)
+        bbox = bbox.transform(3857, clone=True)
+        if connection.ops.postgis:
+            return self.annotate(pbf=AsMVTGeom(col, bbox, scale, 256, True))
         w, s, e, n = bbox.extent
-        trans = self._trans_scale(col, -w, -s,
+        # Tile space has the origin at the top left with y pointing down.
+        trans = self._trans_scale(col, -w, -n,
                                   scale / (e - w),
-                                  scale / (n - s))
-        g = AsText(trans)
-        return self.annotate(pbf=g)
+                                  scale / (s - n))
+        return self.annotate(pbf=AsBinary(trans))
 
     def tile(self, bbox, z=0, format=None, clip=True):
         """Returns a GeoQuerySet intersecting a tile boundary.
@@ -158,6 +509,12 @@ class GeoQuerySet(query.QuerySet):
 
 
 class RasterQuerySet(GeoQuerySet):
+    # Number of workers to read rasters with in parallel, GDAL releases the GIL
+    # during I/O so threads are used unless processes are enabled. Processes
+    # open rasters by image name, so they only suit stored raster files.
+    workers = None
+    use_processes = False
+
     def arrays(self, field_name=None):
         """Returns a list of ndarrays.
 
@@ -174,33 +531,62 @@ class RasterQuerySet(GeoQuerySet):
                 arrays.append(obj.array())
         return arrays
 
-    def aggregate_periods(self, periods):
-        """Returns list of ndarrays averaged to a given number of periods.
+    def aggregate_periods(self, periods, stat='mean'):
+        """Returns list of ndarrays aggregated to a given number of periods.
+
+        Rasters are read one at a time into running per period statistics
+        rather than stacked in memory.
 
         Arguments:
         periods -- desired number of periods as int
+        Keyword args:
+        stat -- one of count, max, mean, min, std, or sum
         """
         try:
             fieldname = self.raster_field.name
         except TypeError:
             raise exceptions.FieldDoesNotExist('Raster field not found')
-        arrays = self.arrays(fieldname)
-        arr = arrays[0]
-        if len(arrays) > 1:
-            if getattr(arr, 'ndim', 0) > 2:
-                arrays = np.vstack(arrays)
-            fill = getattr(arr, 'fill_value', None)
-            arr = np.ma.masked_values(arrays, fill, copy=False)
-        # Try to reshape using equal sizes first and fall back to unequal
-        # splits.
-        try:
-            means = arr.reshape((periods, -1)).mean(axis=1)
-        except ValueError:
-            means = np.array([a.mean() for a in np.array_split(arr, periods)])
+        if stat not in RunningStats.stats:
+            raise ValueError('Unsupported stat: %s' % stat)
+        objects = list(self)
+        shapes = [self._array_shape(obj, fieldname) for obj in objects]
+        bounds = period_bounds([s for s in shapes if s is not None], periods)
+        accumulators = [RunningStats() for i in range(periods)]
+        offset = period = 0
+        for obj, shape in zip(objects, shapes):
+            if shape is None:
+                continue
+            arr = getattr(obj, fieldname)
+            if not isinstance(arr, np.ndarray):
+                arr = obj.array()
+            flat = np.ma.ravel(arr)
+            start = 0
+            while start < flat.size:
+                while bounds[period + 1] <= offset + start:
+                    period += 1
+                stop = min(flat.size, bounds[period + 1] - offset)
+                accumulators[period].update(flat[start:stop])
+                start = stop
+            offset += flat.size
+        values = [acc.value(stat) for acc in accumulators]
+        mask = [val is None for val in values]
+        result = np.ma.masked_array([val or 0 for val in values], mask=mask)
         obj = self[0]
-        setattr(obj, fieldname, means)
+        setattr(obj, fieldname, result)
         return [obj]
 
+    def _array_shape(self, obj, fieldname):
+        # Read array shapes from raster headers without loading pixels.
+        arr = getattr(obj, fieldname)
+        if isinstance(arr, np.ndarray):
+            return arr.shape
+        elif arr is None:
+            return None
+        with obj.raster() as r:
+            nx, ny = r.size
+            nbands = len(r)
+        return (nbands, ny, nx) if nbands > 1 else (ny, nx)
+
     def get(self, *args, **kwargs):
         # Need special handling of model instances with modified attributes,
         # otherwise they will be lost.
@@ -222,63 +608,172 @@ class RasterQuerySet(GeoQuerySet):
                 return field
         return False
 
-    def summarize(self, geom, stat=None):
+    def summarize(self, geom, stat=None, workers=None, processes=None,
+                  resolution=None):
         """Returns a new RasterQuerySet with subsetted/summarized ndarrays.
 
         Arguments:
         geom -- geometry for masking or spatial subsetting
         Keyword args:
         stat -- any numpy summary stat method as str (min/max/mean/etc)
+        workers -- number of threads or processes for reading rasters in
+            parallel, defaults to the workers attribute
+        processes -- use a process pool instead of threads as boolean
+        resolution -- pixel size in raster coordinate units to read at, from
+            overviews when coarser than the rasters
         """
         if not hasattr(geom, 'num_coords'):
             raise TypeError('Need OGR or GEOS geometry, %s found' % type(geom))
         clone = self._clone()
-        for obj in clone:
-            arr = obj.array(geom)
-            if arr is not None:
-                if stat:
-                    arr = agg_dims(arr, stat)
-                try:
-                    arr = arr.squeeze()
-                except ValueError:
-                    pass
+        args = [(obj, geom, stat, resolution) for obj in clone]
+        with timing.phase('summarize'):
+            arrays = self._map(_summarize_array, args, workers, processes)
+        for obj, arr in zip(clone, arrays):
             obj.image = arr
         return clone
 
-    def warp(self, srid=None, format=None, geom=None):
+    def zonal_stats(self, geoms, stat='mean', workers=None, processes=None):
+        """Returns a new RasterQuerySet with ndarrays of a statistic for each
+        geometry as a zone.
+
+        Each raster is read once for all zones, rather than once per zone as
+        with summarize().
+
+        Arguments:
+        geoms -- sequence of geometries
+        Keyword args:
+        stat -- one of count, max, mean, median, min, std, sum, or var
+        workers -- number of threads or processes for reading rasters in
+            parallel, defaults to the workers attribute
+        processes -- use a process pool instead of threads as boolean
+        """
+        for geom in geoms:
+            if not hasattr(geom, 'num_coords'):
+                raise TypeError(
+                    'Need OGR or GEOS geometry, %s found' % type(geom))
+        if stat not in ZONAL_STATS:
+            raise ValueError('Unsupported stat: %s' % stat)
+        clone = self._clone()
+        args = [(obj, geoms, stat) for obj in clone]
+        with timing.phase('summarize'):
+            arrays = self._map(_zonal_stats, args, workers, processes)
+        for obj, arr in zip(clone, arrays):
+            obj.image = arr
+        return clone
+
+    def sample(self, points, srid=4326):
+        """Returns a new RasterQuerySet with ndarrays of pixel values at
+        points, masked for points outside of a raster.
+
+        Points are converted to pixel indices once for each distinct
+        georeferencing among rasters, and only blocks holding points are read.
+        Stack the sampled arrays with np.ma.column_stack(qs.arrays()) for a
+        points by rasters array.
+
+        Arguments:
+        points -- sequence of (x, y) coordinate pairs
+        Keyword args:
+        srid -- spatial reference identifier of points as int
+        """
+        if not points:
+            raise ValueError('Need one or more points to sample')
+        geom = geos.MultiPoint([geos.Point(*xy) for xy in points], srid=srid)
+        clone = self._clone()
+        coords, indices = {}, {}
+        with timing.phase('sample'):
+            for obj in clone:
+                with obj.raster() as r:
+                    wkt = r.sref.wkt
+                    if wkt not in coords:
+                        g = (geom if r.sref.srid == srid
+                             else geom.transform(wkt, clone=True))
+                        coords[wkt] = np.array(g.coords, float).reshape(-1, 2)
+                    key = (wkt, tuple(r.affine))
+                    if key not in indices:
+                        indices[key] = pixel_indices(coords[wkt], r.affine)
+                    arr = sample_pixels(r, *indices[key])
+                obj.image = arr
+        return clone
+
+    def _map(self, func, args, workers=None, processes=None):
+        # Maps over raster arguments in a thread or process pool when enabled.
+        workers = workers or self.workers
+        if processes is None:
+            processes = self.use_processes
+        if workers and workers > 1 and len(args) > 1:
+            if processes:
+                # Forked workers are sent model classes and image names
+                # rather than instances, and must not share db connections.
+                args = [(type(arg[0]), arg[0].image.name) + tuple(arg[1:])
+                        for arg in args]
+                func = functools.partial(_from_image_name, func)
+                for conn in connections.all():
+                    # Closing within a transaction would lose it.
+                    if not conn.in_atomic_block:
+                        conn.close()
+            pool_class = multiprocessing.Pool if processes else ThreadPool
+            pool = pool_class(min(workers, len(args)))
+            try:
+                # Results are returned in queryset order.
+                return pool.map(func, args)
+            finally:
+                pool.close()
+                pool.join()
+        return [func(arg) for arg in args]
+
+    def warp(self, srid=None, format=None, geom=None, resolution=None):
         """Returns a new RasterQuerySet with possibly warped/converted rasters.
 
         Keyword args:
         format -- raster file extension format as str
         geom -- geometry for masking or spatial subsetting
         srid -- spatial reference identifier as int for warping to
+        resolution -- pixel size in target coordinate units to resample to,
+            read from overviews when coarser than the rasters
         """
         clone = self._clone()
         for obj in clone:
             obj.convert(format, geom)
-            if srid:
+            if srid or resolution:
                 fp = tempfile.NamedTemporaryFile(suffix='.%s' % format or '')
-                with obj.raster() as r, r.warp(srid, fp.name) as w:
+                with timing.phase('warp'):
+                    if resolution:
+                        obj.warp(fp.name, srid, resolution)
+                    else:
+                        with obj.raster() as r:
+                            r.warp(srid, fp.name).close()
                     obj.image.file = fp
         return clone
 
-    def zipfiles(self, path=None, arcdirname='data'):
-        """Returns a .zip archive of selected rasters."""
+    def zipfiles(self, path=None, arcdirname='data',
+                 compression=zipfile.ZIP_STORED):
+        """Returns a .zip archive of selected rasters.
+
+        Without a path, the archive is a ZipStream written while it is
+        iterated over.
+
+        Keyword args:
+        path -- file path as str to write the archive to
+        arcdirname -- archive directory name for members
+        compression -- zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED
+        """
+        fp = ZipStream(self._zipmembers(arcdirname), compression,
+                       name=os.extsep.join((arcdirname, 'zip')))
         if path:
-            fp = open(path, 'w+b')
-        else:
-            prefix = '%s-' % arcdirname
-            fp = tempfile.NamedTemporaryFile(prefix=prefix, suffix='.zip')
-        with zipfile.ZipFile(fp, mode='w') as zf:
-            for obj in self:
-                img = obj.image
-                arcname = os.path.join(arcdirname, os.path.basename(img.name))
-                try:
-                    zf.write(img.path, arcname=arcname)
-                except OSError:
-                    img.seek(0)
-                    zf.writestr(arcname, img.read())
-                    img.close()
-        fp.seek(0)
+            with open(path, 'wb') as f:
+                for chunk in fp:
+                    f.write(chunk)
+            fp = open(path, 'rb')
         zobj = self.model(image=fp)
         return [zobj]
+
+    def _zipmembers(self, arcdirname):
+        for obj in self:
+            img = obj.image
+            arcname = os.path.join(arcdirname, os.path.basename(img.name))
+            if os.path.isfile(img.path):
+                yield arcname, img.path
+            else:
+                img.seek(0)
+                yield arcname, img
+                img.close()
@@ -1,6 +1,7 @@
-from .renderers import (GeoJSONRenderer, TemplateRenderer, KMLRenderer,
+from .renderers import (GeoJSONRenderer, GeoJSONSeqRenderer,
+                        FlatGeobufRenderer, TemplateRenderer, KMLRenderer,
                         KMZRenderer, SVGRenderer, MapnikRenderer,
-                        MapnikJPEGRenderer)
-from .gdal import (CSVRenderer, GeoTIFFRenderer, GeoTIFFZipRenderer,
-                   HFARenderer, HFAZipRenderer, JPEGRenderer,
-                   JPEGZipRenderer, PNGRenderer, PNGZipRenderer)
+                        MapnikJPEGRenderer, MVTRenderer)
+from .gdal import (COGRenderer, CSVRenderer, GeoTIFFRenderer,
+                   GeoTIFFZipRenderer, HFARenderer, HFAZipRenderer,
+                   JPEGRenderer, JPEGZipRenderer, PNGRenderer, PNGZipRenderer)
@@ -2,6 +2,8 @@ import os
 
 from rest_framework.renderers import BaseRenderer
 
+from spillway.zipstream import ZipStream
+
 def add_extsep(base, ext):
     return os.path.extsep.join((base, ext))
 
@@ -10,6 +12,8 @@ class BaseGDALRenderer(BaseRenderer):
     """Abstract renderer which encodes to a GDAL supported raster format."""
     media_type = 'application/octet-stream'
     format = None
+    # File extension, defaults to the format.
+    extension = None
     charset = None
     render_style = 'binary'
 
@@ -33,8 +37,9 @@ class BaseGDALRenderer(BaseRenderer):
             name = fp.name.split('-')[0]
         else:
             name = fp.name
-        if not name.endswith(self.format):
-            name = add_extsep(os.path.splitext(name)[0], self.format)
+        ext = self.extension or self.format
+        if not name.endswith(ext):
+            name = add_extsep(os.path.splitext(name)[0], ext)
         type_name = 'attachment; filename=%s' % os.path.basename(name)
         try:
             renderer_context['response']['Content-Disposition'] = type_name
@@ -62,6 +67,15 @@ class GeoTIFFRenderer(BaseGDALRenderer):
     format = 'tif'
 
 
+class COGRenderer(GeoTIFFRenderer):
+    """Renders a raster to Cloud Optimized GeoTIFF (.tif) format, tiled with
+    overviews for reads over HTTP range requests.
+    """
+    media_type = 'image/tiff; application=geotiff; profile=cloud-optimized'
+    format = 'cog'
+    extension = 'tif'
+
+
 class GeoTIFFZipRenderer(BaseGDALRenderer):
     """Bundles GeoTIFF rasters in a zip archive."""
     media_type = 'application/zip'
@@ -71,6 +85,11 @@ class GeoTIFFZipRenderer(BaseGDALRenderer):
     def render(self, data, accepted_media_type=None, renderer_context=None):
         if len(data) > 1:
             raise ValueError('Expected one-length sequence')
+        fp = data[0]['image']
+        # Streamed archives are of unknown length until fully written.
+        if isinstance(fp, ZipStream):
+            self.set_filename(fp, renderer_context)
+            return fp
         return super(GeoTIFFZipRenderer, self).render(
             data[0], accepted_media_type, renderer_context)
 
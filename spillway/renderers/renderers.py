@@ -2,7 +2,8 @@ from django.contrib.gis.shortcuts import compress_kml
 from django.template import loader
 from rest_framework.renderers import BaseRenderer, JSONRenderer
 
-from spillway import collections
+from spillway import collections, flatgeobuf
+from spillway.compat import json, JSONEncoder
 
 
 class GeoJSONRenderer(JSONRenderer):
@@ -17,6 +18,9 @@ class GeoJSONRenderer(JSONRenderer):
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
         """Returns *data* encoded as GeoJSON."""
+        # Already encoded GeoJSON, such as from a tile cache, passes through.
+        if isinstance(data, bytes):
+            return data
         data = collections.as_feature(data)
         try:
             return data.geojson
@@ -25,6 +29,67 @@ class GeoJSONRenderer(JSONRenderer):
                 data, accepted_media_type, renderer_context)
 
 
+class GeoJSONSeqRenderer(BaseRenderer):
+    """Renderer which serializes to a GeoJSON text sequence (RFC 8142).
+
+    Each feature is written as its own record so clients may process
+    features as they arrive.
+    """
+    media_type = 'application/geo+json-seq'
+    format = 'geojsonseq'
+    charset = 'utf-8'
+    separator = b'\x1e'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Returns *data* encoded as GeoJSON text sequence records."""
+        data = collections.as_feature(data)
+        if isinstance(data, collections.FeatureCollection):
+            return ''.join(data.itersequence())
+        elif isinstance(data, collections.Feature):
+            text = str(data)
+        else:
+            text = json.dumps(data, cls=JSONEncoder)
+        return '\x1e%s\n' % text
+
+
+class FlatGeobufRenderer(BaseRenderer):
+    """Renderer which serializes to FlatGeobuf.
+
+    Geometries are encoded straight from WKB, or GeoJSON, without building
+    GEOS objects. Features are sorted and written with a packed Hilbert R-tree
+    index unless spatial_index is False, otherwise they are written in the
+    order they are iterated.
+    """
+    media_type = 'application/flatgeobuf'
+    format = 'fgb'
+    charset = None
+    render_style = 'binary'
+    spatial_index = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Returns *data* encoded as FlatGeobuf."""
+        return b''.join(self.iterencode(data, renderer_context))
+
+    def iterencode(self, data, renderer_context=None):
+        """Returns an iterator of FlatGeobuf encoded bytes."""
+        data = collections.as_feature(data)
+        if isinstance(data, collections.Feature):
+            features = [data]
+        elif isinstance(data, collections.FeatureCollection):
+            features = data['features']
+        else:
+            return iter([json.dumps(data, cls=JSONEncoder).encode('utf-8')])
+        sref = data.srs
+        view = (renderer_context or {}).get('view')
+        try:
+            name = view.get_queryset().model._meta.db_table
+        except AttributeError:
+            name = None
+        return flatgeobuf.iterencode(
+            features, name=name, srid=sref.srid if sref else None,
+            node_size=16 if self.spatial_index else 0)
+
+
 class TemplateRenderer(BaseRenderer):
     """Template based feature renderer."""
     template_name = None
@@ -80,3 +145,16 @@ class MapnikJPEGRenderer(MapnikRenderer):
     """Renders Mapnik stylesheets to tiled JPEG."""
     media_type = 'image/jpeg'
     format = 'jpeg'
+
+
+class MVTRenderer(BaseRenderer):
+    """Renders Mapbox vector tiles (protobuf)."""
+    media_type = 'application/vnd.mapbox-vector-tile'
+    format = 'pbf'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Tiles are encoded from the queryset prior to rendering, so this is
+        # also a no-op.
+        return data
@@ -1,11 +1,15 @@
+from collections import OrderedDict
+
 from django.core import exceptions
 from django.contrib.gis import geos
 from django.contrib.gis.db import models
 from django.db.models.fields.files import FieldFile
-from rest_framework import serializers
+from django.db.models.query import QuerySet
+from rest_framework import renderers, serializers
+from rest_framework.settings import api_settings
 from greenwich.srs import SpatialReference
 
-from spillway import query, collections as sc
+from spillway import query, tilecache, timing, collections as sc
 from spillway.fields import GeometryField
 from spillway.renderers.gdal import BaseGDALRenderer
 
@@ -21,6 +25,15 @@ serializers.ModelSerializer.serializer_field_mapping.update({
 })
 
 
+class GeoListSerializer(serializers.ListSerializer):
+    """List serializer for GeoModels."""
+
+    @property
+    def data(self):
+        with timing.phase('serialize'):
+            return super(GeoListSerializer, self).data
+
+
 class GeoModelSerializer(serializers.ModelSerializer):
     """Serializer class for GeoModels."""
 
@@ -28,6 +41,17 @@ class GeoModelSerializer(serializers.ModelSerializer):
         cls.Meta.geom_field = getattr(cls.Meta, 'geom_field', None)
         return super(GeoModelSerializer, cls).__new__(cls, *args, **kwargs)
 
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        cls.Meta.list_serializer_class = getattr(
+            cls.Meta, 'list_serializer_class', GeoListSerializer)
+        return super(GeoModelSerializer, cls).many_init(*args, **kwargs)
+
+    @property
+    def data(self):
+        with timing.phase('serialize'):
+            return super(GeoModelSerializer, self).data
+
     def get_fields(self):
         """Returns a fields dict for this serializer with a 'geometry' field
         added.
@@ -42,20 +66,160 @@ class GeoModelSerializer(serializers.ModelSerializer):
         return fields
 
 
-class FeatureListSerializer(serializers.ListSerializer):
+class FeatureListSerializer(GeoListSerializer):
     """Feature list serializer for GeoModels."""
+    # Number of records to insert per query when creating features.
+    batch_size = 1000
+    # Build features from values_list() rows rather than model instances
+    # where all fields map directly to columns.
+    use_values = True
+
+    def create(self, validated_data):
+        """Returns a list of model instances inserted with bulk_create().
+
+        Model save() methods and signals are bypassed, models with many to
+        many fields are saved one at a time instead.
+        """
+        model = self.child.Meta.model
+        if model._meta.many_to_many:
+            return super(FeatureListSerializer, self).create(validated_data)
+        batch_size = self.context.get('batch_size', self.batch_size)
+        objs = [model(**attrs) for attrs in validated_data]
+        objs = model._default_manager.bulk_create(objs, batch_size=batch_size)
+        # Without save signals, expire cached tiles here.
+        tilecache.bump_version(model)
+        return objs
 
     @property
     def data(self):
-        return super(serializers.ListSerializer, self).data
+        with timing.phase('serialize'):
+            return super(serializers.ListSerializer, self).data
 
-    def to_representation(self, data):
-        data = [self.child.to_representation(item) for item in data]
+    def _get_srid(self):
         try:
-            srid = query.get_srid(self.instance)
+            return query.get_srid(self.instance)
         except AttributeError:
-            srid = None
-        return sc.FeatureCollection(features=data, crs=srid)
+            return None
+
+    def _columns(self, data):
+        """Returns a list of (field, column) pairs to select with
+        values_list(), or None when instances must be serialized in full.
+        """
+        child = self.child
+        if (not self.use_values or not isinstance(data, QuerySet)
+                or data._result_cache is not None
+                or type(child).to_representation !=
+                FeatureSerializer.to_representation):
+            return None
+        # Field classes which represent column values as they are, file
+        # fields need model FieldFile instances for urls.
+        simple = (set(serializers.ModelSerializer.serializer_field_mapping
+                      .values()) | {serializers.ChoiceField}) - {
+                          serializers.FileField, serializers.ImageField}
+        annotations = data.query.annotations
+        columns = []
+        for field in child._readable_fields:
+            if field.source in annotations:
+                if not isinstance(field, GeometryField) and (
+                        type(field) not in simple):
+                    return None
+            # Only geometries selected by the database, such as GeoJSON, skip
+            # the instance.
+            elif isinstance(field, GeometryField) or (
+                    type(field) not in simple):
+                return None
+            else:
+                try:
+                    modelfield = data.model._meta.get_field(field.source)
+                except exceptions.FieldDoesNotExist:
+                    return None
+                if modelfield.is_relation or not modelfield.concrete:
+                    return None
+            columns.append((field, field.source))
+        return columns
+
+    def _iterator(self, queryset, chunk_size):
+        try:
+            return queryset.iterator(chunk_size=chunk_size)
+        # Django < 2.0 does not accept a chunk size.
+        except TypeError:
+            return queryset.iterator()
+
+    def _features(self, rows, columns):
+        geom_field = self.child.Meta.geom_field
+        pkname = self.child.Meta.model._meta.pk.name
+        for row in rows:
+            geometry = pk = None
+            properties = OrderedDict()
+            for (field, column), value in zip(columns, row):
+                if value is not None:
+                    value = field.to_representation(value)
+                if field.field_name == geom_field:
+                    geometry = value
+                elif field.field_name == pkname:
+                    pk = value
+                else:
+                    properties[field.field_name] = value
+            yield sc.Feature(pk, geometry, properties)
+
+    def iter_features(self, chunk_size=2000):
+        """Returns a FeatureCollection of lazily serialized features.
+
+        Records are fetched with a server-side cursor where supported so memory
+        use is bounded by chunk size rather than the size of the queryset.
+
+        Keyword args:
+        chunk_size -- number of rows to fetch from the db cursor at a time
+        """
+        columns = self._columns(self.instance)
+        if columns is None:
+            items = self._iterator(self.instance, chunk_size)
+            features = (self.child.to_representation(item) for item in items)
+        else:
+            rows = self.instance.values_list(*[col for field, col in columns])
+            features = self._features(
+                self._iterator(rows, chunk_size), columns)
+        return sc.FeatureCollection(features=features, crs=self._get_srid())
+
+    def to_internal_value(self, data):
+        """Returns a list of validated records from a FeatureCollection or
+        sequence of features.
+
+        Validation errors are reported by feature index.
+        """
+        if sc.has_features(data):
+            crs = data.get('crs')
+            data = [feat if crs is None or 'crs' in feat
+                    else dict(feat, crs=crs) for feat in data['features']]
+        if not isinstance(data, list):
+            message = self.error_messages['not_a_list'].format(
+                input_type=type(data).__name__)
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [message]},
+                code='not_a_list')
+        if not self.allow_empty and not data:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [
+                    self.error_messages['empty']]}, code='empty')
+        records = []
+        errors = {}
+        for index, item in enumerate(data):
+            try:
+                records.append(self.child.run_validation(item))
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+        if errors:
+            raise serializers.ValidationError(errors)
+        return records
+
+    def to_representation(self, data):
+        columns = self._columns(data)
+        if columns is None:
+            data = [self.child.to_representation(item) for item in data]
+        else:
+            rows = data.values_list(*[col for field, col in columns])
+            data = list(self._features(rows, columns))
+        return sc.FeatureCollection(features=data, crs=self._get_srid())
 
 
 class FeatureSerializer(GeoModelSerializer):
@@ -74,15 +238,31 @@ class FeatureSerializer(GeoModelSerializer):
         if not hasattr(self, '_data'):
             self._data = super(FeatureSerializer, self).data
             if 'crs' not in self._data:
-                try:
-                    field = self.fields[self.Meta.geom_field]
-                    srid = getattr(self.instance, field.source).srid
-                except (AttributeError, geos.GEOSException):
-                    pass
-                else:
+                srid = self._get_srid()
+                if srid:
                     self._data['crs'] = sc.NamedCRS(srid)
         return self._data
 
+    def _get_srid(self):
+        field = self.fields[self.Meta.geom_field]
+        try:
+            return getattr(self.instance, field.source).srid
+        except (AttributeError, geos.GEOSException):
+            pass
+        # WKB selected for plain JSON carries no SRID, read it from the view
+        # queryset annotation or the model field as for feature lists.
+        if field.source != renderers.JSONRenderer.format:
+            return None
+        view = self.context.get('view')
+        try:
+            queryset = view.filter_queryset(view.get_queryset())
+        except AttributeError:
+            queryset = type(self.instance)._default_manager.all()
+        try:
+            return query.get_srid(queryset)
+        except exceptions.FieldDoesNotExist:
+            return None
+
     def to_representation(self, instance):
         native = super(FeatureSerializer, self).to_representation(instance)
         geometry = native.pop(self.Meta.geom_field)
@@ -118,6 +298,8 @@ class RasterModelSerializer(GeoModelSerializer):
 
     def get_fields(self):
         fields = super(RasterModelSerializer, self).get_fields()
+        # Cached band statistics are internal to the model.
+        fields.pop('bandstats', None)
         if not self.Meta.raster_field:
             for name, field in fields.items():
                 if isinstance(field, serializers.FileField):
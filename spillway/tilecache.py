@@ -0,0 +1,386 @@
+"""Map tile caches with in-memory, disk, MBTiles, and Django cache backends."""
+import collections
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.contrib.gis.db import models
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import EmptyResultSet, ImproperlyConfigured
+from django.db.models.signals import post_delete, post_save
+from django.utils import six
+from django.utils.encoding import force_bytes
+
+logger = logging.getLogger(__name__)
+# Cache alias holding model versions, which must be shared among processes
+# for tile keys and ETags to agree between them.
+VERSION_CACHE = 'default'
+_geomodels = {}
+_warned = set()
+
+def _version_cache():
+    cache = caches[VERSION_CACHE]
+    if isinstance(cache, DummyCache):
+        raise ImproperlyConfigured(
+            'Cache %r cannot hold tile layer versions, set '
+            'tilecache.VERSION_CACHE to a shared cache.' % VERSION_CACHE)
+    if isinstance(cache, LocMemCache) and VERSION_CACHE not in _warned:
+        _warned.add(VERSION_CACHE)
+        logger.warning(
+            'Tile layer versions are kept in the per process cache %r, '
+            'tile keys and ETags will differ between processes and restarts. '
+            'Set tilecache.VERSION_CACHE to a shared cache such as Memcached '
+            'or Redis.', VERSION_CACHE)
+    return cache
+
+def _version_key(model):
+    return 'spillway.version.%s' % model._meta.label_lower
+
+def model_version(model):
+    """Returns the version of a model's rows as the POSIX timestamp of the
+    last change seen, starting from the first call.
+
+    Arguments:
+    model -- Model class
+    """
+    cache = _version_cache()
+    key = _version_key(model)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), None)
+        version = cache.get(key)
+    return version
+
+def bump_version(model):
+    """Marks a model's rows as changed, invalidating cached tiles.
+
+    Rows saved or deleted one by one bump the version themselves, call this
+    after QuerySet.update() and bulk_create() which send no signals.
+
+    Arguments:
+    model -- Model class
+    """
+    _version_cache().set(_version_key(model), time.time(), None)
+
+def _changed(sender, **kwargs):
+    # Only geo models serve tiles.
+    try:
+        geo = _geomodels[sender]
+    except KeyError:
+        geo = _geomodels[sender] = any(
+            isinstance(f, models.GeometryField) for f in sender._meta.fields)
+    if geo:
+        bump_version(sender)
+
+post_save.connect(_changed, dispatch_uid='spillway.tilecache.save')
+post_delete.connect(_changed, dispatch_uid='spillway.tilecache.delete')
+
+def query_digest(queryset):
+    """Returns a short hex digest of a queryset's SQL and parameters."""
+    try:
+        sql = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        sql = None
+    return hashlib.md5(force_bytes(repr(sql))).hexdigest()[:12]
+
+def _queryset_key(queryset, version):
+    return '%s.%s.%d' % (queryset.model._meta.label_lower,
+                         query_digest(queryset), version * 1000)
+
+def layer_key(layer):
+    """Returns a str identifying a tile layer and its current version.
+
+    Querysets are told apart by their SQL, so differently filtered layers of a
+    model never share tiles.
+
+    Arguments:
+    layer -- raster model instance or GeoQuerySet
+    """
+    if hasattr(layer, 'image'):
+        name = '%s.%s' % (layer._meta.label_lower, layer.pk)
+        try:
+            # Invalidate tiles whenever the underlying raster changes.
+            return '%s.%d' % (name, os.path.getmtime(layer.image.path))
+        except (OSError, ValueError, NotImplementedError):
+            return name
+    # Invalidate tiles whenever rows change.
+    return _queryset_key(layer, model_version(layer.model))
+
+def layer_version(layer):
+    """Returns a tuple of a str identifying the current version of a layer
+    and its last modified time as a POSIX timestamp.
+
+    Raster versions change with the file path, modification time, and size,
+    and are None when the file cannot be stat'ed, such as with remote
+    storage. GeoQuerySet versions are their layer_key(), read from the cache
+    rather than aggregated over rows. Modified times are None when unknown.
+
+    Arguments:
+    layer -- raster model instance or GeoQuerySet
+    """
+    if hasattr(layer, 'image'):
+        try:
+            stat = os.stat(layer.image.path)
+        except (OSError, ValueError, NotImplementedError):
+            # Without the file state a version would outlive file changes.
+            return None, None
+        ident = [layer._meta.label_lower, layer.pk,
+                 getattr(layer, 'event', None), layer.image.name,
+                 stat.st_mtime, stat.st_size]
+        return repr(ident), stat.st_mtime
+    version = model_version(layer.model)
+    return _queryset_key(layer, version), version
+
+
+class TileKey(collections.namedtuple('TileKey', 'layer z x y format params')):
+    """Cache key for a map tile.
+
+    Params holds any other values which alter tile rendering, such as style,
+    band, and limits.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_form(cls, layer, form, format):
+        """Returns a TileKey from a layer and valid tile form."""
+        data = form.cleaned_data
+        skip = ('x', 'y', 'z', 'bbox', 'format')
+        params = tuple(sorted(
+            (k, tuple(v) if isinstance(v, list) else v)
+            for k, v in six.iteritems(data)
+            if k not in skip and v not in (None, '', [])))
+        return cls(layer_key(layer), data['z'], data['x'], data['y'],
+                   format, params)
+
+    @property
+    def variant(self):
+        """Returns a hex digest of the layer, format, and params."""
+        return hashlib.md5(force_bytes(
+            repr((self.layer, self.format, self.params)))).hexdigest()
+
+    def __str__(self):
+        return '%s/%s/%d/%d/%d.%s' % (self.layer, self.variant, self.z,
+                                      self.x, self.y, self.format)
+
+
+class BaseTileCache(object):
+    """Base class for tile caches which tracks hits and misses."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, data):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def get(self, key):
+        """Returns tile data as bytes or None for a TileKey."""
+        data = self._get(key)
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def get_or_set(self, key, render):
+        """Returns cached tile data or renders and stores it.
+
+        Arguments:
+        key -- TileKey
+        render -- callable returning tile data as bytes
+        """
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.set(key, data)
+        return data
+
+    def set(self, key, data):
+        self._set(key, bytes(data))
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class MemoryTileCache(BaseTileCache):
+    """A per process least recently used tile cache."""
+
+    def __init__(self, maxsize=1024):
+        super(MemoryTileCache, self).__init__()
+        self.maxsize = maxsize
+        self._tiles = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            try:
+                data = self._tiles.pop(key)
+            except KeyError:
+                return None
+            self._tiles[key] = data
+            return data
+
+    def _set(self, key, data):
+        with self._lock:
+            self._tiles.pop(key, None)
+            self._tiles[key] = data
+            while len(self._tiles) > self.maxsize:
+                self._tiles.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+
+    def items(self):
+        """Returns a list of (TileKey, data) pairs."""
+        with self._lock:
+            return list(self._tiles.items())
+
+
+class DiskTileCache(BaseTileCache):
+    """Stores tiles on disk in a {layer}/{variant}/{z}/{x}/{y}.{format} tree."""
+
+    def __init__(self, location):
+        super(DiskTileCache, self).__init__()
+        self.location = location
+
+    def path(self, key):
+        return os.path.join(self.location, str(key))
+
+    def _get(self, key):
+        try:
+            with open(self.path(key), 'rb') as fp:
+                return fp.read()
+        except (IOError, OSError):
+            return None
+
+    def _set(self, key, data):
+        path = self.path(key)
+        dirname = os.path.dirname(path)
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            if not os.path.isdir(dirname):
+                raise
+        # Write to a temp file first so readers never see a partial tile.
+        with tempfile.NamedTemporaryFile(dir=dirname, delete=False) as fp:
+            fp.write(data)
+        os.rename(fp.name, path)
+
+    def clear(self):
+        shutil.rmtree(self.location, ignore_errors=True)
+
+
+class MBTilesCache(BaseTileCache):
+    """Stores tiles in MBTiles SQLite files, one per layer variant."""
+    schema = (
+        'CREATE TABLE IF NOT EXISTS metadata (name text, value text)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS name ON metadata (name)',
+        'CREATE TABLE IF NOT EXISTS tiles (zoom_level integer, '
+        'tile_column integer, tile_row integer, tile_data blob)',
+        'CREATE UNIQUE INDEX IF NOT EXISTS tile_index '
+        'ON tiles (zoom_level, tile_column, tile_row)',
+    )
+
+    def __init__(self, location):
+        super(MBTilesCache, self).__init__()
+        self.location = location
+        self._conns = {}
+        self._lock = threading.RLock()
+
+    def path(self, key):
+        return os.path.join(self.location, '%s-%s.mbtiles' % (
+            key.layer, key.variant))
+
+    def _connect(self, key, create=False):
+        path = self.path(key)
+        try:
+            return self._conns[path]
+        except KeyError:
+            pass
+        if not create and not os.path.exists(path):
+            return None
+        if not os.path.isdir(self.location):
+            os.makedirs(self.location)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        for sql in self.schema:
+            conn.execute(sql)
+        conn.executemany('INSERT OR IGNORE INTO metadata VALUES (?, ?)',
+                         [('name', key.layer), ('format', key.format)])
+        conn.commit()
+        self._conns[path] = conn
+        return conn
+
+    def _row(self, key):
+        # MBTiles uses the TMS tiling scheme with y flipped.
+        return (key.z, key.x, (1 << key.z) - 1 - key.y)
+
+    def _get(self, key):
+        with self._lock:
+            conn = self._connect(key)
+            if conn is None:
+                return None
+            row = conn.execute(
+                'SELECT tile_data FROM tiles WHERE zoom_level = ? AND '
+                'tile_column = ? AND tile_row = ?', self._row(key)).fetchone()
+        return bytes(row[0]) if row else None
+
+    def _set(self, key, data):
+        with self._lock:
+            conn = self._connect(key, create=True)
+            conn.execute('INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)',
+                         self._row(key) + (sqlite3.Binary(data),))
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            for conn in self._conns.values():
+                conn.close()
+            self._conns.clear()
+            shutil.rmtree(self.location, ignore_errors=True)
+
+
+class DjangoTileCache(BaseTileCache):
+    """Stores tiles with the Django cache framework.
+
+    Use a dedicated cache alias as clear() empties the whole cache.
+    """
+    key_prefix = 'spillway.tile'
+
+    def __init__(self, alias='default', timeout=DEFAULT_TIMEOUT):
+        super(DjangoTileCache, self).__init__()
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _cache_key(self, key):
+        # Avoid memcached key length and character restrictions.
+        digest = hashlib.md5(force_bytes(str(key))).hexdigest()
+        return '%s.%s' % (self.key_prefix, digest)
+
+    def _get(self, key):
+        return self.cache.get(self._cache_key(key))
+
+    def _set(self, key, data):
+        self.cache.set(self._cache_key(key), data, self.timeout)
+
+    def clear(self):
+        self.cache.clear()
@@ -0,0 +1,149 @@
+"""Opt-in timing of request phases.
+
+Views add mixins.TimingMixin to record phases such as filtering, database
+queries, serialization, rendering, Mapnik rendering, and GDAL conversion. Code
+which may run within a timed request marks phases with phase(), a no-op when
+no Timer is active in the current thread.
+"""
+import contextlib
+import logging
+import threading
+import timeit
+from collections import OrderedDict
+
+from django.db import connection
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+# Sent once a timed response has been sent in full, e.g. for exporting
+# timings to Prometheus or StatsD.
+request_timed = Signal(providing_args=['request', 'response', 'timer'])
+_local = threading.local()
+
+def current():
+    """Returns the Timer active in the current thread or None."""
+    return getattr(_local, 'timer', None)
+
+@contextlib.contextmanager
+def phase(name):
+    """Times a block as a phase of the active Timer, if any.
+
+    Arguments:
+    name -- phase name as str
+    """
+    timer = current()
+    if timer is None:
+        yield
+    else:
+        with timer.phase(name):
+            yield
+
+
+class Timer(object):
+    """Records the durations of named phases of a request.
+
+    Time spent in a phase is summed over all of its blocks, and blocks nested
+    in one of the same name are counted once. Database time is recorded in the
+    'db' phase for queries run on the default connection while active.
+    """
+
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.counts = {}
+        self.total = 0
+        self._running = set()
+
+    def add(self, name, seconds):
+        """Adds a duration in seconds to a phase."""
+        self.phases[name] = self.phases.get(name, 0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Times a block as a phase."""
+        if name in self._running:
+            yield
+            return
+        self._running.add(name)
+        start = timeit.default_timer()
+        try:
+            yield
+        finally:
+            self._running.discard(name)
+            self.add(name, timeit.default_timer() - start)
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Makes this the active Timer within a block, adding the block's
+        duration to the total.
+        """
+        previous = current()
+        _local.timer = self
+        start = timeit.default_timer()
+        try:
+            with self._time_queries():
+                yield
+        finally:
+            self.total += timeit.default_timer() - start
+            _local.timer = previous
+
+    @contextlib.contextmanager
+    def _time_queries(self):
+        if hasattr(connection, 'execute_wrapper'):
+            with connection.execute_wrapper(self._execute):
+                yield
+            return
+        # Without execute wrappers before Django 2.0, read query times from
+        # the debug cursor log.
+        force_debug = connection.force_debug_cursor
+        connection.force_debug_cursor = True
+        count = len(connection.queries_log)
+        try:
+            yield
+        finally:
+            connection.force_debug_cursor = force_debug
+            for query in list(connection.queries_log)[count:]:
+                self.add('db', float(query['time']))
+
+    def _execute(self, execute, sql, params, many, context):
+        start = timeit.default_timer()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', timeit.default_timer() - start)
+
+    def as_dict(self):
+        """Returns an OrderedDict of phase and total durations in
+        milliseconds.
+        """
+        timings = OrderedDict(
+            (name, secs * 1000) for name, secs in self.phases.items())
+        timings['total'] = self.total * 1000
+        return timings
+
+    def header(self):
+        """Returns a Server-Timing header value."""
+        return ', '.join('%s;dur=%.2f' % item
+                         for item in self.as_dict().items())
+
+    def iterate(self, iterable, name='stream'):
+        """Returns an iterator timing each step as a phase while active."""
+        iterator = iter(iterable)
+        while True:
+            with self.activate(), self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def log(self, request, response, sender=None):
+        """Logs timings and sends the request_timed signal."""
+        timings = self.as_dict()
+        logger.info('%s %s %s', request.method, request.get_full_path(),
+                    response.status_code,
+                    extra={'timings': timings,
+                           'view': getattr(sender, '__name__', None),
+                           'status_code': response.status_code})
+        request_timed.send(sender=sender, request=request, response=response,
+                           timer=self)
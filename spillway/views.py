@@ -1,3 +1,4 @@
+from django.utils.encoding import force_bytes
 from rest_framework.response import Response
 from rest_framework.generics import GenericAPIView, ListAPIView
 
@@ -5,30 +6,60 @@ from spillway import carto, filters, forms, mixins, renderers
 from spillway.generics import BaseGeoView
 
 
-class RasterTileView(mixins.ResponseExceptionMixin, GenericAPIView):
+class RasterTileView(mixins.ConditionalMixin, mixins.TileCacheMixin,
+                     mixins.ResponseExceptionMixin, GenericAPIView):
     """View for rendering map tiles from /{z}/{x}/{y}/ tile coordinates."""
     renderer_classes = (renderers.MapnikRenderer,
                         renderers.MapnikJPEGRenderer)
 
     def get(self, request, *args, **kwargs):
         form = forms.RasterTileForm.from_request(request, view=self)
-        m = carto.build_map([self.get_object()], form)
+        obj = self.get_object()
+        response = self.not_modified(request, obj)
+        if response is not None:
+            return response
         # Mapnik Map object is not pickleable, so it breaks the caching
         # middleware. We must serialize the image before passing it off to the
         # Response and Renderer.
-        return Response(m.render(request.accepted_renderer.format))
+        format = request.accepted_renderer.format
+        render = lambda: carto.build_map([obj], form).render(format)
+        render_metatile = lambda n: carto.render_metatile(
+            [obj], form, format, n)
+        return Response(
+            self.cached_tile(obj, form, render, render_metatile))
 
 
-class TileView(mixins.ResponseExceptionMixin, BaseGeoView, ListAPIView):
-    """View for serving tiled GeoJSON or PNG from a GeoModel."""
+class TileView(mixins.ConditionalMixin, mixins.TileCacheMixin,
+               mixins.ResponseExceptionMixin, BaseGeoView, ListAPIView):
+    """View for serving tiled GeoJSON, PNG, or vector tiles from a GeoModel."""
     pagination_class = None
     filter_backends = (filters.TileFilter,)
-    renderer_classes = (renderers.GeoJSONRenderer, renderers.MapnikRenderer)
+    renderer_classes = (renderers.GeoJSONRenderer, renderers.MapnikRenderer,
+                        renderers.MVTRenderer)
 
     def get(self, request, *args, **kwargs):
-        if isinstance(request.accepted_renderer,
-                      renderers.GeoJSONRenderer):
-            return super(TileView, self).get(request, *args, **kwargs)
-        form = forms.RasterTileForm.from_request(request, view=self)
-        m = carto.build_map([self.get_queryset()], form)
-        return Response(m.render(request.accepted_renderer.format))
+        response = self.not_modified(request, self.get_queryset())
+        if response is not None:
+            return response
+        renderer = request.accepted_renderer
+        if isinstance(renderer, renderers.GeoJSONRenderer):
+            if self.tile_cache is None:
+                return super(TileView, self).get(request, *args, **kwargs)
+            form = forms.VectorTileForm.from_request(request, view=self)
+            render = lambda: force_bytes(renderer.render(
+                super(TileView, self).get(request, *args, **kwargs).data))
+            return Response(
+                self.cached_tile(self.get_queryset(), form, render))
+        queryset = self.get_queryset()
+        if isinstance(renderer, renderers.MVTRenderer):
+            form = forms.VectorTileForm.from_request(request, view=self)
+            render = lambda: self.filter_queryset(queryset).mvt()
+            render_metatile = None
+        else:
+            form = forms.RasterTileForm.from_request(request, view=self)
+            format = renderer.format
+            render = lambda: carto.build_map([queryset], form).render(format)
+            render_metatile = lambda n: carto.render_metatile(
+                [queryset], form, format, n)
+        return Response(
+            self.cached_tile(queryset, form, render, render_metatile))
@@ -1,6 +1,7 @@
 from rest_framework import viewsets, generics, mixins
 
 from spillway.generics import BaseGeoView, BaseRasterView
+from spillway.mixins import BulkCreateMixin
 
 
 class GenericGeoViewSet(BaseGeoView,
@@ -15,7 +16,8 @@ class ReadOnlyGeoModelViewSet(mixins.RetrieveModelMixin,
     """A geo-enabled view set with default list and retrieve actions."""
 
 
-class GeoModelViewSet(mixins.CreateModelMixin,
+class GeoModelViewSet(BulkCreateMixin,
+                      mixins.CreateModelMixin,
                       mixins.RetrieveModelMixin,
                       mixins.UpdateModelMixin,
                       mixins.DestroyModelMixin,
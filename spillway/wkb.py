@@ -0,0 +1,83 @@
+"""Reading of WKB geometries from the spatial backend without GEOS."""
+import struct
+
+from django.utils import six
+
+# WKB geometry type flags for EWKB and ISO extended dimensions.
+_ewkb_srid, _ewkb_z, _ewkb_m = 0x20000000, 0x80000000, 0x40000000
+GEOMETRY_TYPES = ('Point', 'LineString', 'Polygon', 'MultiPoint',
+                  'MultiLineString', 'MultiPolygon', 'GeometryCollection')
+
+
+class WKBReader(object):
+    """Reads WKB into nested coordinate sequences.
+
+    Keyword args:
+    dims -- maximum coordinate dimensions to keep, 3 retains z values
+    """
+
+    def __init__(self, wkb, dims=2):
+        self.wkb = bytes(wkb)
+        self.offset = 0
+        self.dims = dims
+
+    def _unpack(self, fmt, size):
+        vals = struct.unpack_from(self._order + fmt, self.wkb, self.offset)
+        self.offset += size
+        return vals
+
+    def _coords(self, ndim, dims):
+        num, = self._unpack('I', 4)
+        coords = self._unpack('%dd' % (num * ndim), num * ndim * 8)
+        return [coords[i:i + dims] for i in range(0, len(coords), ndim)]
+
+    def read(self):
+        """Returns a (geometry type id, coordinates) tuple."""
+        self._order = '<' if six.indexbytes(self.wkb, self.offset) else '>'
+        self.offset += 1
+        gtype, = self._unpack('I', 4)
+        ndim = 2
+        hasz = bool(gtype & _ewkb_z)
+        if hasz:
+            ndim += 1
+        if gtype & _ewkb_m:
+            ndim += 1
+        if gtype & _ewkb_srid:
+            self.offset += 4
+        gtype &= 0xffff
+        # ISO WKB uses multiples of 1000 for Z, M, and ZM variants.
+        ndim += {1: 1, 2: 1, 3: 2}.get(gtype // 1000, 0)
+        hasz = hasz or gtype // 1000 in (1, 3)
+        dims = 3 if hasz and self.dims > 2 else 2
+        gtype %= 1000
+        if gtype == 1:
+            coords = self._unpack('%dd' % ndim, ndim * 8)[:dims]
+        elif gtype == 2:
+            coords = self._coords(ndim, dims)
+        elif gtype == 3:
+            num, = self._unpack('I', 4)
+            coords = [self._coords(ndim, dims) for i in range(num)]
+        elif gtype in (4, 5, 6, 7):
+            num, = self._unpack('I', 4)
+            coords = [self.read() for i in range(num)]
+        else:
+            raise ValueError('Unsupported WKB geometry type: %s' % gtype)
+        return gtype, coords
+
+
+def _geojson(gtype, coords):
+    name = GEOMETRY_TYPES[gtype - 1]
+    if gtype == 7:
+        return {'type': name, 'geometries': [_geojson(*geom)
+                                             for geom in coords]}
+    elif gtype == 1:
+        # Empty points are written with NaN coordinates.
+        if any(val != val for val in coords):
+            coords = ()
+    elif gtype > 3:
+        coords = [part for ptype, part in coords]
+    return {'type': name, 'coordinates': coords}
+
+def geojson(wkb):
+    """Returns a GeoJSON geometry dict from WKB, keeping z values."""
+    return _geojson(*WKBReader(wkb, dims=3).read())
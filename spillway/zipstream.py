@@ -0,0 +1,161 @@
+"""Streaming zip archive writer.
+
+Members are read and compressed in fixed size chunks which are yielded as
+they are produced. Checksums and sizes follow each member in a data
+descriptor, so the archive is never seeked or held in full, with Zip64
+records written for large members and archives.
+"""
+import os
+import struct
+import time
+import zipfile
+import zlib
+
+from django.utils import six
+
+# Members of unknown or at least this size use Zip64 sizes.
+ZIP64_LIMIT = (1 << 31) - 1
+_max32 = 0xffffffff
+_max16 = 0xffff
+# General purpose flags for data descriptors and utf-8 names.
+_flag_descriptor, _flag_utf8 = 0x08, 0x800
+
+def _dostime(timestamp):
+    """Returns a (time, date) tuple of MS-DOS formatted ints."""
+    t = time.localtime(timestamp)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    dosdate = (t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+    dostime = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+    return dostime, dosdate
+
+def _filesize(fp):
+    try:
+        fp.seek(0, 2)
+        size = fp.tell()
+        fp.seek(0)
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
+    return size
+
+
+class ZipStream(object):
+    """An iterable of bytes making up a zip archive.
+
+    Arguments:
+    members -- iterable of (arcname, source) pairs where source is a file
+        path or file object, consumed lazily while iterating
+    Keyword args:
+    compression -- zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED
+    name -- archive file name
+    chunk_size -- bytes to read from members at a time
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, members, compression=zipfile.ZIP_STORED,
+                 name='archive.zip', chunk_size=None):
+        if compression not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise ValueError('Unsupported compression: %s' % compression)
+        self.members = members
+        self.compression = compression
+        self.name = name
+        self.chunk_size = chunk_size or self.chunk_size
+
+    def __iter__(self):
+        entries = []
+        offset = 0
+        for arcname, source in self.members:
+            if isinstance(source, six.string_types):
+                fp = open(source, 'rb')
+                mtime = os.path.getmtime(source)
+            else:
+                fp, mtime = source, time.time()
+            try:
+                for chunk in self._member(fp, arcname, mtime, offset, entries):
+                    offset += len(chunk)
+                    yield chunk
+            finally:
+                if fp is not source:
+                    fp.close()
+        cdoffset = offset
+        for entry in entries:
+            chunk = self._central_entry(*entry)
+            offset += len(chunk)
+            yield chunk
+        yield self._end_records(len(entries), offset - cdoffset, cdoffset)
+
+    def _member(self, fp, arcname, mtime, offset, entries):
+        name = arcname
+        if isinstance(name, six.text_type):
+            name = name.encode('utf-8')
+        flags = _flag_descriptor
+        try:
+            name.decode('ascii')
+        except UnicodeDecodeError:
+            flags |= _flag_utf8
+        size = _filesize(fp)
+        zip64 = size is None or size >= ZIP64_LIMIT
+        if zip64:
+            version, sizes = 45, (_max32, _max32)
+            extra = struct.pack('<HHQQ', 1, 16, 0, 0)
+        else:
+            version, sizes, extra = 20, (0, 0), b''
+        dostime, dosdate = _dostime(mtime)
+        yield struct.pack('<IHHHHHIIIHH', 0x04034b50, version, flags,
+                          self.compression, dostime, dosdate, 0, sizes[0],
+                          sizes[1], len(name), len(extra)) + name + extra
+        if self.compression == zipfile.ZIP_DEFLATED:
+            compressor = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        else:
+            compressor = None
+        crc = usize = csize = 0
+        while True:
+            chunk = fp.read(self.chunk_size)
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc) & _max32
+            usize += len(chunk)
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                csize += len(chunk)
+                yield chunk
+        if compressor:
+            chunk = compressor.flush()
+            csize += len(chunk)
+            yield chunk
+        if zip64:
+            yield struct.pack('<IIQQ', 0x08074b50, crc, csize, usize)
+        else:
+            yield struct.pack('<IIII', 0x08074b50, crc, csize, usize)
+        entries.append((name, flags, version, dostime, dosdate, crc,
+                        csize, usize, offset))
+
+    def _central_entry(self, name, flags, version, dostime, dosdate, crc,
+                       csize, usize, offset):
+        # Zip64 extra values are present only for fields which overflow.
+        values = [val for val in (usize, csize, offset) if val >= _max32]
+        if values:
+            version = 45
+            extra = struct.pack('<HH%dQ' % len(values), 1, len(values) * 8,
+                                *values)
+        else:
+            extra = b''
+        return struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014b50, 3 << 8 | version, version,
+            flags, self.compression, dostime, dosdate, crc,
+            min(csize, _max32), min(usize, _max32), len(name), len(extra),
+            0, 0, 0, 0o100644 << 16, min(offset, _max32)) + name + extra
+
+    def _end_records(self, count, cdsize, cdoffset):
+        records = b''
+        if count >= _max16 or cdsize >= _max32 or cdoffset >= _max32:
+            zip64offset = cdoffset + cdsize
+            records += struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0,
+                                   0, count, count, cdsize, cdoffset)
+            records += struct.pack('<IIQI', 0x07064b50, 0, zip64offset, 1)
+        count = min(count, _max16)
+        return records + struct.pack(
+            '<IHHHHIIH', 0x06054b50, 0, 0, count, count,
+            min(cdsize, _max32), min(cdoffset, _max32), 0)
@@ -0,0 +1,35 @@
+from django.test import SimpleTestCase
+from greenwich import raster
+from osgeo import gdal
+
+from spillway import cog
+
+
+class COGTestCase(SimpleTestCase):
+    def setUp(self):
+        shape = (1000, 1200)
+        self.r = raster.frombytes(bytes(bytearray(shape[0] * shape[1])), shape)
+        self.r.affine = (-120, .01, 0, 38, 0, -.01)
+        self.r.sref = 4326
+        self.path = '/vsimem/cog_test.tif'
+
+    def tearDown(self):
+        self.r.close()
+        gdal.Unlink(self.path)
+
+    def test_overview_levels(self):
+        self.assertEqual(cog.overview_levels(1200, 1000, 256), [2, 4, 8])
+        self.assertEqual(cog.overview_levels(2048, 10), [2, 4])
+        self.assertEqual(cog.overview_levels(512, 512), [])
+
+    def test_write(self):
+        self.assertFalse(cog.is_cog(self.r.ds, 256))
+        cog.write(self.r.ds, self.path, blocksize=256)
+        ds = gdal.Open(self.path)
+        band = ds.GetRasterBand(1)
+        self.assertEqual(band.GetBlockSize(), [256, 256])
+        self.assertEqual(band.GetOverviewCount(), 3)
+        self.assertEqual(
+            ds.GetMetadataItem('COMPRESSION', 'IMAGE_STRUCTURE'), 'DEFLATE')
+        self.assertTrue(cog.is_cog(ds, 256))
+        ds = None
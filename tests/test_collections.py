@@ -1,4 +1,5 @@
 import datetime
+import json
 
 from django.test import SimpleTestCase
 from spillway.collections import (Feature, FeatureCollection, LayerCollection,
@@ -44,6 +45,41 @@ class FeatureTestCase(SimpleTestCase):
         feat = Feature(properties={'event': datetime.date(1899, 1, 1)})
         self.assertIn('"properties": {"event": "1899-01-01"}', str(feat))
 
+    def test_str_stdlib_format(self):
+        feat = Feature(properties={'name': u'Z\xfcrich', 'v': float('nan')})
+        self.assertIn('"name": "Z\\u00fcrich"', str(feat))
+        self.assertIn('"v": NaN', str(feat))
+
+
+class FeatureCollectionTestCase(SimpleTestCase):
+    def setUp(self):
+        self.geom = '{"type": "Point", "coordinates": [0, 0]}'
+        self.features = [Feature(id=i, geometry=self.geom) for i in range(5)]
+
+    def test_iterencode(self):
+        fc = FeatureCollection(features=self.features)
+        chunks = list(fc.iterencode(size=2))
+        # Header, three feature chunks, and the closing brackets.
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(''.join(chunks), fc.geojson)
+        self.assertEqual(len(json.loads(fc.geojson)['features']), 5)
+
+    def test_geojson(self):
+        geom = json.loads(self.geom)
+        features = [Feature(id=1, geometry=self.geom),
+                    Feature(id=2, geometry=geom, name='b')]
+        data = json.loads(FeatureCollection(features=features, crs=4326).geojson)
+        self.assertEqual(data['crs']['type'], 'name')
+        self.assertEqual([feat['geometry'] for feat in data['features']],
+                         [geom, geom])
+        self.assertEqual(data['features'][1]['properties'], {'name': 'b'})
+
+    def test_lazy(self):
+        fc = FeatureCollection(features=iter(self.features))
+        self.assertTrue(fc.is_lazy)
+        expected = FeatureCollection(features=self.features).geojson
+        self.assertEqual(fc.geojson, expected)
+
 
 class LayerCollectionTestCase(SimpleTestCase):
     def setUp(self):
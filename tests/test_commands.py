@@ -0,0 +1,52 @@
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.six import StringIO
+
+from spillway import forms, tilecache
+from spillway.management.commands.spillway_seed import render_block
+from .models import Location
+
+
+class SeedCommandTestCase(TestCase):
+    def setUp(self):
+        Location.create(name='Prague', geom={
+            'type': 'Polygon',
+            'coordinates': [[[14.14, 50.21], [14.89, 50.20],
+                             [14.39, 49.76], [14.14, 50.21]]]})
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def seed(self, *args):
+        out = StringIO()
+        call_command('spillway_seed', 'tests.Location', '--format=pbf',
+                     '--zoom=0-3', '--processes=1', '--cache=disk',
+                     '--location=%s' % self.tmpdir, stdout=out, *args)
+        return out.getvalue()
+
+    def test_seed(self):
+        out = self.seed()
+        self.assertIn('4 tiles rendered, 0 skipped', out)
+        cache = tilecache.DiskTileCache(self.tmpdir)
+        form = forms.VectorTileForm({'x': 4, 'y': 2, 'z': 3, 'format': 'pbf'})
+        self.assertTrue(form.is_valid())
+        key = tilecache.TileKey.from_form(Location.objects.all(), form, 'pbf')
+        self.assertIn(b'Prague', cache.get(key))
+
+    def test_resume(self):
+        self.seed()
+        self.assertIn('0 tiles rendered, 4 skipped', self.seed())
+        self.assertIn('4 tiles rendered, 0 skipped', self.seed('--force'))
+
+    def test_render_block(self):
+        # Workers store tiles under the parent's layer key.
+        proto = tilecache.TileKey('parent', 0, 0, 0, 'pbf', ())
+        items = render_block((proto, 'tests.Location', None, 'pbf', {}, 1,
+                              [(4, 2, 3)]))
+        self.assertEqual([key for key, data in items],
+                         [proto._replace(z=3, x=4, y=2)])
+        self.assertIn(b'Prague', items[0][1])
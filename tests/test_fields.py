@@ -12,7 +12,8 @@ from django.test import SimpleTestCase, TestCase
 from osgeo import ogr, osr
 
 from spillway.forms.fields import (OGRGeometryField, GeometryFileField,
-    GeoFormatField, SpatialReferenceField)
+    GeoFormatField, PointsField, SpatialReferenceField)
+from spillway import query
 from spillway.collections import Feature, NamedCRS
 from spillway.validators import GeometrySizeValidator
 from .models import _geom
@@ -91,6 +92,20 @@ class GeometryFileFieldTestCase(SimpleTestCase):
         v = self.field.to_python(self.fp)
         self.assertIsInstance(v, OGRGeometry)
 
+    def test_no_union(self):
+        field = GeometryFileField(union=False)
+        collection = {'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'properties': {}, 'geometry': _geom}] * 2}
+        fp = SimpleUploadedFile('zones.json', json.dumps(collection).encode())
+        geoms = field.to_python(fp)
+        self.assertEqual(len(geoms), 2)
+        for geom in geoms:
+            self.assertIsInstance(geom, OGRGeometry)
+            self.assertIsNotNone(geom.srs)
+        fp = SimpleUploadedFile('empty.json', json.dumps(
+            {'type': 'FeatureCollection', 'features': []}).encode())
+        self.assertRaises(forms.ValidationError, field.to_python, fp)
+
     def test_shapefile(self):
         base = 'dir/geofield.shp'
         path = default_storage.path(base)
@@ -126,3 +141,13 @@ class GeoFormatFieldTestCase(SimpleTestCase):
     def test_to_python(self):
         field = GeoFormatField()
         self.assertRaises(forms.ValidationError, field.to_python, 'invalid')
+        self.assertIs(field.to_python('json'), query.AsBinary)
+
+
+class PointsFieldTestCase(SimpleTestCase):
+    def test_to_python(self):
+        field = PointsField()
+        self.assertEqual(field.to_python('-120,38,-119.5,37'),
+                         [(-120, 38), (-119.5, 37)])
+        self.assertEqual(field.to_python(''), [])
+        self.assertRaises(forms.ValidationError, field.to_python, '-120,38,1')
@@ -0,0 +1,191 @@
+import struct
+import unittest
+
+from django.contrib.gis import geos
+from django.test import SimpleTestCase
+from osgeo import gdal, ogr
+
+from spillway import flatgeobuf, mvt
+from spillway.compat import json
+
+
+def _fields(buf, pos):
+    """Returns absolute positions of table fields, None when absent."""
+    vtable = pos - struct.unpack_from('<i', buf, pos)[0]
+    size, = struct.unpack_from('<H', buf, vtable)
+    offsets = struct.unpack_from('<%dH' % ((size - 4) // 2), buf, vtable + 4)
+    return [pos + off if off else None for off in offsets]
+
+def _deref(buf, pos):
+    return pos + struct.unpack_from('<I', buf, pos)[0]
+
+def _vector(buf, pos, fmt):
+    pos = _deref(buf, pos)
+    num, = struct.unpack_from('<I', buf, pos)
+    return struct.unpack_from('<%d%s' % (num, fmt), buf, pos + 4)
+
+def _root(data, offset=0):
+    """Returns a size prefixed buffer and its root table fields."""
+    size, = struct.unpack_from('<I', data, offset)
+    buf = bytearray(data[offset + 4:offset + 4 + size])
+    return buf, _fields(buf, _deref(buf, 0))
+
+
+class FlatGeobufGeometryTestCase(SimpleTestCase):
+    def _encode(self, wkt):
+        buf = bytearray(4)
+        table = flatgeobuf.encode_geometry(
+            *mvt.WKBReader(geos.GEOSGeometry(wkt).wkb).read())
+        return buf, _fields(buf, flatgeobuf._write(buf, table))
+
+    def test_point(self):
+        buf, fields = self._encode('POINT(25 17)')
+        self.assertEqual(_vector(buf, fields[1], 'd'), (25, 17))
+        self.assertEqual(buf[fields[6]], flatgeobuf.POINT)
+        self.assertIsNone(fields[0])
+
+    def test_polygon(self):
+        buf, fields = self._encode(
+            'POLYGON((0 0, 4 0, 4 4, 0 0), (1 1, 2 1, 2 2, 1 1))')
+        self.assertEqual(_vector(buf, fields[0], 'I'), (4, 8))
+        self.assertEqual(len(_vector(buf, fields[1], 'd')), 16)
+
+    def test_multipolygon(self):
+        buf, fields = self._encode(
+            'MULTIPOLYGON(((0 0, 1 0, 1 1, 0 0)), ((2 2, 3 2, 3 3, 2 2)))')
+        self.assertEqual(buf[fields[6]], flatgeobuf.MULTIPOLYGON)
+        self.assertIsNone(fields[1])
+        parts = _vector(buf, fields[7], 'I')
+        self.assertEqual(len(parts), 2)
+
+    def test_from_geojson(self):
+        geom = geos.GEOSGeometry('GEOMETRYCOLLECTION(POINT(1 2), '
+                                 'MULTILINESTRING((0 0, 1 1), (2 2, 3 3)))')
+        self.assertEqual(flatgeobuf.from_geojson(json.loads(geom.json)),
+                         mvt.WKBReader(geom.wkb).read())
+
+
+class FlatGeobufEncodeTestCase(SimpleTestCase):
+    def setUp(self):
+        self.features = [
+            {'id': i, 'geometry': geos.Point(i, i % 5).wkb,
+             'properties': {'name': 'pt%d' % i, 'value': i * 0.5,
+                            'note': None if i < 3 else 'n'}}
+            for i in range(1, 21)]
+
+    def _decode(self, data, node_size):
+        self.assertEqual(data[:8], flatgeobuf.MAGIC)
+        header, fields = _root(data, 8)
+        count, = struct.unpack_from('<Q', header, fields[8])
+        offset = 12 + len(header)
+        if node_size:
+            self.assertEqual(
+                struct.unpack_from('<H', header, fields[9])[0], node_size)
+            # Leaves, one parent per 16 leaves, and the root.
+            offset += 40 * (count + 2 + 1)
+        features = []
+        while offset < len(data):
+            buf, ffields = _root(data, offset)
+            offset += 4 + len(buf)
+            geom = _fields(buf, _deref(buf, ffields[0]))
+            features.append((_vector(buf, geom[1], 'd'),
+                             bytes(bytearray(_vector(buf, ffields[1], 'B')))))
+        self.assertEqual(offset, len(data))
+        return header, fields, features
+
+    def test_iterencode(self):
+        data = b''.join(flatgeobuf.iterencode(self.features, name='points',
+                                              srid=4326))
+        header, fields, features = self._decode(data, 16)
+        self.assertEqual(len(features), 20)
+        self.assertEqual(header[fields[2]], flatgeobuf.POINT)
+        self.assertEqual(_vector(header, fields[1], 'd'), (1, 0, 20, 4))
+        self.assertEqual(len(_vector(header, fields[7], 'I')), 4)
+        self.assertIn(b'EPSG', header)
+        self.assertIn(b'points', header)
+        # Columns are id, name, value, and note, with nulls left out.
+        props = dict(features)[(1, 1)]
+        self.assertEqual(props, struct.pack('<HqHI', 0, 1, 1, 3) + b'pt1' +
+                         struct.pack('<Hd', 2, 0.5))
+
+    def test_iterencode_unindexed(self):
+        data = b''.join(flatgeobuf.iterencode(self.features, node_size=0))
+        header, fields, features = self._decode(data, 0)
+        self.assertEqual(struct.unpack_from('<Q', header, fields[8])[0], 0)
+        # Feature order is kept without an index.
+        self.assertEqual([xy for xy, props in features],
+                         [(i, i % 5) for i in range(1, 21)])
+
+    def test_iterencode_empty(self):
+        for node_size in 0, 16:
+            data = b''.join(flatgeobuf.iterencode([], node_size=node_size))
+            header, fields, features = self._decode(data, 0)
+            self.assertEqual(features, [])
+
+    def test_packed_rtree(self):
+        boxes = [((i, i, i + 1, i + 1), i * 10) for i in range(17)]
+        index = flatgeobuf.packed_rtree(boxes)
+        self.assertEqual(len(index), 40 * 20)
+        root = struct.unpack_from('<4dQ', index)
+        self.assertEqual(root, (0, 0, 17, 17, 1))
+        leaf = struct.unpack_from('<4dQ', index, 40 * 3)
+        self.assertEqual(leaf, (0, 0, 1, 1, 0))
+
+
+@unittest.skipUnless(ogr.GetDriverByName('FlatGeobuf'),
+                     'requires the GDAL FlatGeobuf driver')
+class FlatGeobufGDALTestCase(SimpleTestCase):
+    path = '/vsimem/spillway-test.fgb'
+
+    def setUp(self):
+        self.features = [
+            {'id': i, 'geometry': geos.Point(i, i % 5).buffer(.5, 2).wkb,
+             'properties': {'name': 'pg%d' % i, 'value': i * 0.5,
+                            'note': None if i < 3 else 'n'}}
+            for i in range(1, 21)]
+
+    def tearDown(self):
+        gdal.Unlink(self.path)
+
+    def _read(self, data, bbox=None):
+        gdal.FileFromMemBuffer(self.path, data)
+        ds = ogr.Open(self.path)
+        self.assertIsNotNone(ds)
+        layer = ds.GetLayer(0)
+        if bbox:
+            layer.SetSpatialFilterRect(*bbox)
+        sref = layer.GetSpatialRef()
+        rows = [(f.GetField('id'), f.GetField('name'), f.GetField('value'),
+                 f.GetField('note'), f.GetGeometryRef().ExportToWkb())
+                for f in layer]
+        return layer.GetName(), sref, rows
+
+    def _assert_rows(self, rows):
+        self.assertEqual(len(rows), len(self.features))
+        for fid, name, value, note, wkb in sorted(rows):
+            feat = self.features[fid - 1]
+            self.assertEqual((name, value, note),
+                             (feat['properties']['name'],
+                              feat['properties']['value'],
+                              feat['properties']['note']))
+            self.assertTrue(geos.GEOSGeometry(memoryview(wkb)).equals_exact(
+                geos.GEOSGeometry(feat['geometry'])))
+
+    def test_read(self):
+        data = b''.join(flatgeobuf.iterencode(self.features, name='zones',
+                                              srid=4326))
+        name, sref, rows = self._read(data)
+        self.assertEqual(name, 'zones')
+        self.assertEqual(sref.GetAuthorityCode(None), '4326')
+        self._assert_rows(rows)
+
+    def test_read_bbox(self):
+        data = b''.join(flatgeobuf.iterencode(self.features, srid=4326))
+        name, sref, rows = self._read(data, (0, 0, 3, 3))
+        self.assertEqual(sorted(row[0] for row in rows), [1, 2, 3])
+
+    def test_read_unindexed(self):
+        data = b''.join(flatgeobuf.iterencode(self.features, node_size=0))
+        name, sref, rows = self._read(data)
+        self.assertEqual([row[0] for row in rows], list(range(1, 21)))
+        self._assert_rows(rows)
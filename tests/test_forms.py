@@ -39,6 +39,16 @@ class RasterQueryFormTestCase(SimpleTestCase):
         self.assertEqual(form.cleaned_data['g'], geom.ogr)
         self.assertEqual(form.cleaned_data['g'].srs.srid, 4326)
 
+    def test_zones_field(self):
+        geom = geos.GEOSGeometry(json.dumps(_geom))
+        collection = {'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'properties': {}, 'geometry': _geom}] * 2}
+        fp = SimpleUploadedFile('zones.json', json.dumps(collection).encode())
+        form = forms.RasterQueryForm({}, files={'zones': fp})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['zones'], [geom.ogr] * 2)
+        self.assertIsNone(form.cleaned_data['g'])
+
     def test_from_request(self):
         request = factory.post('/', json.dumps({'g': _geom}),
                                content_type='application/json')
@@ -5,14 +5,18 @@ import zipfile
 
 from django.contrib.gis import geos
 import django.contrib.gis.db.models.functions as sqlfn
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 from greenwich.raster import Raster
 from rest_framework import status
 from rest_framework.exceptions import NotAcceptable
 from rest_framework.test import APIRequestFactory
 
-from spillway import generics, forms
-from spillway.renderers import GeoJSONRenderer, GeoTIFFZipRenderer
+from spillway import generics, forms, pagination, tilecache
+from spillway.collections import NamedCRS
+from spillway.flatgeobuf import MAGIC
+from spillway.renderers import (FlatGeobufRenderer, GeoJSONRenderer,
+                                GeoJSONSeqRenderer, GeoTIFFZipRenderer)
 from .models import GeoLocation, Location
 from .test_models import RasterStoreTestBase
 from .test_serializers import LocationFeatureSerializer
@@ -27,6 +31,11 @@ class PaginatedGeoListView(generics.GeoListView):
 PaginatedGeoListView.pagination_class.page_size = 10
 
 
+class CursorPagination(pagination.FeatureCursorPagination):
+    page_size = 10
+    count_method = 'estimate'
+
+
 class BaseGeoDetailViewTestCase(TestCase):
     model = GeoLocation
     precision = 4
@@ -55,6 +64,11 @@ class GeoDetailViewTestCase(BaseGeoDetailViewTestCase):
         feature = response.json()
         self.assertAlmostEqual(feature['geometry'], expected)
         self.assertEqual(feature['type'], 'Feature')
+        self.assertEqual(feature['crs'], NamedCRS(self.qs[0].geom.srid))
+
+    def test_json_response_srs(self):
+        response = self.client.get(self.url, {'srs': 3857})
+        self.assertEqual(response.json()['crs'], NamedCRS(3857))
 
     def test_geojson_response(self):
         gj = self.qs.annotate(
@@ -149,6 +163,19 @@ class GeoListViewTestCase(TestCase):
         self.assertTrue(response.status_code, 400)
         self.assertTrue(response.accepted_renderer, GeoJSONRenderer)
 
+    def test_json(self):
+        response = self.client.get(self.url, {'format': 'json'})
+        for feature, obj in zip(response.json()['features'], self.qs):
+            self.assertEqual(feature['geometry'], json.loads(obj.geom.geojson))
+
+    def test_flatgeobuf(self):
+        response = self.client.get(self.url, {'format': 'fgb'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], FlatGeobufRenderer.media_type)
+        self.assertTrue(response.content.startswith(MAGIC))
+        for obj in self.qs:
+            self.assertIn(obj.name.encode('utf-8'), response.content)
+
     def test_simplify(self):
         srid = 3857
         for format in 'json', 'geojson':
@@ -161,6 +188,49 @@ class GeoListViewTestCase(TestCase):
         self.assertContains(response, 'EPSG::%d' % srid)
 
 
+class StreamingGeoListViewTestCase(TestCase):
+    def setUp(self):
+        for i in range(5): Location.create()
+        self.qs = Location.objects.all()
+        self.view = generics.StreamingGeoListView.as_view(queryset=self.qs)
+
+    def test_stream_geojson(self):
+        request = factory.get('/', HTTP_ACCEPT=GeoJSONRenderer.media_type)
+        response = self.view(request)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response['content-type'].startswith(
+            GeoJSONRenderer.media_type))
+        data = json.loads(b''.join(response.streaming_content).decode('utf-8'))
+        self.assertEqual(data['type'], 'FeatureCollection')
+        self.assertEqual(len(data['features']), len(self.qs))
+        self.assertIn('crs', data)
+        expected = json.loads(self.qs[0].geom.geojson)
+        self.assertEqual(data['features'][0]['geometry']['type'],
+                         expected['type'])
+
+    def test_stream_geojsonseq(self):
+        request = factory.get('/', HTTP_ACCEPT=GeoJSONSeqRenderer.media_type)
+        response = self.view(request)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        records = content.split('\x1e')[1:]
+        self.assertEqual(len(records), len(self.qs))
+        self.assertEqual(json.loads(records[0])['type'], 'Feature')
+
+    def test_stream_flatgeobuf(self):
+        request = factory.get('/', HTTP_ACCEPT=FlatGeobufRenderer.media_type)
+        response = self.view(request)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['content-type'], FlatGeobufRenderer.media_type)
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(MAGIC))
+
+    def test_json(self):
+        response = self.view(factory.get('/')).render()
+        self.assertFalse(response.streaming)
+        self.assertEqual(len(response.data['features']), len(self.qs))
+
+
 class GeoListCreateAPIView(TestCase):
     def setUp(self):
         self.view = generics.GeoListCreateAPIView.as_view(
@@ -178,6 +248,42 @@ class GeoListCreateAPIView(TestCase):
         self.assertEqual(created.name, 'Vancouver')
         self.assertEqual(created.geom, fs.instance[0].geom)
 
+    def test_post_many(self):
+        for i in range(4): Location.create()
+        data = LocationFeatureSerializer(self.qs, many=True).data
+        with self.assertNumQueries(3):
+            view = generics.GeoListCreateAPIView.as_view(
+                queryset=self.qs, batch_size=2)
+            response = view(factory.post('/', data, format='json')).render()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Location.objects.count(), 10)
+
+    def test_post_many_errors(self):
+        data = LocationFeatureSerializer(self.qs, many=True).data
+        data['features'].append({'type': 'Feature', 'geometry': None,
+                                 'properties': {'name': 'x' * 50}})
+        response = self.view(factory.post('/', data, format='json')).render()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(response.data), [1])
+        self.assertEqual(Location.objects.count(), 1)
+
+    def test_post_ndjson(self):
+        feature = LocationFeatureSerializer(self.qs[0]).data
+        body = '\n'.join([json.dumps(feature)] * 3).encode('utf-8')
+        request = factory.post('/', body, content_type='application/x-ndjson')
+        response = self.view(request).render()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Location.objects.count(), 4)
+
+    def test_post_geojsonseq(self):
+        feature = LocationFeatureSerializer(self.qs[0]).data
+        body = ''.join(['\x1e%s\n' % json.dumps(feature)] * 3)
+        request = factory.post('/', body.encode('utf-8'),
+                               content_type=GeoJSONSeqRenderer.media_type)
+        response = self.view(request).render()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Location.objects.count(), 4)
+
 
 class PaginatedGeoListViewTestCase(TestCase):
     def setUp(self):
@@ -203,6 +309,49 @@ class PaginatedGeoListViewTestCase(TestCase):
         self.assertEqual(data['type'], 'FeatureCollection')
         self.assertIn('crs', data)
 
+    def test_paginate_values(self):
+        request = factory.get('/', {'page': 2},
+                              HTTP_ACCEPT=GeoJSONRenderer.media_type)
+        view = PaginatedGeoListView(queryset=self.qs.order_by('pk'))
+        view.request = request = view.initialize_request(request)
+        view.format_kwarg = None
+        view.initial(request)
+        queryset = view.filter_queryset(view.get_queryset())
+        page = view.paginate_queryset(queryset)
+        self.assertIsNone(page._result_cache)
+        serializer = view.get_serializer(page, many=True)
+        self.assertIsNotNone(serializer._columns(page))
+        ids = [feat['id'] for feat in serializer.data['features']]
+        self.assertEqual(ids, list(self.qs.order_by('pk').values_list(
+            'pk', flat=True)[10:20]))
+
+
+class CursorGeoListViewTestCase(TestCase):
+    def setUp(self):
+        for i in range(15): Location.create()
+        self.qs = Location.objects.all()
+        self.view = generics.GeoListView.as_view(
+            queryset=self.qs, pagination_class=CursorPagination)
+
+    def _get(self, url='/'):
+        request = factory.get(url, HTTP_ACCEPT=GeoJSONRenderer.media_type)
+        response = self.view(request).render()
+        return json.loads(response.content.decode('utf-8'))
+
+    def test_paginate(self):
+        data = self._get()
+        self.assertEqual(data['type'], 'FeatureCollection')
+        self.assertEqual(data['count'], len(self.qs))
+        self.assertIn('crs', data)
+        self.assertIsNone(data['previous'])
+        ids = [feat['id'] for feat in data['features']]
+        data = self._get(data['next'])
+        ids += [feat['id'] for feat in data['features']]
+        self.assertEqual(ids, list(self.qs.order_by('pk').values_list(
+            'pk', flat=True)))
+        self.assertIsNone(data['next'])
+        self.assertIsNotNone(data['previous'])
+
 
 class RasterListViewTestCase(RasterStoreTestBase):
     def test_list_apidoc(self):
@@ -233,6 +382,21 @@ class RasterListViewTestCase(RasterStoreTestBase):
         expected[0]['image'] = imdata[idx][idx]
         self.assertDictContainsSubset(expected[0], d[0])
 
+    def test_zonal_stats(self):
+        zones = {'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'properties': {},
+             'geometry': geos.Polygon.from_bbox(bbox).__geo_interface__}
+            for bbox in ((-120, 34, -116, 38), (-114, 28, -110, 32))]}
+        fp = SimpleUploadedFile('zones.json', json.dumps(zones).encode())
+        view = generics.RasterListView.as_view(queryset=self.qs)
+        response = view(factory.post('/', {'zones': fp, 'stat': 'max'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data[0]['image']), [6, 24])
+
+    def test_list_points(self):
+        d = self.client.get('/rasters/', {'points': '-119,37,-111,29'}).json()
+        self.assertEqual(d[0]['image'], [0, 24])
+
     def test_list_zip(self):
         response = self.client.get('/rasters/', {'format': 'img.zip'})
         self.assertTrue(response.streaming)
@@ -268,3 +432,70 @@ class RasterListViewTestCase(RasterStoreTestBase):
         self.assertEqual(response['content-type'], 'text/html')
         response = self.client.get('/rasters/-9999/')
         self.assertEqual(response['content-type'], 'application/json')
+
+
+class RasterDetailViewTestCase(RasterStoreTestBase):
+    def setUp(self):
+        super(RasterDetailViewTestCase, self).setUp()
+        self.view = generics.RasterDetailView.as_view(queryset=self.qs)
+
+    def _get(self, params=None, **headers):
+        return self.view(factory.get('/', params, **headers),
+                         pk=self.object.pk)
+
+    def test_conditional(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn('Last-Modified', response)
+        response = self._get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        response = self._get(
+            HTTP_IF_MODIFIED_SINCE=self._get()['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        # Other parameters are other representations.
+        response = self._get({'format': 'tif'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_conditional_unknown_version(self):
+        # No ETag is sent for files which cannot be stat'ed, as it would not
+        # change when the file is replaced.
+        self.object.image.name = 'missing.tif'
+        self.assertEqual(tilecache.layer_version(self.object), (None, None))
+        view = generics.RasterDetailView(kwargs={'pk': self.object.pk})
+        request = view.initialize_request(
+            factory.get('/', HTTP_IF_NONE_MATCH='*'))
+        self.assertIsNone(view.not_modified(request, self.object))
+        self.assertIsNone(view.validators)
+
+    def test_conditional_changed(self):
+        etag = self._get()['ETag']
+        self.object.event = '2000-01-01'
+        self.object.save()
+        self.assertNotEqual(self._get()['ETag'], etag)
+
+    def test_range(self):
+        params = {'format': 'tif'}
+        response = self._get(params)
+        content = b''.join(response.streaming_content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        response = self._get(params, HTTP_RANGE='bytes=0-3')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'],
+                         'bytes 0-3/%d' % len(content))
+        self.assertEqual(response['Content-Length'], '4')
+        self.assertEqual(b''.join(response.streaming_content), content[:4])
+        response = self._get(params, HTTP_RANGE='bytes=-2')
+        self.assertEqual(b''.join(response.streaming_content), content[-2:])
+        response = self._get(params, HTTP_RANGE='bytes=%d-' % len(content))
+        self.assertEqual(response.status_code, 416)
+        # Ranges of another version are ignored.
+        response = self._get(params, HTTP_RANGE='bytes=0-3',
+                             HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+        response = self._get(params, HTTP_RANGE='bytes=0-3',
+                             HTTP_IF_RANGE=response['ETag'])
+        self.assertEqual(response.status_code, 206)
@@ -9,6 +9,7 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db.models.fields.files import FieldFile
 from django.test import SimpleTestCase, TestCase
 from greenwich import raster
+import numpy as np
 from PIL import Image
 
 from spillway.models import upload_to
@@ -63,11 +64,33 @@ class RasterStoreTestBase(RasterTestBase, TestCase):
         self.qs = RasterStore.objects.all()
 
 
+class MultibandRasterStoreTestCase(RasterStoreTestBase):
+    use_multiband = True
+
+    def test_linear(self):
+        # Colorizer breaks span the last band unless another band is given.
+        last = self.object.statistics(3)
+        self.assertEqual((self.object.minval, self.object.maxval),
+                         (last['min'], last['max']))
+        self.assertEqual(list(self.object.linear(k=2)),
+                         [last['min'], last['max']])
+        first = self.object.statistics(1)
+        self.assertEqual(list(self.object.linear(k=2, band=1)),
+                         [first['min'], first['max']])
+        self.assertNotEqual(first['min'], last['min'])
+
+
 class RasterStoreTestCase(RasterStoreTestBase):
     def test_array(self):
         point = self.object.geom.centroid.transform(3310, clone=True)
         self.assertEqual(self.object.array(point).squeeze(), 12)
 
+    def test_array_band(self):
+        point = self.object.geom.centroid
+        self.assertEqual(self.object.array(point, band=1).squeeze(), 12)
+        arr = self.object.array(self.object.geom.buffer(-3), band=1)
+        self.assertEqual(arr.mean(), 9)
+
     def test_save_uploadfile(self):
         upload = SimpleUploadedFile('up.tif', self.object.image.read())
         rstore = RasterStore(image=upload)
@@ -75,12 +98,65 @@ class RasterStoreTestCase(RasterStoreTestBase):
         self.assertTrue(default_storage.exists(rstore.image))
         self.assertEqual(rstore.image.size, self.f.size)
 
+    def test_overviews(self):
+        with self.object.raster() as r:
+            self.assertEqual(r.ds.GetRasterBand(1).GetOverviewCount(), 0)
+        upload = SimpleUploadedFile('ovr.tif', self.object.image.read())
+        rstore = RasterStore(image=upload)
+        rstore.overview_levels = [2]
+        rstore.save()
+        with rstore.raster() as r:
+            self.assertEqual(r.ds.GetRasterBand(1).GetOverviewCount(), 1)
+        self.assertIsNone(rstore.overview(2))
+        self.assertEqual(rstore.overview(4), 0)
+        arr = rstore.array(resolution=4)
+        self.assertEqual(arr.shape, (2, 2))
+        geom = rstore.geom.buffer(-3)
+        self.assertLess(rstore.array(geom, band=1, resolution=4).size,
+                        rstore.array(geom, band=1).size)
+
     def test_linear(self):
         self.assertEqual(list(self.object.linear()),
                          [0., 6., 12., 18., 24.])
         self.assertEqual(list(self.object.linear((2, 20))),
                          [2., 6.5, 11., 15.5, 20.])
 
+    def test_quantiles_sampled(self):
+        full = list(self.object.quantiles(band=1))
+        self.object.quantile_size = 2
+        self.object.update_statistics()
+        breaks = list(self.object.quantiles(band=1))
+        # Breaks come from a 2x2 read of the 5x5 raster.
+        with self.object.raster() as r:
+            arr = r.ds.ReadAsArray(0, 0, 5, 5, buf_xsize=2, buf_ysize=2)
+        self.assertEqual(arr.shape, (2, 2))
+        self.assertEqual(breaks,
+                         list(np.percentile(arr, [0, 25, 50, 75, 100])))
+        self.assertNotEqual(breaks, full)
+
+    def test_statistics(self):
+        stats = RasterStore.objects.get(pk=self.object.pk).statistics(1)
+        self.assertEqual((stats['min'], stats['max'], stats['mean']),
+                         (0, 24, 12))
+        self.assertEqual(len(stats['percentiles']), 101)
+        counts, edges = self.object.histogram(1)
+        self.assertEqual(counts.sum(), 25)
+        self.assertEqual(len(edges), self.object.histogram_bins + 1)
+        self.assertEqual(list(self.object.linear(band=1)),
+                         [0., 6., 12., 18., 24.])
+
+    def test_statistics_stale(self):
+        stale = self.object.bandstats.replace(
+            self.object.image.name, 'replaced.tif')
+        self.qs.filter(pk=self.object.pk).update(bandstats=stale)
+        obj = self.qs.get(pk=self.object.pk)
+        # Statistics are only read while serving, never written.
+        with self.assertNumQueries(0):
+            self.assertEqual(obj.statistics()['count'], 25)
+        self.assertEqual(self.qs.get(pk=obj.pk).bandstats, stale)
+        obj.update_statistics()
+        self.assertIn(obj.image.name, self.qs.get(pk=obj.pk).bandstats)
+
     def test_quantiles(self):
         self.assertEqual(list(self.object.quantiles()),
                          [0., 6., 12., 18., 24.])
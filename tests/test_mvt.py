@@ -0,0 +1,50 @@
+from django.contrib.gis import geos
+from django.test import SimpleTestCase
+
+from spillway import mvt
+
+
+class MVTGeometryTestCase(SimpleTestCase):
+    def _encode(self, wkt):
+        reader = mvt.WKBReader(geos.GEOSGeometry(wkt).wkb)
+        return mvt.encode_geometry(*reader.read())
+
+    # Examples from the vector tile spec.
+    def test_point(self):
+        self.assertEqual(self._encode('POINT(25 17)'), (mvt.POINT, [9, 50, 34]))
+
+    def test_multipoint(self):
+        self.assertEqual(self._encode('MULTIPOINT(5 7, 3 2)'),
+                         (mvt.POINT, [17, 10, 14, 3, 9]))
+
+    def test_linestring(self):
+        self.assertEqual(self._encode('LINESTRING(2 2, 2 10, 10 10)'),
+                         (mvt.LINESTRING, [9, 4, 4, 18, 0, 16, 16, 0]))
+
+    def test_polygon(self):
+        self.assertEqual(self._encode('POLYGON((3 6, 8 12, 20 34, 3 6))'),
+                         (mvt.POLYGON, [9, 6, 12, 18, 10, 12, 24, 44, 15]))
+
+    def test_polygon_winding(self):
+        # Reversed exterior ring is rewound to positive area.
+        self.assertEqual(self._encode('POLYGON((3 6, 20 34, 8 12, 3 6))'),
+                         self._encode('POLYGON((8 12, 20 34, 3 6, 8 12))'))
+
+    def test_degenerate(self):
+        self.assertEqual(self._encode('POLYGON((1 1, 1.1 1.1, 1.2 1, 1 1))'),
+                         (mvt.POLYGON, []))
+
+
+class MVTLayerTestCase(SimpleTestCase):
+    def test_encode(self):
+        layer = mvt.Layer('places')
+        wkb = geos.Point(25, 17).wkb
+        layer.add_feature(wkb, {'name': 'Prague', 'pop': 1280000}, id=1)
+        layer.add_feature(wkb, {'name': 'Brno', 'missing': None}, id=2)
+        tile = mvt.encode([layer])
+        self.assertIsInstance(tile, bytes)
+        self.assertEqual(len(layer.features), 2)
+        self.assertEqual(sorted(layer._keys), ['name', 'pop'])
+        for value in b'places', b'Prague', b'Brno':
+            self.assertIn(value, tile)
+        self.assertNotIn(b'missing', tile)
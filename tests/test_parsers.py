@@ -0,0 +1,35 @@
+import io
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ParseError
+
+from spillway import parsers
+
+
+class GeoJSONSeqParserTestCase(SimpleTestCase):
+    def setUp(self):
+        self.parser = parsers.GeoJSONSeqParser()
+        self.parser.chunk_size = 8
+
+    def _parse(self, content):
+        data = self.parser.parse(io.BytesIO(content))
+        self.assertEqual(data['type'], 'FeatureCollection')
+        return data['features']
+
+    def test_parse(self):
+        content = (b'\x1e{"type": "Feature", "id": 1}\n'
+                   b'\x1e{"type": "Feature",\n "id": 2}\n')
+        features = self._parse(content)
+        self.assertEqual([feat['id'] for feat in features], [1, 2])
+
+    def test_parse_error(self):
+        features = self._parse(b'\x1e{"type": "Feature"}\n\x1e{"type"\n')
+        self.assertEqual(next(features)['type'], 'Feature')
+        self.assertRaises(ParseError, next, features)
+
+
+class NDJSONParserTestCase(SimpleTestCase):
+    def test_parse(self):
+        content = b'{"type": "Feature", "id": 1}\n\n{"type": "Feature"}\n'
+        data = parsers.NDJSONParser().parse(io.BytesIO(content))
+        self.assertEqual(len(list(data['features'])), 2)
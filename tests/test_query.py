@@ -1,10 +1,14 @@
+import io
 import os
+import tempfile
+import zipfile
 
 from django.test import TestCase
-from django.contrib.gis import geos
+from django.contrib.gis import gdal, geos
 from django.contrib.gis.db.models import functions
 from django.core.files.storage import default_storage
 import greenwich
+import numpy as np
 
 from spillway import forms, query
 from spillway.models import upload_to
@@ -61,8 +65,20 @@ class GeoQuerySetTestCase(TestCase):
         self.assertTrue(tf.is_valid())
         qs = self.qs.tile(
             tf.cleaned_data['bbox'], tf.cleaned_data['z'], format='pbf')
-        self.assertTrue(qs[0].pbf.startswith('POLYGON((1523.577271 4112'))
+        g = geos.GEOSGeometry(memoryview(bytes(qs[0].pbf)))
+        # Tile space coordinates with the origin at the top left.
+        xmin, ymin, xmax, ymax = g.extent
+        self.assertGreater(xmin, 0)
+        self.assertLess(ymax, 4096)
 
+    def test_mvt(self):
+        tf = forms.VectorTileForm({'z': 6, 'x': 32, 'y': 32})
+        self.assertTrue(tf.is_valid())
+        tile = self.qs.tile(
+            tf.cleaned_data['bbox'], tf.cleaned_data['z'], format='pbf').mvt()
+        self.assertIsInstance(tile, bytes)
+        self.assertIn(Location._meta.db_table.encode('ascii'), tile)
+        self.assertIn(b'Vancouver', tile)
 
 
 class RasterQuerySetTestCase(RasterStoreTestBase):
@@ -90,6 +106,16 @@ class RasterQuerySetTestCase(RasterStoreTestBase):
         qs = self.qs.aggregate_periods(3)
         self.assertEqual(qs[0].image.tolist(), [24.5, 37, 49.5])
 
+    def test_aggregate_periods_stat(self):
+        qs = self.qs.aggregate_periods(3, 'max')
+        self.assertEqual(qs[0].image.tolist(), [49, 74, 74])
+        qs = self.qs.aggregate_periods(3, 'count')
+        self.assertEqual(qs[0].image.tolist(), [50, 50, 50])
+        std = self.qs.aggregate_periods(1, 'std')[0].image[0]
+        self.assertAlmostEqual(std, np.concatenate(
+            [obj.array().ravel() for obj in self.qs]).std())
+        self.assertRaises(ValueError, self.qs.aggregate_periods, 3, 'median')
+
     def test_summarize(self):
         qs = self.qs.summarize(self.object.geom.centroid)
         arraycenters = [12, 37, 62]
@@ -101,12 +127,65 @@ class RasterQuerySetTestCase(RasterStoreTestBase):
         self.assertEqual(list(qs.get(pk=1).image), [])
         self.assertRaises(TypeError, qs.summarize, (1, 1))
 
+    def test_summarize_parallel(self):
+        geom = self.object.geom.buffer(-3)
+        expected = [obj.image.tolist() for obj in self.qs.summarize(geom)]
+        for processes in False, True:
+            qs = self.qs.summarize(geom, workers=2, processes=processes)
+            self.assertEqual([obj.image.tolist() for obj in qs], expected)
+        # Worker processes get image names rather than model instances.
+        args = (RasterStore, self.object.image.name, geom, None, None)
+        arr = query._from_image_name(query._summarize_array, args)
+        self.assertEqual(arr.tolist(), expected[0])
+
     def test_summarize_polygon(self):
         geom = self.object.geom.buffer(-3)
         qs = self.qs.summarize(geom, 'mean')
         means = [9, 34, 59]
         self.assertEqual(qs[0].image.tolist(), means)
 
+    def test_zonal_stats(self):
+        zones = [gdal.OGRGeometry.from_bbox(bbox) for bbox in
+                 ((-120, 34, -116, 38), (-114, 28, -110, 32), (0, 0, 1, 1))]
+        for zone in zones:
+            zone.srid = 4326
+        qs = self.qs.zonal_stats(zones)
+        # Zones by band, masked for zones outside the raster.
+        self.assertEqual(qs[0].image.tolist(),
+                         [[3, 21, None], [28, 46, None], [53, 71, None]])
+        medians = self.qs.zonal_stats(zones[:2], 'median')[0].image
+        self.assertEqual(medians[0].tolist(), [3, 21])
+        geom = zones[0]
+        for stat in 'count', 'min', 'std', 'sum':
+            expected = self.qs.summarize(geom, stat)[0].image
+            arr = self.qs.zonal_stats([geom], stat)[0].image
+            self.assertEqual(arr[:, 0].tolist(), expected.tolist())
+        self.assertRaises(ValueError, self.qs.zonal_stats, zones, 'mode')
+        self.assertRaises(TypeError, self.qs.zonal_stats, [(1, 1)])
+
+    def test_sample(self):
+        points = [(-119, 37), (-111, 29), (0, 0)]
+        qs = self.qs.sample(points)
+        # Points by band, masked for points outside the raster.
+        expected = [[0, 25, 50], [24, 49, 74], [None, None, None]]
+        self.assertEqual([obj.image.tolist() for obj in qs], [expected] * 2)
+        point = geos.Point(-115, 33, srid=4326).transform(3310, clone=True)
+        arr = self.qs.sample([point.coords], srid=3310)[0].image
+        self.assertEqual(arr.tolist(), [[12, 37, 62]])
+        self.assertRaises(ValueError, self.qs.sample, [])
+
+    def test_zipfiles(self):
+        fp = self.qs.zipfiles()[0].image
+        self.assertEqual(fp.name, 'data.zip')
+        zf = zipfile.ZipFile(io.BytesIO(b''.join(fp)))
+        self.assertEqual(len(zf.namelist()), len(self.qs))
+        path = os.path.join(tempfile.gettempdir(), 'spillway-test.zip')
+        fp = self.qs.zipfiles(path, compression=zipfile.ZIP_DEFLATED)[0].image
+        with zipfile.ZipFile(fp) as zf:
+            self.assertIsNone(zf.testzip())
+        fp.close()
+        os.remove(path)
+
     def test_warp(self):
         srid = 3857
         obj = self.qs[0]
@@ -12,7 +12,7 @@ from django.test import SimpleTestCase, TestCase
 from greenwich import driver_for_path, ImageDriver, Raster
 from greenwich.io import MemFileIO
 
-from spillway import carto, forms, renderers
+from spillway import carto, flatgeobuf, forms, renderers, tilecache
 from spillway.collections import Feature, FeatureCollection
 from spillway.compat import mapnik
 from .models import Location, _geom
@@ -42,6 +42,50 @@ class GeoJSONRendererTestCase(SimpleTestCase):
         self.assertEqual(data, self.collection)
 
 
+class GeoJSONSeqRendererTestCase(SimpleTestCase):
+    def setUp(self):
+        self.data = Feature(id=1, properties={'name': 'San Francisco'},
+                            geometry=_geom)
+        self.r = renderers.GeoJSONSeqRenderer()
+
+    def _records(self, content):
+        self.assertTrue(content.startswith('\x1e'))
+        self.assertTrue(content.endswith('\n'))
+        return [json.loads(rec) for rec in content.split('\x1e')[1:]]
+
+    def test_render_feature(self):
+        self.assertEqual(self._records(self.r.render(self.data)), [self.data])
+
+    def test_render_feature_collection(self):
+        collection = FeatureCollection(features=[self.data] * 3, crs=4326)
+        records = self._records(self.r.render(collection))
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]['crs'], collection['crs'])
+        self.assertEqual(records[0]['properties'], self.data['properties'])
+        self.assertEqual(self.r.render([]), '')
+
+
+class FlatGeobufRendererTestCase(SimpleTestCase):
+    def setUp(self):
+        self.data = Feature(id=1, properties={'name': 'San Francisco'},
+                            geometry=_geom)
+        self.r = renderers.FlatGeobufRenderer()
+
+    def test_render(self):
+        wkb = bytes(GEOSGeometry(json.dumps(_geom)).wkb)
+        collection = FeatureCollection(
+            features=[self.data, Feature(id=2, geometry=wkb)], crs=4326)
+        content = self.r.render(collection)
+        self.assertTrue(content.startswith(flatgeobuf.MAGIC))
+        self.assertIn(b'San Francisco', content)
+        self.assertIn(b'EPSG', content)
+        self.r.spatial_index = False
+        self.assertLess(len(self.r.render(collection)), len(content))
+
+    def test_render_feature(self):
+        self.assertIn(b'San Francisco', self.r.render(self.data))
+
+
 class KMLRendererTestCase(SimpleTestCase):
     def setUp(self):
         self.data = {'id': 1,
@@ -102,7 +146,7 @@ class RasterRendererTestCase(RasterStoreTestBase):
         qs = self.qs.warp(format=driver.ext, geom=geom)
         lst = [obj.raster() for obj in qs]
         rs = RasterStoreSerializer(qs.zipfiles(), many=True)
-        fp = rend.render(rs.data)
+        fp = io.BytesIO(b''.join(rend.render(rs.data)))
         with zipfile.ZipFile(fp) as zf:
             for r, name in zip(lst, zf.namelist()):
                 self.assertRegexpMatches(name, pat)
@@ -121,6 +165,15 @@ class RasterRendererTestCase(RasterStoreTestBase):
         fp = renderers.GeoTIFFRenderer().render(self.data)
         self.assertEqual(fp.read(), self.f.read())
 
+    def test_render_cog(self):
+        obj = list(self.qs.warp(format=renderers.COGRenderer.format))[0]
+        context = {'response': {}}
+        fp = renderers.COGRenderer().render(
+            {'image': obj.image.file}, renderer_context=context)
+        self.assertTrue(
+            context['response']['Content-Disposition'].endswith('.tif'))
+        self.assert_format(fp.read(), 'GTiff')
+
     def test_render_hfa(self):
         fp = renderers.HFARenderer().render(self._save('HFA'))
         self.assert_format(fp.read(), 'HFA')
@@ -150,6 +203,31 @@ class RasterRendererTestCase(RasterStoreTestBase):
         self.assert_member_formats(renderers.GeoTIFFZipRenderer(), geom)
 
 
+class MapPoolTestCase(TestCase):
+    def setUp(self):
+        self.pool = carto.MapPool(maxsize=2)
+
+    def test_lru(self):
+        maps = [object() for i in range(3)]
+        for i, m in enumerate(maps):
+            self.pool.set(i, m)
+        self.assertIsNone(self.pool.get(0))
+        self.assertIs(self.pool.get(2), maps[2])
+        self.assertIsNone(self.pool.get(None))
+
+    def test_key(self):
+        qs = Location.objects.all()
+        key = self.pool.key([qs], {'style': 'green'})
+        self.assertEqual(key[:4],
+                         ((tilecache.layer_key(qs),), 'green', (), 256))
+
+    def test_metatile_origin(self):
+        self.assertEqual(carto.metatile_origin(23, 51, 7, 4), (20, 48, 4))
+        # Metatiles are limited to the number of tiles at a zoom level.
+        self.assertEqual(carto.metatile_origin(1, 0, 1, 8), (0, 0, 2))
+        self.assertEqual(carto.metatile_origin(0, 0, 0, 4), (0, 0, 1))
+
+
 @unittest.skipUnless('mapnik' in sys.modules, 'requires mapnik')
 class MapnikRendererTestCase(RasterStoreTestBase):
     ctx = {'y': 51, 'x': 23, 'z': 7}
@@ -173,6 +251,23 @@ class MapnikRendererTestCase(RasterStoreTestBase):
         self.assertEqual(im.size, (256, 256))
         self.assertNotEqual(im.getpixel((100, 100)), (0, 0, 0, 0))
 
+    def test_pool(self):
+        form = forms.RasterTileForm(self.ctx)
+        m = carto.build_map([self.object], form)
+        self.assertIs(carto.build_map([self.object], form), m)
+        form = forms.RasterTileForm(dict(self.ctx, x=24))
+        self.assertIs(carto.build_map([self.object], form), m)
+
+    def test_render_metatile(self):
+        form = forms.RasterTileForm(self.ctx)
+        tiles = carto.render_metatile([self.object], form, 'png', 4)
+        # The first row and column of the metatile are outside the raster.
+        self.assertEqual(len(tiles), 9)
+        self.assertEqual(min(tiles), (21, 49))
+        self.assertNotIn((20, 48), tiles)
+        im = self._image(tiles[23, 51])
+        self.assertEqual(im.size, (256, 256))
+
     def test_stylesheet(self):
         m = carto.Map()
         layer = m.layer(self.object, 'green')
@@ -10,7 +10,7 @@ from greenwich.srs import SpatialReference
 
 from spillway import fields, generics, query, serializers
 from spillway.collections import Feature, FeatureCollection
-from spillway.renderers import GeoTIFFRenderer
+from spillway.renderers import GeoJSONRenderer, GeoTIFFRenderer
 from .models import Location, RasterStore, _geom
 from .test_models import RasterStoreTestBase
 
@@ -154,6 +154,24 @@ class FeatureSerializerTestCase(ModelTestCase):
         self.assertEqual(serializer.data['features'][0], feat)
         self.assertEqual(serializer.data['crs'], crs)
 
+    def test_serialize_values(self):
+        request = RequestMock()
+        request.accepted_renderer = GeoJSONRenderer()
+        qs = Location.objects.annotate(geojson=functions.AsGeoJSON('geom'))
+        serializer = LocationFeatureSerializer(
+            qs, many=True, context={'request': request})
+        self.assertIsNotNone(serializer._columns(qs))
+        with self.assertNumQueries(1):
+            data = serializer.data
+        serializer = LocationFeatureSerializer(
+            qs.all(), many=True, context={'request': request})
+        serializer.use_values = False
+        self.assertEqual(data, serializer.data)
+        self.assertEqual(data['features'][0]['id'], self.obj.pk)
+        # Geometries not selected from the database need instances.
+        serializer = LocationFeatureSerializer(qs.all(), many=True)
+        self.assertIsNone(serializer._columns(qs.all()))
+
     def test_serialize_queryset_simplify(self):
         fn = query.Simplify(functions.Transform('geom', 4269), 1.01)
         qs = Location.objects.all()
@@ -216,6 +234,7 @@ class RasterSerializerTestCase(RasterStoreTestBase):
         }
         self.assertEqual(SpatialReference(data['srs']), SpatialReference(4326))
         self.assertDictContainsSubset(expected, data)
+        self.assertNotIn('bandstats', data)
 
     def test_serialize_context(self):
         geom = self.object.geom.buffer(-1)
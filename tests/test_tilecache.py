@@ -0,0 +1,136 @@
+import shutil
+import tempfile
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from spillway import forms, tilecache
+from .models import Location
+
+
+class TileKeyTestCase(SimpleTestCase):
+    def setUp(self):
+        self.form = forms.RasterTileForm(
+            {'z': 6, 'x': 32, 'y': 31, 'limits': '0,10', 'style': 'Blues'})
+        self.assertTrue(self.form.is_valid())
+        self.key = tilecache.TileKey.from_form(
+            Location.objects.all(), self.form, 'png')
+
+    def test_from_form(self):
+        self.assertTrue(self.key.layer.startswith('tests.location.'))
+        self.assertEqual(self.key[1:4], (6, 32, 31))
+        self.assertIn(('limits', (0.0, 10.0)), self.key.params)
+        self.assertTrue(str(self.key).endswith('/6/32/31.png'))
+
+    def test_variant(self):
+        form = forms.RasterTileForm(
+            {'z': 6, 'x': 32, 'y': 31, 'limits': '0,10', 'style': 'Reds'})
+        self.assertTrue(form.is_valid())
+        key = tilecache.TileKey.from_form(Location.objects.all(), form, 'png')
+        self.assertNotEqual(key.variant, self.key.variant)
+        self.assertEqual(key.variant, key._replace(z=7).variant)
+
+
+class LayerKeyTestCase(TestCase):
+    def test_filtered(self):
+        qs = Location.objects.all()
+        key = tilecache.layer_key(qs)
+        self.assertEqual(tilecache.layer_key(Location.objects.all()), key)
+        self.assertNotEqual(tilecache.layer_key(qs.filter(name='Berlin')),
+                            key)
+        self.assertNotEqual(tilecache.layer_key(qs.none()), key)
+
+    def test_changed(self):
+        qs = Location.objects.all()
+        key = tilecache.layer_key(qs)
+        time.sleep(.002)
+        Location.create()
+        self.assertNotEqual(tilecache.layer_key(qs), key)
+
+    def test_layer_version(self):
+        qs = Location.objects.all()
+        version, mtime = tilecache.layer_version(qs)
+        self.assertEqual(tilecache.layer_version(qs), (version, mtime))
+        self.assertLessEqual(mtime, time.time())
+        time.sleep(.002)
+        Location.create()
+        self.assertNotEqual(tilecache.layer_version(qs)[0], version)
+        self.assertEqual(tilecache.layer_version(qs)[0],
+                         tilecache.layer_key(qs))
+
+    @override_settings(CACHES={
+        'default': {'BACKEND':
+                    'django.core.cache.backends.locmem.LocMemCache'},
+        'spillway-dummy': {'BACKEND':
+                           'django.core.cache.backends.dummy.DummyCache'}})
+    def test_dummy_version_cache(self):
+        alias = tilecache.VERSION_CACHE
+        tilecache.VERSION_CACHE = 'spillway-dummy'
+        try:
+            self.assertRaises(ImproperlyConfigured, tilecache.model_version,
+                              Location)
+        finally:
+            tilecache.VERSION_CACHE = alias
+
+
+class TileCacheTestMixin(object):
+    def setUp(self):
+        self.key = tilecache.TileKey('layer', 2, 1, 0, 'png', ())
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = self.create_cache()
+
+    def tearDown(self):
+        self.cache.clear()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_get_or_set(self):
+        calls = []
+        def render():
+            calls.append(1)
+            return b'tile'
+        self.assertEqual(self.cache.get_or_set(self.key, render), b'tile')
+        self.assertEqual(self.cache.get_or_set(self.key, render), b'tile')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.cache.stats, {'hits': 1, 'misses': 1})
+
+    def test_clear(self):
+        self.cache.set(self.key, b'tile')
+        self.cache.clear()
+        self.assertIsNone(self.cache.get(self.key))
+
+
+class MemoryTileCacheTestCase(TileCacheTestMixin, SimpleTestCase):
+    def create_cache(self):
+        return tilecache.MemoryTileCache(maxsize=2)
+
+    def test_lru(self):
+        keys = [self.key._replace(x=x) for x in range(3)]
+        for key in keys:
+            self.cache.set(key, b'tile')
+        self.cache.get(keys[1])
+        self.cache.set(self.key._replace(x=4), b'tile')
+        self.assertIsNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[2]))
+        self.assertEqual(self.cache.get(keys[1]), b'tile')
+
+
+class DiskTileCacheTestCase(TileCacheTestMixin, SimpleTestCase):
+    def create_cache(self):
+        return tilecache.DiskTileCache(self.tmpdir)
+
+
+class MBTilesCacheTestCase(TileCacheTestMixin, SimpleTestCase):
+    def create_cache(self):
+        return tilecache.MBTilesCache(self.tmpdir)
+
+    def test_tms_row(self):
+        self.cache.set(self.key, b'tile')
+        conn = self.cache._connect(self.key)
+        row = conn.execute('SELECT tile_row FROM tiles').fetchone()
+        self.assertEqual(row[0], 3)
+
+
+class DjangoTileCacheTestCase(TileCacheTestMixin, SimpleTestCase):
+    def create_cache(self):
+        return tilecache.DjangoTileCache()
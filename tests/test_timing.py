@@ -0,0 +1,92 @@
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIRequestFactory
+
+from spillway import generics, mixins, timing
+from spillway.renderers import GeoJSONRenderer
+from .models import Location
+
+factory = APIRequestFactory()
+
+
+class TimedGeoListView(mixins.TimingMixin, generics.GeoListView):
+    pagination_class = None
+
+
+class TimedStreamingGeoListView(mixins.TimingMixin,
+                                generics.StreamingGeoListView):
+    pass
+
+
+class TimerTestCase(SimpleTestCase):
+    def test_phase(self):
+        timer = timing.Timer()
+        with timer.activate():
+            self.assertIs(timing.current(), timer)
+            with timing.phase('outer'):
+                # Nested blocks of the same phase are counted once.
+                with timing.phase('outer'):
+                    pass
+                with timing.phase('inner'):
+                    pass
+            with timing.phase('inner'):
+                pass
+        self.assertIsNone(timing.current())
+        self.assertEqual(list(timer.phases), ['inner', 'outer'])
+        self.assertEqual(timer.counts, {'inner': 2, 'outer': 1})
+        self.assertGreaterEqual(timer.total, timer.phases['outer'])
+
+    def test_inactive(self):
+        with timing.phase('ignored'):
+            self.assertIsNone(timing.current())
+
+    def test_header(self):
+        timer = timing.Timer()
+        timer.add('filter', .0015)
+        timer.add('filter', .0005)
+        self.assertEqual(timer.header(), 'filter;dur=2.00, total;dur=0.00')
+
+    def test_iterate(self):
+        timer = timing.Timer()
+        self.assertEqual(list(timer.iterate(range(3))), [0, 1, 2])
+        self.assertEqual(timer.counts['stream'], 4)
+
+
+class TimingMixinTestCase(TestCase):
+    def setUp(self):
+        Location.create()
+        self.qs = Location.objects.all()
+        self.records = []
+        timing.request_timed.connect(self._receive)
+
+    def tearDown(self):
+        timing.request_timed.disconnect(self._receive)
+
+    def _receive(self, sender, request, response, timer, **kwargs):
+        self.records.append((sender, timer.as_dict()))
+
+    def _phases(self, response):
+        return [v.split(';')[0] for v in response['Server-Timing'].split(', ')]
+
+    def test_list(self):
+        view = TimedGeoListView.as_view(queryset=self.qs)
+        response = view(factory.get('/'))
+        self.assertTrue(response.is_rendered)
+        phases = self._phases(response)
+        for name in 'filter', 'db', 'serialize', 'render', 'total':
+            self.assertIn(name, phases)
+        self.assertEqual(len(self.records), 1)
+        sender, timings = self.records[0]
+        self.assertIs(sender, TimedGeoListView)
+        self.assertEqual(list(timings), phases)
+
+    def test_streaming(self):
+        view = TimedStreamingGeoListView.as_view(queryset=self.qs)
+        response = view(factory.get('/', HTTP_ACCEPT=GeoJSONRenderer.media_type))
+        self.assertTrue(response.streaming)
+        self.assertNotIn('stream', self._phases(response))
+        self.assertEqual(self.records, [])
+        content = b''.join(response.streaming_content)
+        self.assertIn(b'Feature', content)
+        sender, timings = self.records[0]
+        self.assertIn('stream', timings)
+        self.assertIn('db', timings)
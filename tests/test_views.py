@@ -7,7 +7,7 @@ from django.contrib.gis import geos
 from rest_framework.test import APIRequestFactory, APITestCase
 from PIL import Image
 
-from spillway import urls, views
+from spillway import tilecache, urls, views
 from spillway.compat import mapnik
 from .models import Location
 from .test_models import RasterStoreTestBase
@@ -55,6 +55,33 @@ class TileViewTestCase(APITestCase):
         im = Image.open(BytesIO(response.content))
         self.assertEqual(im.size, (256, 256))
 
+    def test_mvt_response(self):
+        response = self.client.get('%s.pbf' % self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['content-type'],
+                         'application/vnd.mapbox-vector-tile')
+        self.assertIn(b'Prague', response.content)
+
+    def test_mvt_cached(self):
+        cache = tilecache.MemoryTileCache()
+        view = views.TileView.as_view(
+            queryset=Location.objects.all(), tile_cache=cache)
+        factory = APIRequestFactory()
+        kwargs = dict(zip('zxy', self.url.split('/')[2:]), format='pbf')
+        for i in range(2):
+            response = view(factory.get('/'), **kwargs).render()
+            self.assertIn(b'Prague', response.content)
+        self.assertEqual(cache.stats, {'hits': 1, 'misses': 1})
+
+    def test_mvt_conditional(self):
+        view = views.TileView.as_view(queryset=Location.objects.all())
+        factory = APIRequestFactory()
+        kwargs = dict(zip('zxy', self.url.split('/')[2:]), format='pbf')
+        etag = view(factory.get('/'), **kwargs)['ETag']
+        response = view(factory.get('/', HTTP_IF_NONE_MATCH=etag), **kwargs)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
     @unittest.skipUnless(has_mapnik, 'requires mapnik')
     def test_tile_outside_extent(self):
         response = self.client.get('/vectiles/4/7/8.png')
@@ -78,6 +105,27 @@ class RasterTileViewTestCase(RasterStoreTestBase, APITestCase):
         zero_rgba = ((0, 0), (0, 0), (0, 0), (0, 0))
         self.assertEqual(stats, zero_rgba)
 
+    @unittest.skipUnless(has_mapnik, 'requires mapnik')
+    def test_metatile_cached(self):
+        cache = tilecache.MemoryTileCache()
+        view = views.RasterTileView.as_view(
+            queryset=self.qs, tile_cache=cache, metatile=2)
+        factory = APIRequestFactory()
+        for x in 342, 343:
+            response = view(factory.get('/'), pk=1, z=11, x=x, y=790,
+                            format='png').render()
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(cache.stats, {'hits': 1, 'misses': 1})
+
+    def test_not_modified(self):
+        # Nothing is rendered for a current tile, so no need for mapnik.
+        response = self.client.get(
+            '/maptiles/%d/11/342/790/' % self.object.pk,
+            HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
     def test_nonexistent_tileset(self):
         response = self.client.get('/maptiles/999/9/9/9/')
         self.assertEqual(response.status_code, 404)
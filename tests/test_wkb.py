@@ -0,0 +1,36 @@
+from django.contrib.gis import geos
+from django.test import SimpleTestCase
+
+from spillway import wkb
+from spillway.compat import json
+
+
+class WKBGeoJSONTestCase(SimpleTestCase):
+    def _assert_geojson(self, wkt):
+        geom = geos.GEOSGeometry(wkt)
+        self.assertEqual(json.loads(json.dumps(wkb.geojson(geom.wkb))),
+                         json.loads(geom.json))
+
+    def test_polygon(self):
+        self._assert_geojson(
+            'POLYGON((0.1 0.2, 4 0, 4 4, 0.1 0.2), (1 1, 2 1, 2 2, 1 1))')
+
+    def test_multi(self):
+        self._assert_geojson('MULTIPOINT(5 7, 3 2)')
+        self._assert_geojson(
+            'MULTIPOLYGON(((0 0, 1 0, 1 1, 0 0)), ((2 2, 3 2, 3 3, 2 2)))')
+
+    def test_collection(self):
+        geom = geos.GEOSGeometry(
+            'GEOMETRYCOLLECTION(POINT(1 2), LINESTRING(0 0, 1 1))')
+        self.assertEqual(wkb.geojson(geom.wkb), {
+            'type': 'GeometryCollection',
+            'geometries': [{'type': 'Point', 'coordinates': (1, 2)},
+                           {'type': 'LineString',
+                            'coordinates': [(0, 0), (1, 1)]}]})
+
+    def test_z(self):
+        self._assert_geojson('LINESTRING(0 0 1, 1 1 2)')
+        # Readers only keep z values when asked to.
+        reader = wkb.WKBReader(geos.GEOSGeometry('POINT(1 2 3)').wkb)
+        self.assertEqual(reader.read(), (1, (1, 2)))
@@ -0,0 +1,66 @@
+import io
+import tempfile
+import zipfile
+
+from django.test import SimpleTestCase
+
+from spillway import zipstream
+
+class Unseekable(object):
+    def __init__(self, data):
+        self._fp = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._fp.read(size)
+
+
+class ZipStreamTestCase(SimpleTestCase):
+    def setUp(self):
+        self.data = bytes(bytearray(range(256))) * 1024
+        self.f = tempfile.NamedTemporaryFile()
+        self.f.write(self.data)
+        self.f.flush()
+        self.members = [('data/a.bin', self.f.name),
+                        (u'data/\xe9.txt', io.BytesIO(b'hello'))]
+
+    def tearDown(self):
+        self.f.close()
+
+    def _zipfile(self, stream):
+        return zipfile.ZipFile(io.BytesIO(b''.join(stream)))
+
+    def assert_members(self, zf):
+        self.assertIsNone(zf.testzip())
+        self.assertEqual(zf.read('data/a.bin'), self.data)
+        self.assertEqual(zf.read(u'data/\xe9.txt'), b'hello')
+
+    def test_stored(self):
+        stream = zipstream.ZipStream(self.members, chunk_size=1000)
+        zf = self._zipfile(stream)
+        self.assert_members(zf)
+        self.assertEqual(zf.getinfo('data/a.bin').compress_size,
+                         len(self.data))
+
+    def test_deflated(self):
+        stream = zipstream.ZipStream(self.members, zipfile.ZIP_DEFLATED)
+        zf = self._zipfile(stream)
+        self.assert_members(zf)
+        self.assertLess(zf.getinfo('data/a.bin').compress_size,
+                        len(self.data))
+
+    def test_lazy_members(self):
+        members = iter(self.members)
+        stream = iter(zipstream.ZipStream(members))
+        next(stream)
+        # Only the first member has been consumed.
+        self.assertEqual(next(members)[0], u'data/\xe9.txt')
+
+    def test_unknown_size(self):
+        # Non-seekable members are written with Zip64 data descriptors.
+        fp = Unseekable(self.data)
+        zf = self._zipfile(zipstream.ZipStream([('data/a.bin', fp)]))
+        self.assertEqual(zf.read('data/a.bin'), self.data)
+
+    def test_compression(self):
+        self.assertRaises(ValueError, zipstream.ZipStream, self.members,
+                          zipfile.ZIP_BZIP2)